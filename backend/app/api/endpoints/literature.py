@@ -1,9 +1,17 @@
 from fastapi import APIRouter, Query
 from app.models.literature import LiteratureResponse
 from app.services.literature_service import run_literature_search
+from app.services.literature_sources import http_stats
 
 router = APIRouter()
 
+
+@router.get("/literature_review/status")
+def literature_review_status():
+    """Per-source HTTP counters: requests, retries, failures, connections opened vs reused."""
+    return {"sources": http_stats()}
+
+
 @router.get("/literature_review", response_model=LiteratureResponse)
 def literature_review(query: str = Query(..., min_length=3, description="Topic or research question")):
     return run_literature_search(query)
@@ -1,12 +1,30 @@
-from fastapi import APIRouter, Query
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
 
-from app.services.retrieval_service import RetrievalService
+from app.models.retrieval import RetrieveBatchRequest
+from app.services.retrieval_service import RetrievalUnavailable, get_retriever
+from app.services.suggest_index import SUGGEST_LIMIT, SUGGEST_MAX_LIMIT
 
 router = APIRouter()
 
-# simple in-memory singleton (fine for demos)
-_retriever = RetrievalService()
+
+@router.get("/retrieve/status")
+def retrieve_status():
+    return get_retriever().status()
+
+
+@router.post("/retrieve/reload")
+def retrieve_reload(
+    force: bool = Query(False, description="rebuild even if the corpus content hash is unchanged"),
+    wait: bool = Query(False, description="block until the new index is swapped in"),
+):
+    """
+    Rebuilds the index from agent_corpus.jsonl in the background and swaps it in atomically.
+    Queries keep using the current version until the new one is ready.
+    """
+    retriever = get_retriever()
+    started = retriever.reload(force=force, wait=wait)
+    return {"started": started, **retriever.status()}
 
 
 @router.get("/retrieve")
@@ -14,6 +32,62 @@ def retrieve(
     query: str = Query(..., min_length=2),
     top_k: int = Query(5, ge=1, le=20),
     source_type: Optional[str] = Query(None, description="grant or faculty_profile"),
+    ranker: str = Query("overlap", description="overlap, bm25, tfidf, dense or hybrid"),
+    filters: List[str] = Query(
+        [],
+        alias="filter",
+        description="repeatable metadata predicate applied before ranking: year>=2020, org=MIT, keyword=genomics",
+    ),
+    facets: List[str] = Query(
+        [],
+        alias="facet",
+        description="repeatable facet field counted over the matching docs: source_type, year, org, keywords",
+    ),
+    fuzzy: bool = Query(True, description="expand misspelled query words to close corpus terms"),
+):
+    item = {"query": query, "top_k": top_k, "source_type": source_type, "filters": filters, "fuzzy": fuzzy}
+    try:
+        out = get_retriever().query_batch([item], ranker=ranker, facets=facets)[0]
+    except RetrievalUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**item, "ranker": ranker, **out}
+
+
+@router.get("/suggest")
+def suggest(
+    prefix: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(SUGGEST_LIMIT, ge=1, le=SUGGEST_MAX_LIMIT),
 ):
-    results = _retriever.search(query=query, top_k=top_k, source_type=source_type)
-    return {"query": query, "top_k": top_k, "source_type": source_type, "results": results}
\ No newline at end of file
+    """
+    Autocomplete for the goal box: corpus terms completing the last word (by document
+    frequency) and titles starting with the prefix. Cheap enough to call per keystroke.
+    """
+    try:
+        completions = get_retriever().suggest(prefix, limit)
+    except RetrievalUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"prefix": prefix, **completions}
+
+
+@router.post("/retrieve_batch")
+def retrieve_batch(payload: RetrieveBatchRequest):
+    """
+    Many queries, one pass over the index. Results come back in request order.
+    """
+    items = [it.model_dump() for it in payload.items]
+    try:
+        batches = get_retriever().query_batch(items, ranker=payload.ranker, facets=payload.facets)
+    except RetrievalUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "ranker": payload.ranker,
+        "results": [
+            {**it, **out}
+            for it, out in zip(items, batches)
+        ],
+    }
@@ -0,0 +1,89 @@
+"""
+Disk size, write time and load time of the corpus in each corpus_format, against plain
+JSONL. "read" streams and parses the rows, "load" builds a full CorpusIndex (compact
+storage, no index artifact). Local reads come from the page cache, so the estimated load
+time over a network volume adds the file's transfer time at --bandwidth-mbps.
+
+    python -m app.benchmarks.corpus_format_bench --docs 100000
+    python -m app.benchmarks.corpus_format_bench --corpus artifacts/agent_corpus.jsonl --bandwidth-mbps 50
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import tempfile
+import time
+
+from app.benchmarks.synthetic_corpus import write_corpus
+from app.pipelines.build_corpus import write_corpus_lines
+from app.services.corpus_format import CORPUS_FORMATS, iter_rows, with_format
+from app.services.corpus_index import CorpusIndex
+
+
+def _timed(fn) -> tuple:
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def run(n_docs: int, corpus: Path | None = None, bandwidth_mbps: float = 100.0) -> dict:
+    results: dict = {"formats": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp) / "bench_corpus.jsonl"
+        if corpus is None:
+            write_corpus(base, n_docs)
+        else:
+            base.write_bytes(corpus.read_bytes())
+        results["corpus_path"] = str(corpus or base)
+
+        for fmt in CORPUS_FORMATS:
+            path = with_format(base, fmt)
+            if fmt != "jsonl":
+                with open(base, "r", encoding="utf-8") as f:
+                    _, write_secs = _timed(lambda: write_corpus_lines(f, path))
+            else:
+                write_secs = 0.0
+            n_rows, read_secs = _timed(lambda: sum(1 for _ in iter_rows(path)))
+            index, load_secs = _timed(lambda: CorpusIndex.load(path, storage="compact", use_artifact=False))
+            size_mb = path.stat().st_size / 1e6
+            results["formats"][fmt] = {
+                "size_mb": round(size_mb, 2),
+                "rows": n_rows,
+                "write_secs": round(write_secs, 3),
+                "read_secs": round(read_secs, 3),
+                "load_secs": round(load_secs, 3),
+                "est_network_load_secs": round(load_secs + size_mb / bandwidth_mbps, 3),
+                "n_docs": index.n_docs,
+            }
+
+    plain = results["formats"]["jsonl"]
+    for r in results["formats"].values():
+        r["size_vs_jsonl"] = round(r["size_mb"] / plain["size_mb"], 3) if plain["size_mb"] else None
+        r["load_vs_jsonl"] = round(r["est_network_load_secs"] / plain["est_network_load_secs"], 3)
+    results["bandwidth_mbps"] = bandwidth_mbps
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100_000, help="synthetic corpus size")
+    parser.add_argument("--corpus", type=Path, default=None, help="measure an existing plain JSONL corpus instead")
+    parser.add_argument("--bandwidth-mbps", type=float, default=100.0, help="network volume read throughput, MB/s")
+    parser.add_argument("--out", type=Path, default=None, help="also write the results as JSON here")
+    args = parser.parse_args()
+
+    results = run(args.docs, args.corpus, args.bandwidth_mbps)
+    print(f"corpus: {results['corpus_path']}")
+    for fmt, r in results["formats"].items():
+        print(
+            f"  {fmt:9s} {r['size_mb']:9.2f} MB (x{r['size_vs_jsonl']:.3f})  write {r['write_secs']:6.2f}s  "
+            f"read {r['read_secs']:6.2f}s  load {r['load_secs']:6.2f}s  "
+            f"at {results['bandwidth_mbps']:g} MB/s {r['est_network_load_secs']:6.2f}s (x{r['load_vs_jsonl']:.2f})"
+        )
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
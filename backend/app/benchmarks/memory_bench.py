@@ -0,0 +1,89 @@
+"""
+Resident memory of a loaded corpus index, per storage mode, against the pre-compaction
+representation (parsed rows + dict-of-lists postings).
+
+    python -m app.benchmarks.memory_bench --docs 100000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+from pathlib import Path
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from app.benchmarks.synthetic_corpus import write_corpus
+from app.services.corpus_index import STORAGE_MODES, CorpusIndex, _term_counts
+
+
+def _legacy_index(path: Path) -> Any:
+    """The representation CorpusIndex used before interning/arrays, rebuilt for comparison."""
+    docs = []
+    postings: dict[str, tuple[list[int], list[int]]] = {}
+    doc_len: list[int] = []
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.strip():
+                continue
+            d = json.loads(raw)
+            i = len(docs)
+            docs.append(d)
+            counts = _term_counts(d.get("text", ""))
+            doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                plist = postings.setdefault(term, ([], []))
+                plist[0].append(i)
+                plist[1].append(tf)
+    return docs, postings, doc_len
+
+
+def measure(load: Callable[[], Any]) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = load()
+    load_secs = time.perf_counter() - t0
+    gc.collect()
+    resident, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return {"load_secs": round(load_secs, 3), "resident_mb": round(resident / 1e6, 1), "peak_mb": round(peak / 1e6, 1)}
+
+
+def run(n_docs: int, corpus: Path | None = None) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = corpus or write_corpus(Path(tmp) / "bench_corpus.jsonl", n_docs)
+        results = {
+            "corpus_path": str(path),
+            "corpus_mb": round(path.stat().st_size / 1e6, 1),
+            "modes": {"legacy": measure(lambda: _legacy_index(path))},
+        }
+        for mode in STORAGE_MODES:
+            results["modes"][mode] = measure(lambda: CorpusIndex.load(path, storage=mode, use_artifact=False))
+
+    legacy = results["modes"]["legacy"]["resident_mb"]
+    for r in results["modes"].values():
+        r["reduction_vs_legacy"] = round(legacy / r["resident_mb"], 1) if r["resident_mb"] else None
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100_000, help="synthetic corpus size")
+    parser.add_argument("--corpus", type=Path, default=None, help="measure an existing corpus instead")
+    args = parser.parse_args()
+
+    results = run(args.docs, args.corpus)
+    print(f"corpus: {results['corpus_path']} ({results['corpus_mb']} MB)")
+    for mode, r in results["modes"].items():
+        print(
+            f"  {mode:8s} resident {r['resident_mb']:8.1f} MB  peak {r['peak_mb']:8.1f} MB  "
+            f"load {r['load_secs']:6.2f}s  x{r['reduction_vs_legacy']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
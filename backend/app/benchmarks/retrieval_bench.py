@@ -0,0 +1,339 @@
+"""
+Retrieval benchmark: load time, resident memory, latency percentiles and throughput of
+RetrievalService per corpus size, index mode (storage x shards) and ranker, over a fixed
+synthetic query mix. Each configuration runs in a fresh process so memory numbers are
+not polluted by the previous one. Results are written as JSON; pass an earlier results
+file as --baseline to print the change per configuration.
+
+    python -m app.benchmarks.retrieval_bench --sizes 10000,100000
+    python -m app.benchmarks.retrieval_bench --sizes 1000000 --rankers overlap,bm25 \\
+        --corpus-dir /data/bench --baseline retrieval_bench.json --out retrieval_bench.new.json
+    python -m app.benchmarks.retrieval_bench --sizes 100000 --index-artifact   # mapped index load
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Any
+
+import numpy as np
+
+from app.benchmarks.synthetic_corpus import QUERY_MIX, generate_queries, write_corpus
+from app.core.config import settings
+from app.pipelines.build_corpus import shard_dir_for
+from app.pipelines.build_index import build_index_artifacts
+from app.services.corpus_index import STORAGE_MODES
+from app.services.retrieval_service import RANKERS, RetrievalService
+from app.services.sharded_index import SHARD_MANIFEST
+
+DEFAULT_SIZES = (10_000, 100_000)
+# relative change in p50 / p95 / qps reported as a regression by --baseline
+REGRESSION_THRESHOLD = 0.10
+
+
+# ---------------------------
+# Measurement helpers
+# ---------------------------
+def _rss_mb() -> float | None:
+    """Resident memory of this process plus its children (shard workers), from /proc."""
+    me = os.getpid()
+    pids = [me]
+    try:
+        for entry in os.scandir("/proc"):
+            if entry.name.isdigit() and entry.name != str(me):
+                try:
+                    stat = Path(entry.path, "stat").read_text()
+                except OSError:
+                    continue
+                # the command name may contain spaces; ppid is the 2nd field after ")"
+                if int(stat.rsplit(")", 1)[1].split()[1]) == me:
+                    pids.append(int(entry.name))
+    except FileNotFoundError:
+        return None  # no procfs (macOS, Windows)
+
+    total_kb = 0
+    for pid in pids:
+        try:
+            for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total_kb += int(line.split()[1])
+                    break
+        except OSError:
+            continue
+    return round(total_kb / 1024, 1)
+
+
+def _latency_summary(ms: list[float]) -> dict:
+    a = np.array(ms)
+    p50, p95, p99 = np.percentile(a, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "mean": round(float(a.mean()), 3),
+        "max": round(float(a.max()), 3),
+    }
+
+
+def corpus_for(n_docs: int, seed: int, shards: int, corpus_dir: Path, index_artifact: bool = False) -> Path:
+    """
+    The synthetic corpus (or shard manifest) for this size/seed, generated once per
+    directory, with its binary index artifacts if index_artifact.
+    """
+    path = corpus_dir / f"synthetic_{n_docs}_seed{seed}.jsonl"
+    target = shard_dir_for(path) / SHARD_MANIFEST if shards > 1 else path
+    if shards > 1 and target.exists():
+        manifest = json.loads(target.read_text(encoding="utf-8"))
+        if len(manifest["shards"]) != shards:
+            target.unlink()
+    if not target.exists():
+        write_corpus(path, n_docs, seed=seed, shards=shards)
+    if index_artifact:
+        build_index_artifacts(target)
+    return target
+
+
+# ---------------------------
+# One configuration (runs in its own process)
+# ---------------------------
+def bench_config(
+    path: str,
+    storage: str,
+    rankers: list[str],
+    queries: list[dict],
+    batch_size: int,
+    index_artifact: bool = False,
+) -> dict:
+    # this is a fresh process, so the setting only applies to this configuration
+    settings.RETRIEVAL_INDEX_ARTIFACT = index_artifact
+    rss_before = _rss_mb()
+    t0 = time.perf_counter()
+    service = RetrievalService(Path(path), watch_interval=0, storage=storage)
+    load_secs = time.perf_counter() - t0
+    # measure the index, not the result cache
+    service.cache.max_size = 0
+    rss_loaded = _rss_mb()
+
+    kinds = [q["kind"] for q in queries]
+    items = [{k: v for k, v in q.items() if k != "kind"} for q in queries]
+    out: dict[str, Any] = {
+        "load_secs": round(load_secs, 3),
+        "index_artifact": service.index.from_artifact,
+        "rss_mb": rss_loaded,
+        "index_rss_mb": round(rss_loaded - rss_before, 1) if rss_loaded is not None else None,
+        "rankers": {},
+    }
+    try:
+        for ranker in rankers:
+            # the first query pays for lazily built models (tfidf matrix, embeddings, trigrams)
+            t0 = time.perf_counter()
+            service.query_batch(items[:1], ranker)
+            warmup_secs = time.perf_counter() - t0
+
+            latencies, expand_ms, empty = [], [], 0
+            by_kind: dict[str, list[float]] = {}
+            t_all = time.perf_counter()
+            for kind, item in zip(kinds, items):
+                t0 = time.perf_counter()
+                res = service.query_batch([item], ranker)[0]
+                ms = (time.perf_counter() - t0) * 1000.0
+                latencies.append(ms)
+                by_kind.setdefault(kind, []).append(ms)
+                expand_ms.append(res["timings_ms"]["expand"])
+                empty += not res["results"]
+            serial_secs = time.perf_counter() - t_all
+
+            t0 = time.perf_counter()
+            for start in range(0, len(items), batch_size):
+                service.query_batch(items[start:start + batch_size], ranker)
+            batch_secs = time.perf_counter() - t0
+
+            out["rankers"][ranker] = {
+                "warmup_secs": round(warmup_secs, 3),
+                "latency_ms": _latency_summary(latencies),
+                "qps": round(len(items) / serial_secs, 1),
+                "batch_qps": round(len(items) / batch_secs, 1),
+                "expand_ms_mean": round(float(np.mean(expand_ms)), 3),
+                "empty_share": round(empty / len(items), 3),
+                "p50_by_kind_ms": {k: _latency_summary(v)["p50"] for k, v in sorted(by_kind.items())},
+                "rss_mb": _rss_mb(),
+            }
+    finally:
+        service.close()
+    return out
+
+
+# ---------------------------
+# Driver
+# ---------------------------
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    sizes: list[int],
+    storages: list[str],
+    shard_counts: list[int],
+    rankers: list[str],
+    n_queries: int = 500,
+    batch_size: int = 32,
+    seed: int = 0,
+    corpus_dir: Path | None = None,
+    index_artifact: bool = False,
+) -> dict:
+    results: dict[str, Any] = {
+        "meta": {
+            "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "n_queries": n_queries,
+            "batch_size": batch_size,
+            "seed": seed,
+            "index_artifact": index_artifact,
+            "query_mix": dict(QUERY_MIX),
+        },
+        "runs": [],
+    }
+    # spawn: every configuration starts from a clean interpreter
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        base = corpus_dir or Path(tmp)
+        for n_docs in sizes:
+            queries = generate_queries(n_queries, n_docs, seed=seed)
+            for shards in shard_counts:
+                path = corpus_for(n_docs, seed, shards, base, index_artifact)
+                files = list(path.parent.glob("*.jsonl")) if shards > 1 else [path]
+                corpus_mb = round(sum(f.stat().st_size for f in files) / 1e6, 1)
+                for storage in storages:
+                    print(f"n_docs={n_docs} shards={shards} storage={storage} ...", flush=True)
+                    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as ex:
+                        r = ex.submit(
+                            bench_config, str(path), storage, rankers, queries, batch_size, index_artifact
+                        ).result()
+                    results["runs"].append({
+                        "n_docs": n_docs,
+                        "shards": shards,
+                        "storage": storage,
+                        "corpus_mb": corpus_mb,
+                        **r,
+                    })
+    return results
+
+
+def _run_key(run: dict, ranker: str) -> tuple:
+    return (run["n_docs"], run["shards"], run["storage"], ranker)
+
+
+def compare(current: dict, baseline: dict) -> list[dict]:
+    """Per (size, shards, storage, ranker) present in both: relative change of p50, p95 and qps."""
+    base = {_run_key(r, rk): m for r in baseline["runs"] for rk, m in r["rankers"].items()}
+    rows = []
+    for r in current["runs"]:
+        for ranker, m in r["rankers"].items():
+            old = base.get(_run_key(r, ranker))
+            if old is None:
+                continue
+            change = {
+                "p50": m["latency_ms"]["p50"] / old["latency_ms"]["p50"] - 1.0,
+                "p95": m["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1.0,
+                "qps": m["qps"] / old["qps"] - 1.0,
+            }
+            regressed = (
+                change["p50"] > REGRESSION_THRESHOLD
+                or change["p95"] > REGRESSION_THRESHOLD
+                or change["qps"] < -REGRESSION_THRESHOLD
+            )
+            rows.append({"key": _run_key(r, ranker), "change": change, "regressed": regressed})
+    return rows
+
+
+def _print_results(results: dict) -> None:
+    for r in results["runs"]:
+        print(
+            f"\n{r['n_docs']:>9,} docs  shards={r['shards']}  storage={r['storage']}  "
+            f"corpus {r['corpus_mb']} MB  load {r['load_secs']:.2f}s  rss {r['rss_mb']} MB"
+        )
+        for ranker, m in r["rankers"].items():
+            lat = m["latency_ms"]
+            print(
+                f"  {ranker:8s} p50 {lat['p50']:8.2f}  p95 {lat['p95']:8.2f}  p99 {lat['p99']:8.2f} ms  "
+                f"{m['qps']:8.1f} q/s  batched {m['batch_qps']:8.1f} q/s  warmup {m['warmup_secs']:.2f}s"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated corpus sizes")
+    parser.add_argument("--storage", default="compact", help=f"comma-separated: {', '.join(STORAGE_MODES)}")
+    parser.add_argument("--shards", default="1", help="comma-separated shard counts (1 = unsharded)")
+    parser.add_argument("--rankers", default=",".join(RANKERS), help="comma-separated rankers")
+    parser.add_argument("--queries", type=int, default=500, help="queries per ranker")
+    parser.add_argument("--batch-size", type=int, default=32, help="items per query_batch call for batched q/s")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", type=Path, default=None, help="keep and reuse generated corpora here")
+    parser.add_argument("--out", type=Path, default=Path("retrieval_bench.json"), help="JSON results file")
+    parser.add_argument("--baseline", type=Path, default=None, help="earlier results file to compare against")
+    parser.add_argument(
+        "--index-artifact",
+        action="store_true",
+        help="build binary index artifacts and load from them (memory storage still parses the JSONL)",
+    )
+    args = parser.parse_args()
+
+    storages = args.storage.split(",")
+    rankers = args.rankers.split(",")
+    for s in storages:
+        if s not in STORAGE_MODES:
+            parser.error(f"unknown storage mode {s!r}")
+    for rk in rankers:
+        if rk not in RANKERS:
+            parser.error(f"unknown ranker {rk!r}")
+
+    results = run(
+        [int(s) for s in args.sizes.split(",")],
+        storages,
+        [int(s) for s in args.shards.split(",")],
+        rankers,
+        n_queries=args.queries,
+        batch_size=args.batch_size,
+        seed=args.seed,
+        corpus_dir=args.corpus_dir,
+        index_artifact=args.index_artifact,
+    )
+    _print_results(results)
+    args.out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"\nresults written to {args.out}")
+
+    if args.baseline:
+        rows = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")))
+        print(f"\nvs {args.baseline}:")
+        for row in rows:
+            n_docs, shards, storage, ranker = row["key"]
+            c = row["change"]
+            flag = "  REGRESSION" if row["regressed"] else ""
+            print(
+                f"  {n_docs:>9,} shards={shards} {storage:7s} {ranker:8s} "
+                f"p50 {c['p50']:+7.1%}  p95 {c['p95']:+7.1%}  q/s {c['qps']:+7.1%}{flag}"
+            )
+
+
+if __name__ == "__main__":
+    main()
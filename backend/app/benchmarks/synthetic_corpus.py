@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from pathlib import Path
+import random
+from typing import Iterator
+
+from app.pipelines.build_corpus import build_agent_corpus
+
+
+# Topic words get realistic (Zipf-like) reuse; the long tail stands in for rare terms,
+# names and identifiers that make real vocabularies large.
+TOPIC_WORDS = [
+    "machine", "learning", "hospital", "readmission", "prediction", "clinical", "health",
+    "neural", "network", "graph", "genomics", "cancer", "policy", "education", "climate",
+    "model", "data", "robotics", "vision", "language", "economics", "quantum", "materials",
+    "ehr", "survey", "deep", "statistics", "bayesian", "causal", "inference", "privacy",
+    "security", "energy", "imaging", "public", "outcomes", "students", "curriculum",
+    "forecasting", "optimization", "simulation", "sensor", "wireless", "ethics", "equity",
+]
+ORGS = ["NIH", "NSF", "DOE", "CUA", "MIT", "Stanford", "Johns Hopkins", "Georgetown", "UMD", ""]
+FIRST = ["Ana", "Ben", "Chen", "Dana", "Eli", "Fatima", "Gus", "Hana", "Ivan", "Jia", "Kofi", "Lena"]
+LAST = ["Smith", "Okafor", "Nguyen", "Garcia", "Kim", "Patel", "Rossi", "Cohen", "Silva", "Ito"]
+
+
+def _word(rng: random.Random, tail_size: int) -> str:
+    # ~70% topic words (skewed to the front of the list), ~30% long-tail terms
+    if rng.random() < 0.7:
+        return TOPIC_WORDS[min(int(rng.paretovariate(1.2)) - 1, len(TOPIC_WORDS) - 1)]
+    return f"term{int(rng.paretovariate(0.8)) % tail_size}"
+
+
+def _tail_size(n_docs: int) -> int:
+    return max(1000, n_docs // 2)
+
+
+def generate_docs(n_docs: int, seed: int = 0, grant_share: float = 0.6) -> Iterator[dict]:
+    """
+    Yields normalized docs (the preprocess() schema) for a synthetic faculty + grant corpus.
+    Deterministic for a given seed.
+    """
+    rng = random.Random(seed)
+    tail_size = _tail_size(n_docs)
+
+    for i in range(n_docs):
+        is_grant = rng.random() < grant_share
+        title_words = [_word(rng, tail_size) for _ in range(rng.randint(3, 9))]
+        summary_words = [_word(rng, tail_size) for _ in range(rng.randint(20, 160))]
+        people = [f"{rng.choice(FIRST)} {rng.choice(LAST)}" for _ in range(rng.randint(1, 3))]
+
+        yield {
+            "doc_id": f"{'G' if is_grant else 'F'}{i:08d}",
+            "source_type": "grant" if is_grant else "faculty_profile",
+            "title": " ".join(title_words).title(),
+            "summary": " ".join(summary_words),
+            "people": people if is_grant else people[:1],
+            "org": rng.choice(ORGS),
+            "year": rng.randint(2008, 2025) if is_grant else None,
+            "keywords": rng.sample(TOPIC_WORDS, 3),
+        }
+
+
+def write_corpus(out_path: Path, n_docs: int, seed: int = 0, shards: int = 1) -> Path:
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    return build_agent_corpus(generate_docs(n_docs, seed=seed), out_path=out_path, shards=shards)
+
+
+# (kind, share) of the benchmark query mix
+QUERY_MIX = [
+    ("short", 0.35),   # 1-2 topic words
+    ("medium", 0.25),  # 3-4 topic words
+    ("title", 0.10),   # a whole title-length phrase
+    ("rare", 0.10),    # topic words plus a long-tail term
+    ("typo", 0.15),    # topic words with one misspelled
+    ("miss", 0.05),    # nothing in the corpus matches
+]
+
+
+def _misspell(rng: random.Random, word: str) -> str:
+    i = rng.randrange(1, len(word) - 1)
+    op = rng.choice(("swap", "drop", "sub"))
+    if op == "swap":
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if op == "drop":
+        return word[:i] + word[i + 1:]
+    return word[:i] + rng.choice("aeiourst") + word[i + 1:]
+
+
+def generate_queries(n_queries: int, n_docs: int, seed: int = 0) -> list[dict]:
+    """
+    A query mix for a generate_docs(n_docs) corpus, as RetrievalService batch items with an
+    extra "kind" (see QUERY_MIX). About a quarter restrict source_type and about 15% carry
+    metadata filters. Deterministic for a given seed.
+    """
+    rng = random.Random(seed)
+    tail_size = _tail_size(n_docs)
+    kinds = [k for k, _ in QUERY_MIX]
+    weights = [w for _, w in QUERY_MIX]
+
+    out = []
+    for _ in range(n_queries):
+        kind = rng.choices(kinds, weights)[0]
+        n_words = {"short": rng.randint(1, 2), "medium": rng.randint(3, 4), "title": rng.randint(6, 9)}.get(kind, 2)
+        words = [_word(rng, tail_size) if kind == "title" else rng.choice(TOPIC_WORDS) for _ in range(n_words)]
+        if kind == "rare":
+            words.append(f"term{rng.randrange(tail_size)}")
+        elif kind == "typo":
+            long_words = [w for w in TOPIC_WORDS if len(w) >= 6]
+            words[-1] = _misspell(rng, rng.choice(long_words))
+        elif kind == "miss":
+            words = ["".join(rng.choice("qxzjvkw") for _ in range(rng.randint(4, 8)))]
+
+        filters = []
+        if rng.random() < 0.15:
+            filters.append(rng.choice([
+                f"year>={rng.randint(2010, 2024)}",
+                f"org={rng.choice(ORGS[:-1])}",
+                f"keyword={rng.choice(TOPIC_WORDS)}",
+            ]))
+        out.append({
+            "kind": kind,
+            "query": " ".join(words),
+            "top_k": rng.choice((5, 5, 10, 20)),
+            "source_type": rng.choice(("grant", "faculty_profile")) if rng.random() < 0.25 else None,
+            "filters": filters,
+        })
+    return out
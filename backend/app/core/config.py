@@ -14,6 +14,39 @@ class Settings(BaseModel):
     # Timeouts
     REQUEST_TIMEOUT_SECS: int = int(os.getenv("REQUEST_TIMEOUT_SECS", "30"))
 
+    # Retrieval: load the corpus at startup in the "background" (app serves immediately,
+    # /health reports "warming") or "blocking" (startup waits for the index)
+    RETRIEVAL_WARMUP: str = os.getenv("RETRIEVAL_WARMUP", "background")
+    # how often to stat agent_corpus.jsonl for hot reload (0 disables)
+    RETRIEVAL_WATCH_SECS: float = float(os.getenv("RETRIEVAL_WATCH_SECS", "5"))
+    # "compact" packs snippets/metadata into flat buffers, "memory" keeps parsed corpus rows
+    # resident, "mmap" decodes them from the file on demand
+    RETRIEVAL_STORAGE: str = os.getenv("RETRIEVAL_STORAGE", "compact")
+    # which corpus file to serve: "jsonl" (agent_corpus.jsonl), "gz" / "xz" (.jsonl.gz /
+    # .jsonl.xz) or "columnar" (.ccol), as written by run_pipeline --format
+    RETRIEVAL_CORPUS_FORMAT: str = os.getenv("RETRIEVAL_CORPUS_FORMAT", "jsonl")
+    # serve artifacts/agent_corpus.shards/ (build_agent_corpus(..., shards=N)) with one
+    # worker process per shard instead of agent_corpus.jsonl in-process
+    RETRIEVAL_SHARDED: bool = os.getenv("RETRIEVAL_SHARDED", "false").lower() in ("1", "true", "yes")
+    # map the binary index artifact written by the pipeline (agent_corpus.jsonl.idx, one per shard)
+    # instead of re-parsing the JSONL when it is current; falls back to the JSONL otherwise
+    RETRIEVAL_INDEX_ARTIFACT: bool = os.getenv("RETRIEVAL_INDEX_ARTIFACT", "true").lower() in ("1", "true", "yes")
+    # query result cache (LRU + TTL); size 0 disables it
+    RETRIEVAL_CACHE_SIZE: int = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+    RETRIEVAL_CACHE_TTL_SECS: float = float(os.getenv("RETRIEVAL_CACHE_TTL_SECS", "300"))
+
+    # Literature sources (override the base URLs to point at a mirror or a local stub).
+    # Each source keeps a pool of kept-alive connections; 429 / 5xx responses and
+    # connection errors are retried with jittered exponential backoff or Retry-After
+    LITERATURE_OPENALEX_URL: str = os.getenv("LITERATURE_OPENALEX_URL", "https://api.openalex.org")
+    LITERATURE_CROSSREF_URL: str = os.getenv("LITERATURE_CROSSREF_URL", "https://api.crossref.org")
+    LITERATURE_ARXIV_URL: str = os.getenv("LITERATURE_ARXIV_URL", "http://export.arxiv.org")
+    LITERATURE_HTTP_POOL_SIZE: int = int(os.getenv("LITERATURE_HTTP_POOL_SIZE", "8"))
+    LITERATURE_HTTP_RETRIES: int = int(os.getenv("LITERATURE_HTTP_RETRIES", "3"))
+    LITERATURE_HTTP_BACKOFF_SECS: float = float(os.getenv("LITERATURE_HTTP_BACKOFF_SECS", "0.5"))
+    # a Retry-After longer than this fails the request instead of waiting it out
+    LITERATURE_HTTP_MAX_RETRY_AFTER_SECS: float = float(os.getenv("LITERATURE_HTTP_MAX_RETRY_AFTER_SECS", "30"))
+
     # Debug / behavior flags
     DEBUG: bool = ENV == "dev"
 
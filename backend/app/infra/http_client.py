@@ -0,0 +1,143 @@
+import email.utils
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class PooledHTTPClient:
+    """
+    GETs against one remote service over a shared requests.Session, so consecutive calls
+    reuse kept-alive connections (no new DNS/TCP/TLS setup) from a pool of pool_size.
+
+    429 / 5xx responses and connection errors are retried up to `retries` times, after
+    the server's Retry-After if it sends one (unless it asks for more than
+    max_retry_after_secs, which fails fast instead), otherwise after exponential backoff
+    with full jitter: uniform(0, min(max_backoff_secs, backoff_secs * 2**attempt)).
+    A get's timeout is a deadline for all of its attempts together, not per attempt.
+    Thread-safe.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        pool_size: int = 8,
+        retries: int = 3,
+        backoff_secs: float = 0.5,
+        max_backoff_secs: float = 8.0,
+        max_retry_after_secs: float = 30.0,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff_secs = backoff_secs
+        self.max_backoff_secs = max_backoff_secs
+        self.max_retry_after_secs = max_retry_after_secs
+
+        self._session = requests.Session()
+        self._session.headers.update(headers or {})
+        # retries are ours (they need Retry-After and the stats), not urllib3's
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self._session.mount("http://", self._adapter)
+        self._session.mount("https://", self._adapter)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None, timeout: float = 25) -> requests.Response:
+        """
+        GET base_url/path; returns the final 2xx response or raises (HTTPError, ConnectionError,
+        Timeout). timeout bounds the whole call, retries and waits included: each attempt
+        gets what is left of it, and a retry whose wait would run past it is not made.
+        """
+        url = self.url(path)
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        while True:
+            with self._lock:
+                self.requests += 1
+            try:
+                r = self._session.get(url, params=params, timeout=max(deadline - time.monotonic(), 0.001))
+            except (requests.ConnectionError, requests.Timeout):
+                delay = self._backoff(attempt)
+                if attempt >= self.retries or time.monotonic() + delay >= deadline:
+                    self._failed()
+                    raise
+            else:
+                if r.status_code not in RETRY_STATUSES:
+                    if not r.ok:
+                        self._failed()
+                    r.raise_for_status()
+                    return r
+                delay = self._retry_after(r)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                if (
+                    attempt >= self.retries
+                    or delay > self.max_retry_after_secs
+                    or time.monotonic() + delay >= deadline
+                ):
+                    self._failed()
+                    r.raise_for_status()
+                # let the connection go back to the pool before sleeping
+                r.close()
+
+            attempt += 1
+            with self._lock:
+                self.retried += 1
+            time.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff_secs, self.backoff_secs * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(r: requests.Response) -> Optional[float]:
+        # delta-seconds or an HTTP-date (RFC 9110)
+        value = r.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, when.timestamp() - time.time())
+
+    def _failed(self) -> None:
+        with self._lock:
+            self.failures += 1
+
+    def stats(self) -> Dict[str, Any]:
+        # urllib3 counts, per host pool, the connections it opened and the requests it sent
+        # over them; every request beyond a new connection reused a kept-alive one
+        container = self._adapter.poolmanager.pools
+        pools = [p for p in map(container.get, container.keys()) if p is not None]
+        opened = sum(p.num_connections for p in pools)
+        sent = sum(p.num_requests for p in pools)
+        return {
+            "base_url": self.base_url,
+            "requests": self.requests,
+            "retries": self.retried,
+            "failures": self.failures,
+            "connections_opened": opened,
+            "connections_reused": max(0, sent - opened),
+        }
+
+    def close(self) -> None:
+        self._session.close()
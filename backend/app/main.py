@@ -1,9 +1,22 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from dotenv import load_dotenv
 
+from app.core.config import settings
 from app.core.cors import setup_cors
 from app.core.logging import setup_logging
 from app.api.router import api_router
+from app.services.retrieval_service import get_retriever, shutdown_retriever, warm_up_retriever
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One shared retriever per worker; a missing corpus doesn't block startup
+    warm_up_retriever(wait=settings.RETRIEVAL_WARMUP == "blocking")
+    yield
+    shutdown_retriever()
+
 
 def create_app() -> FastAPI:
     # Load env vars from backend/.env
@@ -11,7 +24,7 @@ def create_app() -> FastAPI:
 
     setup_logging()
 
-    app = FastAPI(title="Agentic AI (Professor Agent)", version="0.1.0")
+    app = FastAPI(title="Agentic AI (Professor Agent)", version="0.1.0", lifespan=lifespan)
 
     setup_cors(app)
 
@@ -20,7 +33,7 @@ def create_app() -> FastAPI:
 
     @app.get("/health")
     def health():
-        return {"status": "ok"}
+        return {"status": "ok", "retrieval": get_retriever().state}
 
     return app
 
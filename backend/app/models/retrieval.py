@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class RetrieveBatchItem(BaseModel):
+    query: str = Field(..., min_length=2)
+    top_k: int = Field(5, ge=1, le=20)
+    source_type: Optional[str] = None  # "grant" or "faculty_profile"
+    # metadata predicates applied before ranking, e.g. ["year>=2020", "org=MIT", "keyword=genomics"]
+    filters: List[str] = Field(default_factory=list, max_length=20)
+    # expand query words missing from the corpus vocabulary to close terms (typo tolerance)
+    fuzzy: bool = True
+
+
+class RetrieveBatchRequest(BaseModel):
+    items: List[RetrieveBatchItem] = Field(..., min_length=1, max_length=500)
+    ranker: str = "overlap"
+    # facet fields to count per item over its matching docs: source_type, year, org, keywords
+    facets: List[str] = Field(default_factory=list, max_length=4)
@@ -2,6 +2,10 @@ from __future__ import annotations
 
 from pathlib import Path
 import json
+import os
+from typing import Iterable
+
+from app.services.corpus_format import CORPUS_FORMATS, corpus_format, corpus_stem, open_corpus_writer
 
 
 def _repo_root() -> Path:
@@ -13,36 +17,128 @@ ARTIFACTS_DIR = REPO_ROOT / "artifacts"
 ARTIFACTS_DIR.mkdir(exist_ok=True)
 
 CORPUS_PATH = ARTIFACTS_DIR / "agent_corpus.jsonl"
+SHARD_MANIFEST = "manifest.json"
 
 
-def build_agent_corpus(docs: list[dict]) -> Path:
+def corpus_row(d: dict) -> dict:
+    """
+    One corpus line for a normalized doc: {"text": "...", "metadata": {...}}
+    """
+    keywords = d.get("keywords") or []
+    people = d.get("people") or []
+
+    text = (
+        f"Title: {d.get('title','')}\n"
+        f"Type: {d.get('source_type','')}\n"
+        f"Summary: {d.get('summary','')}\n"
+        f"People: {', '.join([str(p) for p in people if p])}\n"
+        f"Organization: {d.get('org','')}\n"
+        f"Year: {d.get('year','')}\n"
+        f"Keywords: {', '.join([str(k) for k in keywords if k])}\n"
+    ).strip()
+
+    metadata = {
+        "doc_id": d.get("doc_id"),
+        "source_type": d.get("source_type"),
+        "year": d.get("year"),
+        "org": d.get("org") or None,
+        "keywords": [str(k) for k in keywords if k],
+    }
+    # near-duplicates collapsed into this doc (see dedup.apply_dedup)
+    if d.get("merged_doc_ids"):
+        metadata["merged_doc_ids"] = d["merged_doc_ids"]
+
+    return {
+        "text": text,
+        # year/org/keywords are what retrieval filters and facets on
+        "metadata": metadata,
+    }
+
+
+def shard_dir_for(out_path: Path) -> Path:
+    """artifacts/agent_corpus.jsonl (or .jsonl.gz, ...) -> artifacts/agent_corpus.shards/"""
+    return out_path.with_name(corpus_stem(out_path) + ".shards")
+
+
+def build_agent_corpus(docs: Iterable[dict], out_path: Path = CORPUS_PATH, shards: int = 1) -> Path:
     """
     Builds a JSONL corpus the agent can retrieve from.
     Each line: {"text": "...", "metadata": {...}}
+
+    docs may be any iterable (e.g. a generator); each doc is written as it arrives.
+
+    Written to a temp file and renamed into place, so a server hot-reloading the
+    corpus never reads a half-written file. The format follows out_path's suffix:
+    .jsonl, gzip (.jsonl.gz), xz (.jsonl.xz) or columnar chunks (.ccol); see corpus_format.
+
+    With shards > 1, docs are dealt round-robin into shard files under
+    shard_dir_for(out_path) (doc i -> shard i % shards, line i // shards) and a
+    manifest.json is written last; the manifest path is returned. Round-robin keeps
+    shards balanced and lets a sharded reader recover each doc's original position.
     """
-    with open(CORPUS_PATH, "w", encoding="utf-8") as f:
-        for d in docs:
-            keywords = d.get("keywords") or []
-            people = d.get("people") or []
-
-            text = (
-                f"Title: {d.get('title','')}\n"
-                f"Type: {d.get('source_type','')}\n"
-                f"Summary: {d.get('summary','')}\n"
-                f"People: {', '.join([str(p) for p in people if p])}\n"
-                f"Organization: {d.get('org','')}\n"
-                f"Year: {d.get('year','')}\n"
-                f"Keywords: {', '.join([str(k) for k in keywords if k])}\n"
-            ).strip()
-
-            row = {
-                "text": text,
-                "metadata": {
-                    "doc_id": d.get("doc_id"),
-                    "source_type": d.get("source_type"),
-                },
-            }
-
-            f.write(json.dumps(row, ensure_ascii=False) + "\n")
-
-    return CORPUS_PATH
\ No newline at end of file
+    lines = (json.dumps(corpus_row(d), ensure_ascii=False) + "\n" for d in docs)
+    return write_corpus_lines(lines, out_path, shards)
+
+
+def write_corpus_lines(lines: Iterable[str], out_path: Path = CORPUS_PATH, shards: int = 1) -> Path:
+    """
+    build_agent_corpus for already serialized corpus lines (each ending in a newline),
+    e.g. the per-file segments of an incremental build. Same atomic write and sharding.
+    """
+    fmt = corpus_format(out_path)
+    if shards > 1:
+        return _build_sharded(lines, shard_dir_for(out_path), shards, fmt)
+
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    try:
+        with open_corpus_writer(tmp_path, fmt) as f:
+            for line in lines:
+                f.write(line)
+    except BaseException:
+        # a streamed source failed mid-way: keep the previous corpus, drop the partial one
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def _build_sharded(lines: Iterable[str], shard_dir: Path, shards: int, fmt: str = "jsonl") -> Path:
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    names = [f"shard-{s:03d}{CORPUS_FORMATS[fmt]}" for s in range(shards)]
+    tmp_paths = [shard_dir / (name + ".tmp") for name in names]
+
+    files = [open_corpus_writer(p, fmt) for p in tmp_paths]
+    n_docs = 0
+    try:
+        for i, line in enumerate(lines):
+            files[i % shards].write(line)
+            n_docs += 1
+    except BaseException:
+        for f in files:
+            f.close()
+        for p in tmp_paths:
+            p.unlink(missing_ok=True)
+        raise
+    finally:
+        for f in files:
+            f.close()
+
+    for tmp_path, name in zip(tmp_paths, names):
+        os.replace(tmp_path, shard_dir / name)
+
+    # the manifest is what readers watch, so it goes last
+    manifest_path = shard_dir / SHARD_MANIFEST
+    tmp_manifest = shard_dir / (SHARD_MANIFEST + ".tmp")
+    tmp_manifest.write_text(
+        json.dumps({"layout": "round_robin", "n_docs": n_docs, "shards": names}, indent=2),
+        encoding="utf-8",
+    )
+    os.replace(tmp_manifest, manifest_path)
+
+    # shards left over from an earlier, wider build (or one in another format)
+    for suffix in CORPUS_FORMATS.values():
+        for stale in shard_dir.glob(f"shard-*{suffix}"):
+            if stale.name not in names:
+                stale.unlink()
+    return manifest_path
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Optional
+
+from app.pipelines.build_corpus import CORPUS_PATH, SHARD_MANIFEST
+from app.services.corpus_index import CorpusIndex
+from app.services.index_artifact import index_path_for
+from app.services.segment_index import merge_segment_indexes, segment_index_is_current, write_segment_index
+
+
+def corpus_files(out_path: Path) -> list[Path]:
+    """The JSONL files behind a corpus path: the file itself, or every shard of a shard manifest."""
+    if out_path.name != SHARD_MANIFEST:
+        return [out_path]
+    manifest = json.loads(out_path.read_text(encoding="utf-8"))
+    return [out_path.parent / name for name in manifest["shards"]]
+
+
+def build_segment_indexes(segments: list[Path]) -> list[Path]:
+    """
+    Writes the segment index (see write_segment_index) of each segment that has no current
+    one. Segments are immutable, so each is parsed and tokenized once. Returns the segments
+    indexed.
+    """
+    todo = [seg for seg in segments if not segment_index_is_current(seg)]
+    for seg in todo:
+        write_segment_index(seg)
+    return todo
+
+
+def build_index_artifacts(
+    out_path: Path = CORPUS_PATH, force: bool = False, segments: Optional[list[Path]] = None
+) -> list[Path]:
+    """
+    Writes the binary retrieval index (agent_corpus.jsonl.idx, or shard-NNN.jsonl.idx per
+    shard; see index_path_for) next to each corpus file, so servers map it instead of
+    re-parsing and re-tokenizing the JSONL on every start and every worker shares one copy
+    in the page cache. Files whose artifact is already current are skipped unless force.
+    Returns the artifacts written.
+
+    segments are the files the corpus was assembled from, in order (an incremental build's
+    per-input-file segments). With them, each artifact is merged from the segments' indexes
+    instead of parsing the corpus, so only segments not indexed before are tokenized.
+    """
+    written = []
+    files = corpus_files(out_path)
+    for shard, path in enumerate(files):
+        if force or not CorpusIndex.artifact_is_current(path):
+            if segments is None:
+                index = CorpusIndex.load(path, storage="compact", use_artifact=False)
+            else:
+                build_segment_indexes(segments)
+                index = merge_segment_indexes(path, segments, shard, len(files))
+            written.append(index.save_artifact())
+
+    if out_path.name == SHARD_MANIFEST:
+        # artifacts of shards left over from an earlier, wider build
+        live = {index_path_for(p).name for p in files}
+        for stale in out_path.parent.glob("shard-*.idx"):
+            if stale.name not in live:
+                stale.unlink()
+    return written
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import string
+from typing import Iterable, Iterator
+import zlib
+
+import numpy as np
+
+
+# MinHash signature length and its split into LSH bands: two docs become candidates when
+# all rows of any one band agree, which for Jaccard similarity s happens with probability
+# 1 - (1 - s**ROWS)**BANDS (~0.9998 at s=0.8, ~0.02 at s=0.3); candidates are then checked
+# against DEDUP_THRESHOLD on the full signatures
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+DEDUP_THRESHOLD = 0.8
+# word n-grams the similarity is taken over
+SHINGLE_WORDS = 3
+# docs with fewer words than this (e.g. "Untitled Grant" and no abstract) are never merged:
+# there is too little text to tell a copy from a different record
+MIN_WORDS = 8
+BATCH_DOCS = 512
+VERIFY_CHUNK = 1 << 16  # candidate pairs compared at a time (bounds the temporary copies)
+# LSH buckets up to this size have all their pairs checked (see _bucket_pairs)
+BUCKET_ALL_PAIRS = 64
+
+_PUNCT_TO_SPACE = bytes.maketrans(string.punctuation.encode(), b" " * len(string.punctuation))
+# multiply-shift hashing, one (odd a, b) pair per permutation: the high 32 bits of a*x + b
+# (mod 2**64); fixed seed, since signatures must not change between runs
+_rng = np.random.default_rng(0x5EED)
+_A = (_rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1))[:, None]
+_B = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64)[:, None]
+
+
+def _word_hashes(doc: dict) -> list[int]:
+    text = f"{doc.get('title') or ''} {doc.get('summary') or ''}".lower().encode("utf-8")
+    return list(map(zlib.crc32, text.translate(_PUNCT_TO_SPACE).split()))
+
+
+def _signatures(word_hashes: list[int], doc_lengths: list[int]) -> np.ndarray:
+    """
+    (len(doc_lengths), NUM_PERM) uint32 MinHash signatures of a batch of docs, given their
+    word hashes back to back.
+    """
+    flat = np.array(word_hashes, dtype=np.uint64)
+    lengths = np.array(doc_lengths, dtype=np.int64)
+    # shingle hash from SHINGLE_WORDS consecutive word hashes, only where they share a doc
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    n_shingles = lengths - (SHINGLE_WORDS - 1)
+    keep = np.ones(max(flat.size - (SHINGLE_WORDS - 1), 0), dtype=bool)
+    for i in range(1, SHINGLE_WORDS):
+        ends = starts + lengths - i  # positions whose n-gram would run into the next doc
+        keep[ends[ends < keep.size]] = False
+    shingles = np.zeros(keep.size, dtype=np.uint64)
+    for i in range(SHINGLE_WORDS):
+        shingles = (shingles * np.uint64(0x01000193) + flat[i:i + keep.size]) & np.uint64(0xFFFFFFFF)
+    shingles = shingles[keep]
+    # one hash per permutation; the signature is the minimum per doc
+    # (in place: the temporaries of a one-line expression cost several times the arithmetic)
+    hashed = _A * shingles[None, :]
+    hashed += _B
+    hashed >>= np.uint64(32)
+    offsets = np.concatenate(([0], np.cumsum(n_shingles)[:-1]))
+    return np.minimum.reduceat(hashed, offsets, axis=1).T.astype(np.uint32)
+
+
+@dataclass
+class DedupPlan:
+    """
+    Result of find_near_duplicates, by position in the doc stream: dropped maps each
+    duplicate to its doc_id, merged maps each cluster's canonical doc (its first) to the
+    doc_ids merged into it.
+    """
+    n_docs: int = 0
+    merged: dict[int, list] = field(default_factory=dict)
+    dropped: dict[int, object] = field(default_factory=dict)
+    candidate_pairs: int = 0
+
+    @property
+    def n_kept(self) -> int:
+        return self.n_docs - len(self.dropped)
+
+
+def _bucket_pairs(sorted_keys: np.ndarray) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """
+    Candidate pairs, as positions into sorted_keys, among docs sharing a bucket key. In
+    buckets of up to BUCKET_ALL_PAIRS docs every pair is a candidate: pairing only
+    neighbours would miss two near-duplicates whenever an unrelated doc sorts between them.
+    Bigger buckets are almost always one large cluster; their docs are paired with the
+    bucket's first doc and with their neighbour, which keeps the cluster connected without
+    a quadratic number of pairs.
+    """
+    n = len(sorted_keys)
+    starts_mask = np.ones(n, dtype=bool)
+    starts_mask[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    starts = np.flatnonzero(starts_mask)
+    sizes = np.diff(np.append(starts, n))
+    bucket = np.cumsum(starts_mask) - 1
+    size = sizes[bucket]
+
+    small = np.flatnonzero((size > 1) & (size <= BUCKET_ALL_PAIRS))
+    ends = starts[bucket[small]] + size[small]
+    for d in range(1, int(size[small].max()) if len(small) else 1):
+        has = small + d < ends
+        yield small[has], small[has] + d
+
+    large = np.flatnonzero((size > BUCKET_ALL_PAIRS) & ~starts_mask)
+    yield starts[bucket[large]], large
+    yield large - 1, large
+
+
+def _find(parent: list[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def find_near_duplicates(docs: Iterable[dict], threshold: float = DEDUP_THRESHOLD) -> DedupPlan:
+    """
+    First pass: MinHash signatures of every doc's title + summary, LSH banding for candidate
+    pairs (one sort per band, so O(n log n) rather than all pairs), then clusters of docs
+    whose estimated Jaccard similarity is at least threshold. Memory is the signatures
+    (NUM_PERM * 4 bytes per doc) and the doc_ids, not the docs.
+    """
+    doc_ids: list = []
+    eligible: list[int] = []
+    sig_batches: list[np.ndarray] = []
+    words: list[int] = []
+    lengths: list[int] = []
+    for doc in docs:
+        hashes = _word_hashes(doc)
+        if len(hashes) >= max(MIN_WORDS, SHINGLE_WORDS):
+            eligible.append(len(doc_ids))
+            words.extend(hashes)
+            lengths.append(len(hashes))
+            if len(lengths) == BATCH_DOCS:
+                sig_batches.append(_signatures(words, lengths))
+                words, lengths = [], []
+        doc_ids.append(doc.get("doc_id"))
+    if lengths:
+        sig_batches.append(_signatures(words, lengths))
+
+    plan = DedupPlan(n_docs=len(doc_ids))
+    if len(eligible) < 2:
+        return plan
+    sigs = np.concatenate(sig_batches)
+    del sig_batches
+    positions = np.asarray(eligible, dtype=np.int64)
+
+    n = len(sigs)
+    pair_keys: list[np.ndarray] = []
+    for band in range(BANDS):
+        # the band's rows folded into one 64-bit bucket key; a rare collision only costs a
+        # failed check below
+        keys = np.zeros(n, dtype=np.uint64)
+        for row in range(band * ROWS, (band + 1) * ROWS):
+            keys = keys * np.uint64(0x100000001B3) + sigs[:, row]
+        order = np.argsort(keys, kind="stable")
+        for a, b in _bucket_pairs(keys[order]):
+            a, b = order[a], order[b]
+            pair_keys.append(np.minimum(a, b) * n + np.maximum(a, b))
+    # the same pair usually shares several bands: check it once
+    pairs = np.unique(np.concatenate(pair_keys))
+    plan.candidate_pairs = len(pairs)
+
+    parent = list(range(n))
+    for start in range(0, len(pairs), VERIFY_CHUNK):
+        a, b = np.divmod(pairs[start:start + VERIFY_CHUNK], n)
+        similar = np.count_nonzero(sigs[a] == sigs[b], axis=1) >= threshold * NUM_PERM
+        for x, y in zip(a[similar].tolist(), b[similar].tolist()):
+            rx, ry = _find(parent, x), _find(parent, y)
+            # the earliest doc stays the cluster's root, i.e. its canonical doc
+            parent[max(rx, ry)] = min(rx, ry)
+
+    for i in range(n):
+        root = _find(parent, i)
+        if root != i:
+            pos, canonical = int(positions[i]), int(positions[root])
+            plan.dropped[pos] = doc_ids[pos]
+            plan.merged.setdefault(canonical, []).append(doc_ids[pos])
+    return plan
+
+
+def apply_dedup(docs: Iterable[dict], plan: DedupPlan) -> Iterator[dict]:
+    """
+    Second pass over the same doc stream: drops the duplicates and gives each canonical doc
+    a merged_doc_ids list. Raises ValueError if the stream differs from the first pass.
+    """
+    n = 0
+    for pos, doc in enumerate(docs):
+        n += 1
+        if pos in plan.dropped:
+            if doc.get("doc_id") != plan.dropped[pos]:
+                raise ValueError(f"Input changed between dedup passes (doc {pos})")
+            continue
+        if pos in plan.merged:
+            doc = {**doc, "merged_doc_ids": plan.merged[pos]}
+        yield doc
+    if n != plan.n_docs:
+        raise ValueError(f"Input changed between dedup passes ({n} docs, expected {plan.n_docs})")
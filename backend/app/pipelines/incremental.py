@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import time
+from typing import Any, Iterator, Optional
+
+from app.pipelines.build_corpus import (
+    CORPUS_PATH,
+    REPO_ROOT,
+    SHARD_MANIFEST,
+    corpus_row,
+    shard_dir_for,
+    write_corpus_lines,
+)
+from app.pipelines.build_index import corpus_files
+from app.pipelines.ingest import RAW_SOURCES, iter_json_records
+from app.pipelines.parallel import TASK_FILES
+from app.pipelines.preprocess import NORMALIZERS
+from app.services.corpus_format import corpus_stem
+from app.services.index_artifact import index_path_for
+
+
+# bump when the manifest layout or the segment contents (corpus_row) change: a manifest
+# with another version is ignored, which re-normalizes every file once
+MANIFEST_VERSION = 1
+HASH_CHUNK = 1 << 20
+
+
+def build_manifest_for(out_path: Path) -> Path:
+    """artifacts/agent_corpus.jsonl (or .jsonl.gz, ...) -> artifacts/agent_corpus.build.json"""
+    return out_path.with_name(corpus_stem(out_path) + ".build.json")
+
+
+def segment_dir_for(out_path: Path) -> Path:
+    """artifacts/agent_corpus.jsonl (or .jsonl.gz, ...) -> artifacts/agent_corpus.segments/"""
+    return out_path.with_name(corpus_stem(out_path) + ".segments")
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_key(path: Path) -> str:
+    # repo-relative where possible, so a moved checkout keeps its manifest
+    try:
+        return path.resolve().relative_to(REPO_ROOT).as_posix()
+    except ValueError:
+        return str(path.resolve())
+
+
+def _segment_name(key: str, sha256: str) -> str:
+    # one immutable segment per (file, content): a reused segment always matches its hash
+    return f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}-{sha256[:16]}.jsonl"
+
+
+def _output_signature(path: Path) -> Optional[list[int]]:
+    # detects a corpus rewritten behind the manifest's back (e.g. by a full run)
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _load_manifest(path: Path) -> dict:
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+    return manifest if manifest.get("version") == MANIFEST_VERSION else {}
+
+
+def write_segment(source: str, path: str, segment: str) -> list:
+    """
+    Parses and normalizes one input file into its corpus lines (written atomically to
+    `segment`). Returns the emitted doc_ids. Runs in pool workers too.
+    """
+    normalize = NORMALIZERS[source]
+    tmp = segment + ".tmp"
+    doc_ids = []
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            for record in iter_json_records(Path(path)):
+                d = normalize(record)
+                doc_ids.append(d.get("doc_id"))
+                f.write(json.dumps(corpus_row(d), ensure_ascii=False) + "\n")
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    os.replace(tmp, segment)
+    return doc_ids
+
+
+def _segment_lines(segment_dir: Path, files: dict[str, dict]) -> Iterator[str]:
+    for entry in files.values():
+        with open(segment_dir / entry["segment"], "r", encoding="utf-8") as f:
+            yield from f
+
+
+def build_incremental(out_path: Path = CORPUS_PATH, shards: int = 1, workers: int = 1) -> dict[str, Any]:
+    """
+    Brings the corpus up to date with data/*_raw/ while only re-processing what changed.
+
+    A build manifest next to the corpus maps each input file to its size, mtime, content
+    hash and emitted doc_ids, and each file's corpus lines are kept as a segment file. A
+    file whose content hash matches the manifest keeps its segment (the hash is only
+    recomputed when size or mtime moved); new or changed files are re-ingested and
+    re-normalized (in `workers` processes if > 1); segments of deleted files are dropped.
+    The corpus is then reassembled from the segments in the full pipeline's order
+    (byte-identical to a full build) and atomically swapped in, which the retrieval
+    server hot-reloads. When nothing changed the corpus is not touched at all. The
+    returned segments let build_index_artifacts update the index the same way.
+    """
+    start = time.perf_counter()
+    manifest_path = build_manifest_for(out_path)
+    segment_dir = segment_dir_for(out_path)
+    segment_dir.mkdir(parents=True, exist_ok=True)
+    target = shard_dir_for(out_path) / SHARD_MANIFEST if shards > 1 else out_path
+
+    old = _load_manifest(manifest_path)
+    old_files: dict[str, dict] = old.get("files", {})
+    files: dict[str, dict] = {}  # in corpus order
+    todo: list[tuple[str, str, Path]] = []  # (key, source, path)
+    counts: Counter = Counter()
+    bytes_read = 0
+
+    for source, folder in RAW_SOURCES.items():
+        if not folder.exists():
+            raise FileNotFoundError(f"Folder not found: {folder}")
+        for fp in sorted(folder.glob("*.json")):
+            key = _file_key(fp)
+            st = fp.stat()
+            prev = old_files.get(key)
+            if prev is not None and prev["source"] != source:
+                prev = None
+            # unchanged size + mtime: trust the recorded hash instead of reading the file
+            same_stat = prev is not None and (prev["size"], prev["mtime_ns"]) == (st.st_size, st.st_mtime_ns)
+            digest = prev["sha256"] if same_stat else file_sha256(fp)
+            bytes_read += 0 if same_stat else st.st_size
+            entry: dict[str, Any] = {
+                "source": source,
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "sha256": digest,
+                "segment": _segment_name(key, digest),
+            }
+            if prev is not None and prev["sha256"] == digest and (segment_dir / entry["segment"]).exists():
+                entry["doc_ids"] = prev["doc_ids"]
+                counts["unchanged"] += 1
+            else:
+                todo.append((key, source, fp))
+                counts["changed" if prev else "added"] += 1
+                bytes_read += st.st_size
+            files[key] = entry
+    removed = [key for key in old_files if key not in files]
+    counts["removed"] = len(removed)
+
+    if todo:
+        args = (
+            [source for _, source, _ in todo],
+            [str(fp) for _, _, fp in todo],
+            [str(segment_dir / files[key]["segment"]) for key, _, _ in todo],
+        )
+        if workers > 1:
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as ex:
+                results = list(ex.map(write_segment, *args, chunksize=TASK_FILES))
+        else:
+            results = [write_segment(*a) for a in zip(*args)]
+        for (key, _, _), doc_ids in zip(todo, results):
+            files[key]["doc_ids"] = doc_ids
+
+    stale_output = old.get("shards") != shards or old.get("output") != _output_signature(target)
+    rebuilt = bool(todo or removed or stale_output)
+    bytes_written = sum((segment_dir / files[key]["segment"]).stat().st_size for key, _, _ in todo)
+    if rebuilt:
+        write_corpus_lines(_segment_lines(segment_dir, files), out_path, shards)
+        bytes_read += sum((segment_dir / entry["segment"]).stat().st_size for entry in files.values())
+        bytes_written += sum(p.stat().st_size for p in corpus_files(target))
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "shards": shards,
+        "output": _output_signature(target),
+        "files": files,
+    }
+    tmp_manifest = manifest_path.with_name(manifest_path.name + ".tmp")
+    tmp_manifest.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(tmp_manifest, manifest_path)
+
+    # segments of deleted inputs (and their segment indexes) and leftovers of interrupted builds
+    live = {entry["segment"] for entry in files.values()}
+    live |= {index_path_for(Path(name)).name for name in live}
+    for seg in segment_dir.iterdir():
+        if seg.name not in live:
+            seg.unlink()
+
+    return {
+        "out_path": str(target),
+        # what the corpus was assembled from, in order (see build_index_artifacts)
+        "segments": [str(segment_dir / entry["segment"]) for entry in files.values()],
+        "rebuilt": rebuilt,
+        "files": {k: counts[k] for k in ("unchanged", "changed", "added", "removed")},
+        "docs": sum(len(entry["doc_ids"]) for entry in files.values()),
+        "reprocessed_docs": sum(len(files[key]["doc_ids"]) for key, _, _ in todo),
+        # input files hashed or re-normalized and segments reassembled / segments and corpus written
+        "bytes_read": bytes_read,
+        "bytes_written": bytes_written,
+        "secs": round(time.perf_counter() - start, 3),
+    }
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from pathlib import Path
 import json
-from typing import Any
+from typing import Any, Iterator
 
 
 def _repo_root() -> Path:
@@ -14,42 +14,149 @@ REPO_ROOT = _repo_root()
 DATA_DIR = REPO_ROOT / "data"
 
 
-def _load_json_file(path: Path) -> Any:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+# text read per refill of the incremental parser; grows while a single record is incomplete
+READ_CHUNK = 1 << 16
 
+_decoder = json.JSONDecoder()
+_WS = " \t\n\r"
+_NUMBER_END = _WS + ",]}"
 
-def load_json_folder(folder: Path) -> list[dict]:
+
+def iter_json_values(path: Path, chunk_size: int = READ_CHUNK) -> Iterator[Any]:
+    """
+    Parses a JSON file incrementally. A top-level array yields its elements one at a
+    time; anything else yields each top-level value in turn (a single object, or
+    concatenated / line-delimited values). Memory is bounded by the largest single
+    element rather than the file, so multi-GB array dumps never sit in memory at once.
     """
-    Loads JSON records from a folder.
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        eof = False
+        read_size = chunk_size
+
+        def fill() -> bool:
+            # drop the consumed prefix and append the next chunk; False at end of file
+            nonlocal buf, pos, eof
+            if eof:
+                return False
+            chunk = f.read(read_size)
+            if not chunk:
+                eof = True
+                return False
+            buf = buf[pos:] + chunk
+            pos = 0
+            return True
+
+        def skip_ws() -> bool:
+            # advance to the next non-whitespace char; False at end of file
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in _WS:
+                    pos += 1
+                if pos < len(buf):
+                    return True
+                if not fill():
+                    return False
+
+        def decode() -> Any:
+            nonlocal pos, read_size
+            while True:
+                try:
+                    value, end = _decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # objects, arrays, strings and literals end unambiguously; a number cut by
+                    # the buffer ("12" of "123", "65" of "65.5") only counts once a delimiter follows
+                    number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                    if eof or not number or (end < len(buf) and buf[end] in _NUMBER_END):
+                        pos = end
+                        read_size = chunk_size
+                        return value
+                # incomplete: read more, doubling the refill so huge records parse in linear time
+                if fill():
+                    read_size *= 2
+
+        if not skip_ws():
+            return
+        if buf[pos] != "[":
+            while skip_ws():
+                yield decode()
+            return
+
+        pos += 1
+        expect = "first"  # "first" element or "]", a "value" after a comma, or a "comma" / "]"
+        while True:
+            if not skip_ws():
+                raise json.JSONDecodeError("Unterminated array", buf, pos)
+            c = buf[pos]
+            if expect == "comma":
+                if c not in ",]":
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buf, pos)
+                pos += 1
+                if c == "]":
+                    break
+                expect = "value"
+            elif c == "]" and expect == "first":
+                pos += 1
+                break
+            else:
+                yield decode()
+                expect = "comma"
+
+        if skip_ws():
+            raise json.JSONDecodeError("Extra data", buf, pos)
+
+
+def iter_json_folder(folder: Path) -> Iterator[dict]:
+    """
+    Streams the JSON records of a folder, file by file in name order.
 
     Supports:
     - many .json files (each file is a dict record)
-    - single .json file containing a list[dict]
+    - .json files containing a list[dict], parsed element by element
     """
     if not folder.exists():
         raise FileNotFoundError(f"Folder not found: {folder}")
 
-    files = sorted(folder.glob("*.json"))
-    if not files:
-        return []
+    for fp in sorted(folder.glob("*.json")):
+        yield from iter_json_records(fp)
 
-    records: list[dict] = []
 
-    for fp in files:
-        data = _load_json_file(fp)
+def iter_json_records(path: Path) -> Iterator[dict]:
+    """The dict records of one JSON file (other shapes are ignored); errors name the file."""
+    try:
+        for value in iter_json_values(path):
+            if isinstance(value, dict):
+                yield value
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path}: {e}") from e
 
-        if isinstance(data, list):
-            # one file contains multiple records
-            records.extend([x for x in data if isinstance(x, dict)])
-        elif isinstance(data, dict):
-            # one file per record
-            records.append(data)
-        else:
-            # ignore unexpected shapes
-            continue
 
-    return records
+def load_json_folder(folder: Path) -> list[dict]:
+    """iter_json_folder, materialized."""
+    if not folder.exists():
+        raise FileNotFoundError(f"Folder not found: {folder}")
+    return list(iter_json_folder(folder))
+
+
+RAW_SOURCES = {
+    "faculty_profiles": DATA_DIR / "faculty_profiles_raw",
+    "grants": DATA_DIR / "grants_raw",
+}
+
+
+def iter_raw() -> Iterator[tuple[str, dict]]:
+    """
+    Streams (source, record) pairs from:
+      data/faculty_profiles_raw/  (source "faculty_profiles")
+      data/grants_raw/            (source "grants")
+    """
+    for source, folder in RAW_SOURCES.items():
+        for record in iter_json_folder(folder):
+            yield source, record
 
 
 def ingest_raw() -> dict[str, list[dict]]:
@@ -58,7 +165,4 @@ def ingest_raw() -> dict[str, list[dict]]:
       data/faculty_profiles_raw/
       data/grants_raw/
     """
-    return {
-        "faculty_profiles": load_json_folder(DATA_DIR / "faculty_profiles_raw"),
-        "grants": load_json_folder(DATA_DIR / "grants_raw"),
-    }
\ No newline at end of file
+    return {source: load_json_folder(folder) for source, folder in RAW_SOURCES.items()}
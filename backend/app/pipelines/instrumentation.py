@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+import cProfile
+from dataclasses import dataclass, field, fields
+import datetime
+import json
+import os
+from pathlib import Path
+import resource
+import sys
+import time
+from typing import Iterable, Iterator, Optional, TypeVar
+
+from app.pipelines.build_corpus import ARTIFACTS_DIR
+
+T = TypeVar("T")
+
+# the thread CPU clock is a syscall, several times the cost of perf_counter; it is read once
+# per this many stage transitions and the CPU time in between split by wall time (see _switch)
+CPU_SAMPLE_EVERY = 256
+
+# one JSON report per run (plus <run>.<stage>.prof files when profiling)
+REPORT_DIR = ARTIFACTS_DIR / "pipeline_runs"
+
+
+def _rss_mb(who: int) -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1 << 20) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+@dataclass
+class StageStats:
+    """
+    One pipeline stage. wall/cpu are exclusive: time spent in this stage's own code, not
+    in the stages it pulls records from (see PipelineReport). records_in is None for a
+    stage that reads files rather than records. peak_rss_mb is the process high-water
+    mark when the stage finished, so stages that stream together share it;
+    workers_peak_rss_mb is that of the largest worker process, if the stage used any.
+    """
+    name: str
+    wall_secs: float = 0.0
+    cpu_secs: float = 0.0
+    workers_cpu_secs: float = 0.0
+    records_in: Optional[int] = None
+    records_out: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    peak_rss_mb: Optional[float] = None
+    workers_peak_rss_mb: Optional[float] = None
+    profile: Optional[str] = None
+    _profiler: Optional[cProfile.Profile] = field(default=None, repr=False)
+    _window_wall: float = field(default=0.0, repr=False)
+
+    @property
+    def records_per_sec(self) -> Optional[float]:
+        n = self.records_out or self.records_in
+        return round(n / self.wall_secs, 1) if n and self.wall_secs > 0 else None
+
+    def to_dict(self) -> dict:
+        out = {f.name: getattr(self, f.name) for f in fields(self) if not f.name.startswith("_")}
+        out["wall_secs"] = round(self.wall_secs, 3)
+        out["cpu_secs"] = round(self.cpu_secs, 3)
+        out["workers_cpu_secs"] = round(self.workers_cpu_secs, 3)
+        out["records_per_sec"] = self.records_per_sec
+        return out
+
+
+class PipelineReport:
+    """
+    Per-stage wall time, CPU time, record counts, bytes and peak memory for one run.
+
+    The pipeline streams: the corpus writer pulls docs from preprocess, which pulls
+    records from ingest, all interleaved in one thread. Timing is therefore charged to
+    whichever stage is on top of a stack: stage() pushes a stage for a block of code and
+    meter() pushes one around every record pulled from its iterator, so the wall time
+    between two transitions goes to exactly one stage (CPU time is read more coarsely, see
+    CPU_SAMPLE_EVERY). With profile=True every stage gets its own cProfile.Profile,
+    switched the same way, and is dumped next to the report.
+    """
+
+    def __init__(self, profile: bool = False, **params):
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        # microseconds and the pid, so runs started in the same second (or at the same
+        # instant in parallel) never share, and overwrite, each other's report files
+        self.run_id = f"{self.started.strftime('%Y%m%dT%H%M%S%fZ')}-{os.getpid()}"
+        self.params = params
+        self.profile = profile
+        self.stages: list[StageStats] = []
+        self.extra: dict = {}
+        self._stack: list[StageStats] = []
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        self._switches = 0
+        self._t0 = self._wall
+
+    def _new(self, name: str) -> StageStats:
+        stats = StageStats(name, _profiler=cProfile.Profile() if self.profile else None)
+        self.stages.append(stats)
+        return stats
+
+    def _switch(self, push: Optional[StageStats] = None) -> None:
+        # charge the wall time since the last transition to the running stage, then push/pop
+        wall = time.perf_counter()
+        top = self._stack[-1] if self._stack else None
+        if top is not None:
+            top.wall_secs += wall - self._wall
+            top._window_wall += wall - self._wall
+        if push is not None:
+            if top is not None and top._profiler:
+                top._profiler.disable()
+            self._stack.append(push)
+            if push._profiler:
+                push._profiler.enable()
+        else:
+            if top._profiler:
+                top._profiler.disable()
+            self._stack.pop()
+            below = self._stack[-1] if self._stack else None
+            if below is not None and below._profiler:
+                below._profiler.enable()
+        self._switches += 1
+        if self._switches % CPU_SAMPLE_EVERY == 0 or not self._stack:
+            self._charge_cpu()
+        # the switch itself is charged to the new top rather than lost
+        self._wall = wall
+
+    def _charge_cpu(self) -> None:
+        # the CPU time since the last reading, split over the stages that ran in between in
+        # proportion to their wall time; exact whenever only one stage ran
+        cpu = time.thread_time()
+        ran = [s for s in self.stages if s._window_wall > 0]
+        window = sum(s._window_wall for s in ran)
+        for s in ran:
+            s.cpu_secs += (cpu - self._cpu) * s._window_wall / window
+            s._window_wall = 0.0
+        self._cpu = cpu
+
+    def _close(self, stats: StageStats, workers_cpu_before: Optional[float]) -> None:
+        self._charge_cpu()
+        stats.peak_rss_mb = _rss_mb(resource.RUSAGE_SELF)
+        if workers_cpu_before is not None:
+            stats.workers_cpu_secs = _children_cpu() - workers_cpu_before
+            stats.workers_peak_rss_mb = _rss_mb(resource.RUSAGE_CHILDREN)
+
+    @contextmanager
+    def stage(self, name: str, workers: bool = False) -> Iterator[StageStats]:
+        """
+        Times a block as one stage; the caller fills in records and bytes. workers=True
+        also attributes the CPU time of child processes reaped during the block to it.
+        """
+        stats = self._new(name)
+        workers_cpu = _children_cpu() if workers else None
+        self._switch(push=stats)
+        try:
+            yield stats
+        finally:
+            self._switch()
+            self._close(stats, workers_cpu)
+
+    def meter(self, name: str, items: Iterable[T], workers: bool = False) -> Iterator[T]:
+        """
+        items, passed through as a stage: the work done producing each record is
+        charged to it, and records_out counts them. The stage closes when items is exhausted.
+        """
+        # registered now, not on first pull, so stages are listed in the order they are set up
+        stats = self._new(name)
+        return self._metered(stats, iter(items), _children_cpu() if workers else None)
+
+    def _metered(self, stats: StageStats, it: Iterator[T], workers_cpu: Optional[float]) -> Iterator[T]:
+        try:
+            while True:
+                self._switch(push=stats)
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                finally:
+                    self._switch()
+                stats.records_out += 1
+                yield item
+        finally:
+            self._close(stats, workers_cpu)
+
+    def get(self, name: str) -> StageStats:
+        return next(s for s in self.stages if s.name == name)
+
+    # ---------------------------
+    # Output
+    # ---------------------------
+    def to_dict(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started.isoformat(timespec="seconds"),
+            "params": self.params,
+            "wall_secs": round(time.perf_counter() - self._t0, 3),
+            "cpu_secs": round(time.process_time(), 3),
+            "workers_cpu_secs": round(_children_cpu(), 3),
+            "peak_rss_mb": _rss_mb(resource.RUSAGE_SELF),
+            "stages": [s.to_dict() for s in self.stages],
+            **self.extra,
+        }
+
+    def write(self, report_dir: Path = REPORT_DIR) -> Path:
+        """Writes <run_id>.json (and <run_id>.<stage>.prof per stage when profiling) to report_dir."""
+        report_dir.mkdir(parents=True, exist_ok=True)
+        for s in self.stages:
+            if s._profiler is not None:
+                path = report_dir / f"{self.run_id}.{s.name}.prof"
+                s._profiler.dump_stats(str(path))
+                s.profile = str(path)
+        out = report_dir / f"{self.run_id}.json"
+        tmp = out.with_name(out.name + ".tmp")
+        tmp.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+        os.replace(tmp, out)
+        return out
+
+    def print(self) -> None:
+        def num(v) -> str:
+            return "-" if v is None else f"{v:,}"
+
+        print(
+            f"{'stage':18s} {'wall s':>8s} {'cpu s':>8s} {'wkr cpu s':>9s} {'in':>10s} {'out':>10s} "
+            f"{'rec/s':>10s} {'read MB':>9s} {'write MB':>9s} {'peak MB':>8s}"
+        )
+        for s in self.stages:
+            # workers_peak_rss_mb is only set for stages that ran worker processes
+            workers_cpu = "-" if s.workers_peak_rss_mb is None else f"{s.workers_cpu_secs:.2f}"
+            print(
+                f"{s.name:18s} {s.wall_secs:8.2f} {s.cpu_secs:8.2f} {workers_cpu:>9s} "
+                f"{num(s.records_in):>10s} {num(s.records_out):>10s} {num(s.records_per_sec):>10s} "
+                f"{s.bytes_read / 1e6:9.1f} {s.bytes_written / 1e6:9.1f} {num(s.peak_rss_mb):>8s}"
+            )
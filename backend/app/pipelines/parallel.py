@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.pipelines.ingest import RAW_SOURCES, iter_json_records
+from app.pipelines.preprocess import NORMALIZERS
+
+
+# per-record files are tiny, so a worker task covers a batch of them to amortize the IPC
+TASK_FILES = 64
+TASK_BYTES = 8 << 20
+# files at least this large are streamed in the parent instead: a worker would have to
+# send back the whole file's docs at once
+LARGE_FILE_BYTES = 64 << 20
+# tasks in flight per worker; bounds how many finished batches wait to be written
+PREFETCH_PER_WORKER = 4
+
+
+def _normalize_files(source: str, paths: list[str]) -> list[dict]:
+    """Worker: parse and normalize a batch of files, in order."""
+    normalize = NORMALIZERS[source]
+    return [normalize(record) for p in paths for record in iter_json_records(Path(p))]
+
+
+def _plan() -> Iterator[tuple[str, list[Path], bool]]:
+    """(source, files, inline) tasks in the serial pipeline's order (sources, then file names)."""
+    for source, folder in RAW_SOURCES.items():
+        if not folder.exists():
+            raise FileNotFoundError(f"Folder not found: {folder}")
+
+        batch: list[Path] = []
+        size = 0
+        for fp in sorted(folder.glob("*.json")):
+            n = fp.stat().st_size
+            if n >= LARGE_FILE_BYTES:
+                if batch:
+                    yield source, batch, False
+                    batch, size = [], 0
+                yield source, [fp], True
+                continue
+            batch.append(fp)
+            size += n
+            if len(batch) >= TASK_FILES or size >= TASK_BYTES:
+                yield source, batch, False
+                batch, size = [], 0
+        if batch:
+            yield source, batch, False
+
+
+def iter_normalized_parallel(workers: int) -> Iterator[tuple[str, dict]]:
+    """
+    (source, normalized doc) pairs for every raw record, in exactly the order of the
+    serial pipeline, with file parsing and normalization fanned out to `workers`
+    processes. Results are consumed in submission order while the next few batches are
+    already being worked on, so output is deterministic and memory stays bounded.
+    """
+    # spawn, not fork: same start method everywhere, and no inherited parent state
+    ex = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    plan = _plan()
+    pending: deque[tuple[str, list[Path], Optional[Future]]] = deque()
+
+    def submit_next() -> None:
+        task = next(plan, None)
+        if task is None:
+            return
+        source, paths, inline = task
+        future = None if inline else ex.submit(_normalize_files, source, [str(p) for p in paths])
+        pending.append((source, paths, future))
+
+    try:
+        for _ in range(workers * PREFETCH_PER_WORKER):
+            submit_next()
+        while pending:
+            source, paths, future = pending.popleft()
+            submit_next()
+            if future is None:
+                normalize = NORMALIZERS[source]
+                for record in iter_json_records(paths[0]):
+                    yield source, normalize(record)
+            else:
+                for doc in future.result():
+                    yield source, doc
+    finally:
+        # on errors (or an abandoned generator) don't start batches nobody will read
+        ex.shutdown(wait=True, cancel_futures=True)
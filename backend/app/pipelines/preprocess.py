@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 
 def _as_list(x: Any) -> list:
@@ -30,7 +30,6 @@ def normalize_faculty(record: dict) -> dict:
         "org": record.get("institution") or record.get("department") or "",
         "year": None,
         "keywords": _as_list(interests),
-        "raw": record,
     }
 
 
@@ -58,10 +57,21 @@ def normalize_grant(record: dict) -> dict:
         "org": record.get("institution") or record.get("funder") or "",
         "year": record.get("year") or record.get("award_year"),
         "keywords": _as_list(record.get("keywords") or record.get("topics") or []),
-        "raw": record,
     }
 
 
+NORMALIZERS = {
+    "faculty_profiles": normalize_faculty,
+    "grants": normalize_grant,
+}
+
+
+def iter_preprocess(records: Iterable[tuple[str, dict]]) -> Iterator[dict]:
+    """Normalizes a stream of (source, record) pairs (see ingest.iter_raw) one at a time."""
+    for source, record in records:
+        yield NORMALIZERS[source](record)
+
+
 def preprocess(raw: dict[str, list[dict]]) -> list[dict]:
     docs: list[dict] = []
 
@@ -71,4 +81,4 @@ def preprocess(raw: dict[str, list[dict]]) -> list[dict]:
     for r in raw.get("grants", []):
         docs.append(normalize_grant(r))
 
-    return docs
\ No newline at end of file
+    return docs
@@ -1,19 +1,216 @@
-from app.pipelines.ingest import ingest_raw
-from app.pipelines.preprocess import preprocess
-from app.pipelines.build_corpus import build_agent_corpus
+import argparse
+from collections import Counter
+from pathlib import Path
+from typing import Iterator, Optional
 
+from app.pipelines.build_index import build_index_artifacts, build_segment_indexes, corpus_files
+from app.pipelines.dedup import DEDUP_THRESHOLD, apply_dedup, find_near_duplicates
+from app.pipelines.incremental import build_incremental
+from app.pipelines.ingest import RAW_SOURCES, iter_raw
+from app.pipelines.instrumentation import REPORT_DIR, PipelineReport
+from app.pipelines.parallel import iter_normalized_parallel
+from app.pipelines.preprocess import iter_preprocess
+from app.pipelines.build_corpus import CORPUS_PATH, build_agent_corpus
+from app.services.corpus_format import CORPUS_FORMATS, with_format
+from app.services.index_artifact import index_path_for, read_meta
 
-def run():
-    raw = ingest_raw()
-    print(f"Loaded faculty_profiles: {len(raw['faculty_profiles'])}")
-    print(f"Loaded grants: {len(raw['grants'])}")
 
-    docs = preprocess(raw)
-    print(f"Normalized docs total: {len(docs)}")
+def _counted(pairs: Iterator[tuple[str, dict]], counts: Counter) -> Iterator[tuple[str, dict]]:
+    for source, item in pairs:
+        counts[source] += 1
+        yield source, item
 
-    out_path = build_agent_corpus(docs)
-    print(f"✅ Pipeline complete: {out_path}")
+
+def _normalized(workers: int) -> Iterator[dict]:
+    if workers > 1:
+        return (doc for _, doc in iter_normalized_parallel(workers))
+    return iter_preprocess(iter_raw())
+
+
+def _input_bytes() -> int:
+    return sum(fp.stat().st_size for folder in RAW_SOURCES.values() for fp in folder.glob("*.json"))
+
+
+def _index_stage(report: PipelineReport, out_path: Path, segments: Optional[list[Path]] = None) -> None:
+    with report.stage("index") as st:
+        # records_in counts the docs parsed and tokenized: with segments (incremental), only
+        # those of segments not indexed by an earlier run
+        st.records_in = st.records_out = 0
+        if segments is not None:
+            for seg in build_segment_indexes(segments):
+                st.records_in += (read_meta(index_path_for(seg)) or {}).get("n_docs", 0)
+                st.bytes_read += seg.stat().st_size
+        written = build_index_artifacts(out_path, segments=segments)
+        for artifact in written:
+            n_docs = (read_meta(artifact) or {}).get("n_docs", 0)
+            if segments is None:
+                st.records_in += n_docs
+            st.records_out += n_docs
+            # the corpus is read once either way, to hash it
+            st.bytes_read += sum(p.stat().st_size for p in corpus_files(out_path) if index_path_for(p) == artifact)
+            st.bytes_written += artifact.stat().st_size
+    if written:
+        print(f"Index artifacts: {len(written)} written")
+
+
+def run(
+    shards: int = 1,
+    workers: int = 1,
+    incremental: bool = False,
+    index: bool = True,
+    fmt: str = "jsonl",
+    profile: bool = False,
+    report_dir: Path = REPORT_DIR,
+    dedup: bool = False,
+    dedup_threshold: float = DEDUP_THRESHOLD,
+) -> dict:
+    """
+    Runs the pipeline and returns its run report (also printed and written to report_dir
+    as <run_id>.json, with a cProfile dump per stage if profile).
+    """
+    if dedup and incremental:
+        raise ValueError("dedup compares every doc with every other, so it needs a full (not incremental) build")
+    corpus_path = with_format(CORPUS_PATH, fmt)
+    report = PipelineReport(
+        profile=profile,
+        shards=shards,
+        workers=workers,
+        incremental=incremental,
+        index=index,
+        format=fmt,
+        dedup=dedup,
+        dedup_threshold=dedup_threshold if dedup else None,
+    )
+
+    segments: Optional[list[Path]] = None
+    if incremental:
+        with report.stage("incremental", workers=workers > 1) as st:
+            result = build_incremental(out_path=corpus_path, shards=shards, workers=workers)
+            st.records_in = result["reprocessed_docs"]
+            st.records_out = result["docs"] if result["rebuilt"] else 0
+            st.bytes_read = result["bytes_read"]
+            st.bytes_written = result["bytes_written"]
+        files = result["files"]
+        print(
+            f"Input files: {files['unchanged']} unchanged, {files['changed']} changed, "
+            f"{files['added']} added, {files['removed']} removed"
+        )
+        print(f"Re-normalized docs: {result['reprocessed_docs']} of {result['docs']}")
+        out_path = Path(result["out_path"])
+        segments = [Path(p) for p in result["segments"]]
+        report.extra["incremental"] = {k: v for k, v in result.items() if k not in ("out_path", "segments")}
+    else:
+        # records stream from the raw files through normalization into the corpus writer one
+        # at a time, so memory stays flat however large the dumps are; with workers > 1 files
+        # are parsed and normalized in a process pool, in the same order
+        counts: Counter = Counter()
+        input_bytes = _input_bytes()
+        plan = None
+        if dedup:
+            # near-duplicates can be anywhere in the input, so a first pass finds them
+            # (keeping only signatures and doc_ids) and the main pass below drops them
+            with report.stage("dedup") as st:
+                first_pass = report.meter("dedup_read", _normalized(workers))
+                plan = find_near_duplicates(first_pass, threshold=dedup_threshold)
+                st.records_in, st.records_out = plan.n_docs, plan.n_kept
+            report.get("dedup_read").bytes_read = input_bytes
+            print(f"Near-duplicates: {len(plan.dropped)} docs merged into {len(plan.merged)}")
+            report.extra["dedup"] = {
+                "threshold": dedup_threshold,
+                "candidate_pairs": plan.candidate_pairs,
+                "merged_docs": len(plan.dropped),
+                "clusters": len(plan.merged),
+            }
+
+        if workers > 1:
+            pairs = report.meter("ingest+preprocess", iter_normalized_parallel(workers), workers=True)
+            docs = (doc for _, doc in _counted(pairs, counts))
+        else:
+            docs = report.meter("preprocess", iter_preprocess(report.meter("ingest", _counted(iter_raw(), counts))))
+        if plan is not None:
+            docs = apply_dedup(docs, plan)
+
+        with report.stage("build_corpus") as st:
+            out_path = build_agent_corpus(docs, out_path=corpus_path, shards=shards)
+            st.bytes_written = sum(p.stat().st_size for p in corpus_files(out_path))
+
+        st.records_in = sum(counts.values())
+        st.records_out = plan.n_kept if plan is not None else st.records_in
+        if workers > 1:
+            report.get("ingest+preprocess").bytes_read = input_bytes
+        else:
+            report.get("ingest").bytes_read = input_bytes
+            report.get("preprocess").records_in = report.get("ingest").records_out
+
+        print(f"Loaded faculty_profiles: {counts['faculty_profiles']}")
+        print(f"Loaded grants: {counts['grants']}")
+        report.extra["records_by_source"] = dict(counts)
+
+    if index:
+        _index_stage(report, out_path, segments)
+
+    report.extra["out_path"] = str(out_path)
+    report.print()
+    report_path = report.write(report_dir)
+    print(f"Run report: {report_path}")
+    rebuilt = not incremental or result["rebuilt"]
+    print(f"✅ Pipeline complete: {out_path}" + ("" if rebuilt else " (already up to date)"))
+    return report.to_dict()
 
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingest, normalize and build the agent corpus.")
+    parser.add_argument("--shards", type=int, default=1, help="write N round-robin corpus shards (RETRIEVAL_SHARDED)")
+    parser.add_argument("--workers", type=int, default=1, help="parse and normalize input files in N processes")
+    parser.add_argument(
+        "--format",
+        choices=list(CORPUS_FORMATS),
+        default="jsonl",
+        help="corpus file format: plain, gzip or xz JSONL, or columnar chunks (RETRIEVAL_CORPUS_FORMAT)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only re-process input files that changed since the last incremental build",
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="skip the binary retrieval index (servers then build it from the JSONL at startup)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="also dump a cProfile per stage next to the run report (slows the run down)",
+    )
+    parser.add_argument(
+        "--report-dir",
+        type=Path,
+        default=REPORT_DIR,
+        help="where the JSON run report goes (default artifacts/pipeline_runs/)",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="collapse near-duplicate docs (MinHash/LSH over title + summary) into one that lists their doc_ids",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=DEDUP_THRESHOLD,
+        help=f"estimated Jaccard similarity of word 3-grams at which docs merge (default {DEDUP_THRESHOLD})",
+    )
+    args = parser.parse_args()
+    if args.dedup and args.incremental:
+        parser.error("--dedup needs a full build, not --incremental")
+    run(
+        shards=args.shards,
+        workers=args.workers,
+        incremental=args.incremental,
+        index=not args.no_index,
+        fmt=args.format,
+        profile=args.profile,
+        report_dir=args.report_dir,
+        dedup=args.dedup,
+        dedup_threshold=args.dedup_threshold,
+    )
\ No newline at end of file
@@ -7,13 +7,7 @@ from app.infra.job_store import (
     create_job, get_job, update_job_status, update_step, set_artifact
 )
 from app.services.literature_service import run_literature_search
-from app.services.retrieval_service import RetrievalService
-
-
-# ---------------------------
-# Retrieval singleton (loads corpus once)
-# ---------------------------
-_retriever = RetrievalService()
+from app.services.retrieval_service import RetrievalUnavailable, get_retriever
 
 
 # ---------------------------
@@ -29,8 +23,17 @@ def _action_context_retrieval(job_id: str, payload: dict) -> None:
 
     query = payload.get("goal") or payload.get("project_idea") or "research topic"
 
-    faculty_hits = _retriever.search(query=query, top_k=5, source_type="faculty_profile")
-    grant_hits = _retriever.search(query=query, top_k=5, source_type="grant")
+    # one batched pass over the shared index for both source types
+    try:
+        faculty_hits, grant_hits = get_retriever().search_batch([
+            {"query": query, "top_k": 5, "source_type": "faculty_profile"},
+            {"query": query, "top_k": 5, "source_type": "grant"},
+        ])
+    except RetrievalUnavailable as e:
+        # no local corpus yet: carry on with the rest of the workflow
+        set_artifact(job_id, "context_retrieval", {"query": query, "top_k": 5, "results": {"faculty": [], "grants": []}})
+        update_step(job_id, "context_retrieval", "done", f"Local context unavailable ({e.state})")
+        return
 
     context = {
         "query": query,
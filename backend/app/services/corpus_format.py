@@ -0,0 +1,193 @@
+from pathlib import Path
+from array import array
+import gzip
+import json
+import lzma
+import struct
+import zlib
+from typing import Any, Iterator, List, Optional
+
+
+# corpus file formats, told apart by file name suffix:
+# "jsonl"     plain JSON lines (the only format "mmap" storage can serve rows from)
+# "gz", "xz"  the same lines as one gzip / xz stream
+# "columnar"  chunks of COLUMNAR_CHUNK_ROWS rows; per chunk the text and the metadata
+#             column are each a JSON array compressed on its own (see ColumnarWriter)
+CORPUS_FORMATS = {
+    "jsonl": ".jsonl",
+    "gz": ".jsonl.gz",
+    "xz": ".jsonl.xz",
+    "columnar": ".ccol",
+}
+GZIP_LEVEL = 6
+XZ_PRESET = 6
+COLUMNAR_CHUNK_ROWS = 4096
+COLUMNAR_MAGIC = b"CORPCOL1"
+_CHUNK_HEADER = struct.Struct("<III")  # rows, compressed text bytes, compressed metadata bytes
+READ_CHUNK = 1 << 20
+
+
+def corpus_format(path: Path) -> str:
+    """The format of a corpus file from its name ("agent_corpus.jsonl.gz" -> "gz")."""
+    # longest suffix first: ".jsonl.gz" must not match as ".jsonl"
+    for fmt, suffix in sorted(CORPUS_FORMATS.items(), key=lambda kv: -len(kv[1])):
+        if path.name.endswith(suffix):
+            return fmt
+    raise ValueError(f"Unknown corpus format: {path.name} (expected one of {', '.join(CORPUS_FORMATS.values())})")
+
+
+def corpus_stem(path: Path) -> str:
+    """The file name without its format suffix ("agent_corpus.jsonl.gz" -> "agent_corpus")."""
+    return path.name[: -len(CORPUS_FORMATS[corpus_format(path)])]
+
+
+def with_format(path: Path, fmt: str) -> Path:
+    """path renamed to fmt's suffix: with_format(agent_corpus.jsonl, "xz") -> agent_corpus.jsonl.xz"""
+    if fmt not in CORPUS_FORMATS:
+        raise ValueError(f"Unknown corpus format: {fmt!r} (expected one of {', '.join(CORPUS_FORMATS)})")
+    return path.with_name(corpus_stem(path) + CORPUS_FORMATS[fmt])
+
+
+# ---------------------------
+# Writing
+# ---------------------------
+class ColumnarWriter:
+    """
+    Columnar chunked corpus: COLUMNAR_MAGIC, then per chunk of up to COLUMNAR_CHUNK_ROWS
+    rows a <u4 x3 header (rows, text bytes, metadata bytes) followed by the zlib-compressed
+    JSON array of the rows' texts and that of their metadata. Similar values sit next to
+    each other within a column, which compresses better than interleaved rows, and a
+    reader parses two arrays per chunk instead of one JSON object per row.
+    """
+
+    def __init__(self, path: Path):
+        self._f = open(path, "wb")
+        self._f.write(COLUMNAR_MAGIC)
+        self._texts: List[str] = []
+        self._metadata: List[Any] = []
+
+    def write(self, line: str) -> None:
+        row = json.loads(line)
+        if set(row) - {"text", "metadata"}:
+            raise ValueError(f"Columnar corpus rows hold only text and metadata, got {sorted(row)}")
+        self._texts.append(row.get("text", ""))
+        self._metadata.append(row.get("metadata", {}))
+        if len(self._texts) == COLUMNAR_CHUNK_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._texts:
+            return
+        text = zlib.compress(json.dumps(self._texts, ensure_ascii=False).encode("utf-8"))
+        metadata = zlib.compress(json.dumps(self._metadata, ensure_ascii=False).encode("utf-8"))
+        self._f.write(_CHUNK_HEADER.pack(len(self._texts), len(text), len(metadata)))
+        self._f.write(text)
+        self._f.write(metadata)
+        self._texts, self._metadata = [], []
+
+    def close(self) -> None:
+        try:
+            self._flush()
+        finally:
+            self._f.close()
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_corpus_writer(path: Path, fmt: str):
+    """
+    A file-like writer taking corpus lines (JSON objects, each ending in a newline) and
+    storing them in fmt. path is taken as is, so it may be a temp name.
+    """
+    if fmt == "jsonl":
+        return open(path, "w", encoding="utf-8")
+    if fmt == "gz":
+        return gzip.open(path, "wt", encoding="utf-8", compresslevel=GZIP_LEVEL)
+    if fmt == "xz":
+        return lzma.open(path, "wt", encoding="utf-8", preset=XZ_PRESET)
+    if fmt == "columnar":
+        return ColumnarWriter(path)
+    raise ValueError(f"Unknown corpus format: {fmt!r} (expected one of {', '.join(CORPUS_FORMATS)})")
+
+
+# ---------------------------
+# Reading
+# ---------------------------
+class _HashingReader:
+    """Passes reads of the raw (compressed) file through, feeding every byte to digest."""
+
+    def __init__(self, f, digest):
+        self._f = f
+        self._digest = digest
+
+    def read(self, n: int = -1) -> bytes:
+        b = self._f.read(n)
+        if self._digest is not None:
+            self._digest.update(b)
+        return b
+
+    def drain(self) -> None:
+        for chunk in iter(lambda: self.read(READ_CHUNK), b""):
+            pass
+
+
+def _columnar_rows(f) -> Iterator[dict]:
+    if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar corpus file")
+    while True:
+        header = f.read(_CHUNK_HEADER.size)
+        if not header:
+            return
+        if len(header) < _CHUNK_HEADER.size:
+            raise ValueError("Truncated columnar corpus chunk")
+        n, text_len, meta_len = _CHUNK_HEADER.unpack(header)
+        texts = json.loads(zlib.decompress(f.read(text_len)))
+        metadata = json.loads(zlib.decompress(f.read(meta_len)))
+        if len(texts) != n or len(metadata) != n:
+            raise ValueError("Corrupt columnar corpus chunk")
+        for text, meta in zip(texts, metadata):
+            yield {"text": text, "metadata": meta}
+
+
+def iter_rows(path: Path, digest=None, offsets: Optional[array] = None) -> Iterator[dict]:
+    """
+    The parsed rows of a corpus file in any of CORPUS_FORMATS, decompressed as a stream.
+
+    digest (a hashlib object) is fed every byte of the file as stored, so it ends up the
+    content hash of the file itself, whatever its format. For plain JSONL, offsets gets
+    the start of each row and finally the end of the file (see MmapDocStore).
+    """
+    fmt = corpus_format(path)
+    with open(path, "rb") as raw:
+        if fmt == "jsonl":
+            pos = 0
+            for line in raw:
+                if digest is not None:
+                    digest.update(line)
+                start = pos
+                pos += len(line)
+                if line.strip():
+                    if offsets is not None:
+                        offsets.append(start)
+                    yield json.loads(line)
+            if offsets is not None:
+                offsets.append(pos)
+            return
+
+        if offsets is not None:
+            raise ValueError(f"{path.name}: row offsets need a plain .jsonl corpus")
+        reader = _HashingReader(raw, digest)
+        if fmt == "columnar":
+            yield from _columnar_rows(reader)
+        else:
+            stream = gzip.GzipFile(fileobj=reader, mode="rb") if fmt == "gz" else lzma.LZMAFile(reader, mode="rb")
+            with stream as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        # anything the decoder did not need still belongs to the file's hash
+        reader.drain()
@@ -0,0 +1,794 @@
+from pathlib import Path
+from array import array
+from collections import Counter
+import hashlib
+import math
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.services.corpus_format import corpus_format, iter_rows
+from app.services.doc_store import CompactDocStore, MemoryDocStore, MmapDocStore
+from app.services.fuzzy_index import TrigramIndex, unknown_tokens
+from app.services.index_artifact import index_path_for, open_artifact, read_meta, write_artifact
+from app.services.metadata_index import FACET_LIMIT, MetadataIndex
+from app.services.suggest_index import PrefixArray, SuggestIndex, title_of
+
+
+# "compact" packs snippets + metadata into flat blobs (smallest resident set that still
+#           serves hits from memory)
+# "memory"  keeps every parsed row resident (original behaviour)
+# "mmap"    keeps byte offsets into the file and decodes rows on demand
+STORAGE_MODES = ("compact", "memory", "mmap")
+
+# standard Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# hybrid ranker: fused = HYBRID_ALPHA * dense cosine + (1 - HYBRID_ALPHA) * bm25 / max bm25,
+# over the union of each ranker's best HYBRID_POOL candidates (at least top_k)
+HYBRID_ALPHA = 0.5
+HYBRID_POOL = 50
+
+
+class RetrievalUnavailable(RuntimeError):
+    """
+    Raised by search when no usable corpus version is loaded: none yet (warming / missing),
+    or the loaded one's corpus file changed under it before a lazy model was fitted (stale).
+    """
+
+    def __init__(self, state: str):
+        super().__init__(f"Retrieval index not ready (state: {state})")
+        self.state = state
+
+    def __reduce__(self):
+        # raised inside shard worker processes, re-raised by the coordinator
+        return type(self), (self.state,)
+
+
+_word_re = re.compile(r"[A-Za-z0-9_]+")
+
+
+def _tokens(text: str) -> set[str]:
+    return set(t.lower() for t in _word_re.findall(text))
+
+
+def _term_counts(text: str) -> Counter:
+    return Counter(t.lower() for t in _word_re.findall(text))
+
+
+def _file_version(path: Path) -> str:
+    """Content hash of a corpus file, as CorpusIndex.version (first 16 hex digits of its sha256)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def _join_lines(strings: List[str]) -> np.ndarray:
+    # terms and titles never contain a newline, so "\n" separates them in one utf-8 blob
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _split_lines(blob: np.ndarray, n: int) -> List[str]:
+    return blob.tobytes().decode("utf-8").split("\n") if n else []
+
+
+def expanded_query(item: dict) -> str:
+    """The item's query text with each misspelled token replaced by its vocabulary expansions."""
+    expansions = item.get("expansions")
+    if not expansions:
+        return item["query"]
+    return _word_re.sub(lambda m: " ".join(expansions.get(m.group(0).lower(), [m.group(0)])), item["query"])
+
+
+class CorpusSignature(NamedTuple):
+    """Cheap change detector for the corpus file (one stat call)."""
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def of(cls, path: Path) -> "CorpusSignature":
+        st = path.stat()
+        return cls(st.st_size, st.st_mtime_ns)
+
+
+class CorpusStats(NamedTuple):
+    """
+    Collection statistics BM25 scores against. A shard of a larger corpus is handed the
+    global ones so its scores match an unsharded index exactly.
+    """
+    n_docs: int
+    avg_doc_len: float
+    df: Dict[str, int]  # at least every query term of the batch
+
+
+class Postings:
+    """
+    CSR posting lists for one partition: the docs containing term id t are
+    docs[ptr[t]:ptr[t + 1]] (ascending), with matching term frequencies in tfs.
+    """
+    __slots__ = ("ptr", "docs", "tfs")
+
+    def __init__(self, ptr: np.ndarray, docs: np.ndarray, tfs: np.ndarray):
+        self.ptr = ptr
+        self.docs = docs
+        self.tfs = tfs
+
+    def get(self, tid: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.ptr[tid], self.ptr[tid + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+    @property
+    def nbytes(self) -> int:
+        return self.ptr.nbytes + self.docs.nbytes + self.tfs.nbytes
+
+
+class _IndexBuilder:
+    """
+    Accumulates (doc, term id, tf) triples in flat typed arrays during the load pass;
+    finish() turns them into per-partition CSR postings over a sorted vocabulary.
+    """
+
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}
+        self.entry_docs = array("i")
+        self.entry_terms = array("i")
+        self.entry_tfs = array("i")
+        self.doc_len = array("i")
+        self.source_codes = array("h")
+        self.source_names: Dict[Optional[str], int] = {}
+
+    def add(self, text: str, source_type: Optional[str]) -> None:
+        i = len(self.doc_len)
+        counts = _term_counts(text)
+        self.doc_len.append(sum(counts.values()))
+        self.source_codes.append(self.source_names.setdefault(source_type or None, len(self.source_names)))
+
+        vocab = self.vocab
+        for term, tf in counts.items():
+            tid = vocab.get(term)
+            if tid is None:
+                tid = vocab[term] = len(vocab)
+            self.entry_docs.append(i)
+            self.entry_terms.append(tid)
+            self.entry_tfs.append(tf)
+
+    def finish(self, index: "CorpusIndex") -> None:
+        # term ids follow sorted term order, so "ascending term id" == "sorted terms"
+        terms = sorted(self.vocab)
+        n_terms = len(terms)
+        remap = np.empty(n_terms, dtype=np.int32)
+        remap[np.fromiter((self.vocab[t] for t in terms), dtype=np.int32, count=n_terms)] = np.arange(
+            n_terms, dtype=np.int32
+        )
+        self.vocab = {}
+
+        build_postings(
+            index,
+            terms,
+            np.frombuffer(self.entry_docs, dtype=np.int32),
+            remap[np.frombuffer(self.entry_terms, dtype=np.int32)],
+            np.frombuffer(self.entry_tfs, dtype=np.int32),
+            np.frombuffer(self.doc_len, dtype=np.int32).copy(),
+            np.frombuffer(self.source_codes, dtype=np.int16).copy(),
+            list(self.source_names),
+        )
+
+
+def build_postings(
+    index: "CorpusIndex",
+    terms: List[str],
+    entry_docs: np.ndarray,
+    entry_terms: np.ndarray,
+    entry_tfs: np.ndarray,
+    doc_len: np.ndarray,
+    codes: np.ndarray,
+    source_names: List[Optional[str]],
+) -> None:
+    """
+    Sets index's vocabulary, per-partition CSR postings and per-doc arrays from flat (doc,
+    term id, tf) entries in ascending doc order, term ids indexing the sorted terms.
+    """
+    n_terms = len(terms)
+    entry_codes = codes[entry_docs]
+
+    ptr_dtype = np.int64 if len(entry_docs) >= 2**31 else np.int32
+    # term frequencies are small; store them in the narrowest dtype that holds the max
+    max_tf = int(entry_tfs.max()) if len(entry_tfs) else 0
+    tf_dtype = np.uint8 if max_tf <= 0xFF else np.uint16 if max_tf <= 0xFFFF else np.int32
+    df = np.zeros(n_terms, dtype=np.int32)
+    partitions: Dict[Optional[str], Postings] = {}
+    for code, name in enumerate(source_names):
+        sel = np.flatnonzero(entry_codes == code)
+        t = entry_terms[sel]
+        # stable sort by term keeps each posting list in ascending doc order
+        order = np.argsort(t, kind="stable")
+        counts = np.bincount(t, minlength=n_terms)
+        ptr = np.zeros(n_terms + 1, dtype=ptr_dtype)
+        np.cumsum(counts, out=ptr[1:])
+        partitions[name] = Postings(ptr, entry_docs[sel][order], entry_tfs[sel][order].astype(tf_dtype))
+        df += counts.astype(np.int32)
+
+    index.terms = terms
+    index.vocab = {t: i for i, t in enumerate(terms)}
+    index.df = df
+    index.doc_len = doc_len
+    index.source_codes = codes
+    index.source_names = list(source_names)
+    index._partitions = partitions
+
+
+class CorpusIndex:
+    """
+    Immutable, fully built snapshot of one version of the corpus.
+
+    RetrievalService swaps whole CorpusIndex objects, so a query that grabbed a reference
+    keeps scoring against a consistent snapshot even while a newer one is being built.
+
+    Everything per-document or per-posting lives in flat NumPy arrays: terms are interned
+    to integer ids (vocab), postings are CSR arrays per source_type partition, and
+    doc lengths / source_type codes are columns. Scoring is vectorized over those arrays.
+    """
+
+    def __init__(self, path: Path, signature: CorpusSignature):
+        self.path = path
+        self.signature = signature
+        self.version = ""  # content hash of the corpus file, set by load()
+        self.loaded_at = time.time()
+        self.store = None
+        self._tfidf = None
+        # (vocabulary, idf) to fit tfidf with instead of this corpus' own (set on shards)
+        self.tfidf_params: Optional[Tuple[List[str], np.ndarray]] = None
+        self._dense = None
+        self._fuzzy = None
+        self._lazy_lock = threading.Lock()
+
+        self.vocab: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self.df = np.zeros(0, dtype=np.int32)
+        self.doc_len = np.zeros(0, dtype=np.int32)
+        self.source_codes = np.zeros(0, dtype=np.int16)
+        self.source_names: List[Optional[str]] = []
+        self.metadata = MetadataIndex()
+        self.suggest: Optional[SuggestIndex] = None
+        self._partitions: Dict[Optional[str], Postings] = {}
+        self._avg_doc_len = 0.0
+        self.from_artifact = False
+
+    @classmethod
+    def load(cls, path: Path, storage: str = "compact", use_artifact: bool = True) -> "CorpusIndex":
+        """
+        One streaming pass over the corpus file: hashes the bytes, indexes each row, and hands
+        the row to the selected doc store (parsed row, packed snippet/metadata, or offset).
+        Compressed and columnar corpora (see corpus_format) are decompressed as a stream;
+        "mmap" storage needs plain JSONL.
+
+        With use_artifact, a current binary index artifact next to the file (see
+        save_artifact) is mapped instead, skipping the pass; "memory" storage always
+        parses the rows.
+        """
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode: {storage!r} (expected one of {', '.join(STORAGE_MODES)})")
+        if not path.exists():
+            raise FileNotFoundError(f"Corpus not found: {path}")
+        if storage == "mmap" and corpus_format(path) != "jsonl":
+            raise ValueError(f"mmap storage needs a plain .jsonl corpus, not {path.name}")
+
+        if use_artifact and storage != "memory":
+            index = cls._open_artifact(path, storage)
+            if index is not None:
+                return index
+
+        index = cls(path, CorpusSignature.of(path))
+        builder = _IndexBuilder()
+        digest = hashlib.sha256()
+        docs: List[dict] = []
+        compact = CompactDocStore(path)
+        offsets = array("q")
+        titles: List[str] = []
+
+        for d in iter_rows(path, digest, offsets if storage == "mmap" else None):
+            text = d.get("text", "")
+            metadata = d.get("metadata") or {}
+            builder.add(text, metadata.get("source_type"))
+            index.metadata.add(metadata)
+            title = title_of(text)
+            if title:
+                titles.append(title)
+
+            if storage == "memory":
+                docs.append(d)
+            elif storage == "compact":
+                compact.append(text, d.get("metadata", {}))
+
+        builder.finish(index)
+        index.metadata.finish()
+        index.suggest = SuggestIndex.build(index.terms, index.df, titles)
+        index.version = digest.hexdigest()[:16]
+        index._avg_doc_len = float(index.doc_len.mean()) if len(index.doc_len) else 0.0
+
+        if storage == "memory":
+            index.store = MemoryDocStore(docs)
+        elif storage == "compact":
+            compact.finish()
+            index.store = compact
+        else:
+            index.store = MmapDocStore(path, offsets)
+        return index
+
+    # ---------------------------
+    # Binary index artifact
+    # ---------------------------
+    def save_artifact(self, out_path: Optional[Path] = None) -> Path:
+        """
+        Writes this index as a binary artifact (default: index_path_for(self.path)) that
+        load() maps instead of re-parsing the corpus: the sorted vocabulary, document
+        frequencies, per-partition CSR postings, doc lengths and source codes, the metadata
+        bitmaps, the title suggestions and both doc store layouts (compact blocks and JSONL
+        row offsets), each as one flat little-endian array. Needs a "compact" index.
+        """
+        if not isinstance(self.store, CompactDocStore):
+            raise ValueError("save_artifact needs an index loaded with storage='compact'")
+        if CorpusSignature.of(self.path) != self.signature:
+            raise RuntimeError(f"{self.path} changed since this index was loaded")
+
+        # JSONL row offsets let the artifact serve "mmap" storage too; other formats have none
+        offsets = array("q")
+        if corpus_format(self.path) == "jsonl":
+            with open(self.path, "rb") as f:
+                pos = 0
+                for raw in f:
+                    if raw.strip():
+                        offsets.append(pos)
+                    pos += len(raw)
+            offsets.append(pos)
+
+        metadata, meta_bits, meta_rows = self.metadata.to_arrays()
+        blob, blocks = self.store.to_arrays()
+        titles = self.suggest.titles
+        sections: Dict[str, np.ndarray] = {
+            "terms": _join_lines(self.terms),
+            "df": self.df,
+            "doc_len": self.doc_len,
+            "source_codes": self.source_codes,
+            "metadata.bits": meta_bits,
+            "metadata.rows": meta_rows,
+            "titles.keys": _join_lines(titles.keys),
+            "titles.labels": _join_lines(titles.labels),
+            "titles.counts": titles.counts,
+            "docs.blob": blob,
+            "docs.blocks": blocks,
+            "docs.offsets": np.frombuffer(offsets, dtype=np.int64),
+        }
+        for code, name in enumerate(self.source_names):
+            postings = self._partitions[name]
+            sections[f"postings.{code}.ptr"] = postings.ptr
+            sections[f"postings.{code}.docs"] = postings.docs
+            sections[f"postings.{code}.tfs"] = postings.tfs
+
+        meta = {
+            "version": self.version,
+            "corpus_signature": list(self.signature),
+            "n_docs": self.n_docs,
+            "n_terms": len(self.terms),
+            "n_titles": len(titles.keys),
+            "avg_doc_len": self._avg_doc_len,
+            "source_names": self.source_names,
+            "block_docs": CompactDocStore.BLOCK_DOCS,
+            "metadata": metadata,
+        }
+        return write_artifact(out_path or index_path_for(self.path), meta, sections)
+
+    @staticmethod
+    def _artifact_matches(meta: Optional[dict], path: Path, signature: CorpusSignature) -> bool:
+        if meta is None or meta.get("block_docs") != CompactDocStore.BLOCK_DOCS:
+            return False
+        if list(signature) == meta["corpus_signature"]:
+            return True
+        # touched or copied since: still current if the bytes are the ones it was built from
+        return signature.size == meta["corpus_signature"][0] and _file_version(path) == meta["version"]
+
+    @classmethod
+    def artifact_is_current(cls, path: Path) -> bool:
+        """True if index_path_for(path) exists and was built from the current contents of path."""
+        return cls._artifact_matches(read_meta(index_path_for(path)), path, CorpusSignature.of(path))
+
+    @classmethod
+    def _open_artifact(cls, path: Path, storage: str) -> Optional["CorpusIndex"]:
+        """The index mapped from path's artifact, or None if there is none or it is stale."""
+        signature = CorpusSignature.of(path)
+        try:
+            meta, a = open_artifact(index_path_for(path))
+        except (FileNotFoundError, ValueError):
+            return None
+        if not cls._artifact_matches(meta, path, signature):
+            return None
+
+        # the arrays are read-only views into the mapping, shared by every process on the
+        # host that maps the same file; only the term strings are decoded into objects
+        index = cls(path, signature)
+        index.version = meta["version"]
+        index.terms = _split_lines(a["terms"], meta["n_terms"])
+        index.vocab = {t: i for i, t in enumerate(index.terms)}
+        index.df = a["df"]
+        index.doc_len = a["doc_len"]
+        index.source_codes = a["source_codes"]
+        index.source_names = meta["source_names"]
+        index._partitions = {
+            name: Postings(a[f"postings.{code}.ptr"], a[f"postings.{code}.docs"], a[f"postings.{code}.tfs"])
+            for code, name in enumerate(index.source_names)
+        }
+        index._avg_doc_len = meta["avg_doc_len"]
+        index.metadata = MetadataIndex.from_arrays(meta["metadata"], a["metadata.bits"], a["metadata.rows"])
+        index.suggest = SuggestIndex(
+            PrefixArray(index.terms, index.terms, index.df.astype(np.int64)),
+            PrefixArray(
+                _split_lines(a["titles.keys"], meta["n_titles"]),
+                _split_lines(a["titles.labels"], meta["n_titles"]),
+                a["titles.counts"],
+            ),
+        )
+        if storage == "compact":
+            index.store = CompactDocStore.from_arrays(path, meta["n_docs"], a["docs.blob"], a["docs.blocks"])
+        else:
+            index.store = MmapDocStore(path, a["docs.offsets"])
+        index.from_artifact = True
+        return index
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_len)
+
+    @property
+    def n_shards(self) -> int:
+        return 1
+
+    @property
+    def corpus_files(self) -> List[Path]:
+        return [self.path]
+
+    @property
+    def has_tfidf(self) -> bool:
+        return self._tfidf is not None
+
+    @property
+    def has_dense(self) -> bool:
+        return self._dense is not None
+
+    @property
+    def has_fuzzy(self) -> bool:
+        return self._fuzzy is not None
+
+    @property
+    def postings_nbytes(self) -> int:
+        return sum(p.nbytes for p in self._partitions.values())
+
+    def partition_rows(self) -> Dict[Optional[str], np.ndarray]:
+        return {name: np.flatnonzero(self.source_codes == code) for code, name in enumerate(self.source_names)}
+
+    def _texts(self) -> Iterator[str]:
+        if isinstance(self.store, CompactDocStore) and CorpusSignature.of(self.path) != self.signature:
+            # compact storage re-reads text from disk; a newer file belongs to a newer index
+            raise RetrievalUnavailable("stale")
+        return self.store.texts()
+
+    def tfidf_index(self):
+        # fitted lazily: only deployments that actually use ranker=tfidf pay for sklearn
+        if self._tfidf is None:
+            with self._lazy_lock:
+                if self._tfidf is None:
+                    from app.services.tfidf_index import TfidfIndex
+
+                    # a fixed (sorted) vocabulary keeps each row's columns in sorted order, which
+                    # fit_transform's learned vocabulary does not; shards rely on that order
+                    vocabulary, idf = self.tfidf_params or (self.terms, None)
+                    self._tfidf = TfidfIndex(self._texts(), self.partition_rows(), vocabulary, idf)
+        return self._tfidf
+
+    def dense_index(self):
+        # same deal as tfidf: embeddings + IVF are only built once a dense/hybrid query arrives
+        if self._dense is None:
+            with self._lazy_lock:
+                if self._dense is None:
+                    from app.services.dense_index import DenseIndex
+
+                    self._dense = DenseIndex.fit(self._texts(), self.partition_rows())
+        return self._dense
+
+    def fuzzy_index(self):
+        # the trigram index is only built once a query has a token outside the vocabulary
+        if self._fuzzy is None:
+            with self._lazy_lock:
+                if self._fuzzy is None:
+                    self._fuzzy = TrigramIndex(self.terms, self.df)
+        return self._fuzzy
+
+    def expand_query(self, query: str) -> Dict[str, List[str]]:
+        """
+        Typo tolerance: each query token missing from the vocabulary -> its closest
+        vocabulary terms within a small edit distance (tokens with no close term are left out).
+        """
+        unknown = unknown_tokens(_tokens(query), self.vocab)
+        return self.fuzzy_index().expand_all(unknown) if unknown else {}
+
+    def _query_groups(self, item: dict) -> List[List[int]]:
+        """
+        The item's query as groups of term ids, in ascending term id order: one id per known
+        token, and a misspelled token's expansions (present in this index and not already
+        queried) in one group.
+        """
+        tokens = _tokens(item["query"])
+        groups = [[self.vocab[t]] for t in tokens if t in self.vocab]
+        seen = {g[0] for g in groups}
+        for token, terms in sorted((item.get("expansions") or {}).items()):
+            if token in tokens:
+                tids = sorted({self.vocab[t] for t in terms if t in self.vocab} - seen)
+                if tids:
+                    groups.append(tids)
+                    seen.update(tids)
+        groups.sort()
+        return groups
+
+    def _partition_keys(self, source_type: Optional[str]) -> List[Optional[str]]:
+        if not source_type:
+            return list(self._partitions)
+        return [source_type] if source_type in self._partitions else []
+
+    def filter_masks(self, items: List[dict]) -> List[Optional[np.ndarray]]:
+        """
+        Per item, a boolean mask over corpus positions for its metadata "filters" (parsed
+        Predicates), or None if it has none. Identical filter sets share one mask.
+        """
+        masks: Dict[tuple, Optional[np.ndarray]] = {}
+        out = []
+        for it in items:
+            preds = tuple(it.get("filters") or ())
+            if preds not in masks:
+                masks[preds] = self.metadata.match(preds)
+            out.append(masks[preds])
+        return out
+
+    def _score_keyword_batch(
+        self,
+        items: List[dict],
+        ranker: str,
+        masks: Optional[List[Optional[np.ndarray]]] = None,
+        stats: Optional[CorpusStats] = None,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Scores several queries in one pass over the index: each (term, partition) posting
+        slice is fetched and weighted once and shared by every query that contains the term
+        and whose source_type filter admits the partition. Other partitions are never touched.
+        Postings of docs outside a query's metadata filter mask are dropped before their
+        scores are accumulated. A misspelled token's expansions count as one query term: a
+        doc matching several of them scores the best one. BM25 uses this index's own
+        collection statistics unless global ones are given. Returns, per query,
+        (ascending doc ids, scores).
+        """
+        if masks is None:
+            masks = self.filter_masks(items)
+        n_docs = stats.n_docs if stats else self.n_docs
+        avgdl = (stats.avg_doc_len if stats else self._avg_doc_len) or 1.0
+        weighted: Dict[Tuple[int, Optional[str]], Tuple[np.ndarray, Optional[np.ndarray]]] = {}
+
+        out = []
+        for it, mask in zip(items, masks):
+            keys = self._partition_keys(it.get("source_type"))
+
+            parts_ids, parts_w = [], []
+            # ascending term id == sorted terms, the same accumulation order as a lone search
+            for group in self._query_groups(it):
+                group_ids, group_w = [], []
+                for tid in group:
+                    for key in keys:
+                        slot = weighted.get((tid, key))
+                        if slot is None:
+                            ids, tfs = self._partitions[key].get(tid)
+                            if ranker == "bm25":
+                                df = stats.df[self.terms[tid]] if stats else int(self.df[tid])
+                                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_len[ids] / avgdl)
+                                w = idf * tfs * (BM25_K1 + 1.0) / (tfs + norm)
+                            else:
+                                w = None  # overlap: every posting counts 1
+                            slot = weighted[(tid, key)] = (ids, w)
+                        if len(slot[0]):
+                            group_ids.append(slot[0])
+                            group_w.append(slot[1])
+                if len(group) > 1 and group_ids:
+                    group_ids, group_w = self._best_per_doc(group_ids, group_w)
+                parts_ids.extend(group_ids)
+                parts_w.extend(group_w)
+
+            if not parts_ids:
+                out.append((np.zeros(0, dtype=np.int32), np.zeros(0)))
+                continue
+
+            ids = np.concatenate(parts_ids)
+            allowed = mask[ids] if mask is not None else None
+            if allowed is not None:
+                ids = ids[allowed]
+            if ranker == "bm25":
+                w = np.concatenate(parts_w)
+                if allowed is not None:
+                    w = w[allowed]
+                # bincount adds in input order, i.e. term by term, like a scalar loop would
+                uniq, inv = np.unique(ids, return_inverse=True)
+                out.append((uniq, np.bincount(inv, weights=w, minlength=len(uniq))))
+            else:
+                # overlap count = number of distinct query terms whose posting list holds the doc
+                uniq, counts = np.unique(ids, return_counts=True)
+                out.append((uniq, counts))
+        return out
+
+    @staticmethod
+    def _best_per_doc(
+        parts_ids: List[np.ndarray],
+        parts_w: List[Optional[np.ndarray]],
+    ) -> Tuple[List[np.ndarray], List[Optional[np.ndarray]]]:
+        """Collapses several terms' postings to one per doc, keeping the highest weight."""
+        ids = np.concatenate(parts_ids)
+        if parts_w[0] is None:
+            return [np.unique(ids)], [None]
+        w = np.concatenate(parts_w)
+        order = np.lexsort((-w, ids))
+        ids, w = ids[order], w[order]
+        first = np.ones(len(ids), dtype=bool)
+        first[1:] = ids[1:] != ids[:-1]
+        return [ids[first]], [w[first]]
+
+    @staticmethod
+    def _top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        if len(ids) > k:
+            # partial sort for the k-th best score; keep everything tied with it so the
+            # final cut is deterministic
+            kth = -np.partition(-scores, k - 1)[k - 1]
+            keep = scores >= kth
+            ids, scores = ids[keep], scores[keep]
+
+        # ties keep corpus order, same as the old full-scan stable sort
+        order = np.lexsort((ids, -scores))[:k]
+        return [(scores[o].item(), int(ids[o])) for o in order]
+
+    def _hybrid_batch(self, items: List[dict], stats: Optional[CorpusStats] = None) -> List[List[Tuple[float, int]]]:
+        """
+        Fuses dense and BM25 scores. Candidates are the union of the dense ANN hits and the
+        best BM25 hits; both scores are then computed exactly for every candidate.
+        """
+        dense = self.dense_index()
+        masks = self.filter_masks(items)
+        qvecs = dense.embed([expanded_query(it) for it in items])
+        pools = [max(it["top_k"], HYBRID_POOL) for it in items]
+        dense_hits = dense.search_vectors(qvecs, pools, [it.get("source_type") for it in items], masks)
+        keyword = self._score_keyword_batch(items, "bm25", masks, stats)
+
+        candidates, kw_max = [], []
+        for pool, hits, (kw_ids, kw_scores) in zip(pools, dense_hits, keyword):
+            kw_best = np.array([i for _, i in self._top_k(kw_ids, kw_scores, pool)], dtype=np.int64)
+            candidates.append(np.union1d(np.array([i for _, i in hits], dtype=np.int64), kw_best))
+            kw_max.append(float(kw_scores.max()) if len(kw_scores) else None)
+        return self._fuse_batch(items, qvecs, candidates, keyword, kw_max)
+
+    def _fuse_batch(
+        self,
+        items: List[dict],
+        qvecs: np.ndarray,
+        candidates: List[np.ndarray],
+        keyword: List[Tuple[np.ndarray, np.ndarray]],
+        kw_max: List[Optional[float]],
+    ) -> List[List[Tuple[float, int]]]:
+        # kw_max is the best bm25 score over the whole corpus (all shards), which the
+        # keyword side of the fused score is normalized by
+        dense = self.dense_index()
+        out = []
+        for it, qvec, ids, (kw_ids, kw_scores), best in zip(items, qvecs, candidates, keyword, kw_max):
+            if not len(ids):
+                out.append([])
+                continue
+
+            kw = np.zeros(len(ids))
+            if len(kw_ids):
+                # kw_ids is sorted, so each candidate's bm25 score is one binary search away
+                at = np.minimum(np.searchsorted(kw_ids, ids), len(kw_ids) - 1)
+                found = kw_ids[at] == ids
+                kw[found] = kw_scores[at[found]] / best
+            fused = HYBRID_ALPHA * np.maximum(dense.scores(qvec, ids), 0.0) + (1.0 - HYBRID_ALPHA) * kw
+            keep = fused > 0
+            out.append(self._top_k(ids[keep], fused[keep], it["top_k"]))
+        return out
+
+    # ---------------------------
+    # Shard side of dense/hybrid (see ShardedIndex): the global decisions (probe width,
+    # hybrid candidates, bm25 normalization) are taken at the coordinator
+    # ---------------------------
+    def dense_probe_batch(
+        self, items: List[dict], top_ks: List[int], nprobes: List[int]
+    ) -> List[Tuple[List[Tuple[float, int]], int]]:
+        dense = self.dense_index()
+        qvecs = dense.embed([expanded_query(it) for it in items])
+        sts = [it.get("source_type") for it in items]
+        return dense.probe_vectors(qvecs, top_ks, sts, self.filter_masks(items), nprobes)
+
+    def keyword_pool_batch(
+        self, items: List[dict], pools: List[int], stats: Optional[CorpusStats] = None
+    ) -> List[Tuple[List[Tuple[float, int]], Optional[float]]]:
+        """Per item, the best `pool` bm25 hits and the best bm25 score (None without hits)."""
+        keyword = self._score_keyword_batch(items, "bm25", self.filter_masks(items), stats)
+        out = []
+        for pool, (ids, scores) in zip(pools, keyword):
+            out.append((self._top_k(ids, scores, pool), float(scores.max()) if len(scores) else None))
+        return out
+
+    def hybrid_fuse_batch(
+        self,
+        items: List[dict],
+        candidates: List[np.ndarray],
+        kw_max: List[Optional[float]],
+        stats: Optional[CorpusStats] = None,
+    ) -> List[List[Tuple[float, int]]]:
+        """Fused top_k among the given (ascending) candidate positions, as in _hybrid_batch."""
+        qvecs = self.dense_index().embed([expanded_query(it) for it in items])
+        keyword = self._score_keyword_batch(items, "bm25", self.filter_masks(items), stats)
+        return self._fuse_batch(items, qvecs, candidates, keyword, kw_max)
+
+    def top_hits_batch(
+        self,
+        items: List[dict],
+        ranker: str,
+        stats: Optional[CorpusStats] = None,
+    ) -> List[List[Tuple[float, int]]]:
+        if not self.n_docs:
+            # nothing to fit the tfidf/dense models on
+            return [[] for _ in items]
+        if ranker in ("tfidf", "dense"):
+            index = self.tfidf_index() if ranker == "tfidf" else self.dense_index()
+            return index.search_batch(
+                [expanded_query(it) for it in items],
+                [it["top_k"] for it in items],
+                [it.get("source_type") for it in items],
+                self.filter_masks(items),
+            )
+        if ranker == "hybrid":
+            return self._hybrid_batch(items, stats)
+
+        return [
+            self._top_k(ids, scores, it["top_k"])
+            for it, (ids, scores) in zip(items, self._score_keyword_batch(items, ranker, stats=stats))
+        ]
+
+    def search_batch(self, items: List[dict], ranker: str) -> List[List[dict]]:
+        """top_hits_batch with every hit formatted for the API."""
+        return [[self.format_hit(score, i) for score, i in hits] for hits in self.top_hits_batch(items, ranker)]
+
+    def facet_counts_batch(
+        self,
+        items: List[dict],
+        fields: List[str],
+        limit: Optional[int] = FACET_LIMIT,
+    ) -> List[Dict[str, Dict[str, int]]]:
+        """
+        Facet counts per item over its matching docs: those passing its source_type and
+        metadata filters that contain at least one query term (the same set for every ranker).
+        """
+        out = []
+        for ids, _ in self._score_keyword_batch(items, "overlap"):
+            hits = np.zeros(self.n_docs, dtype=bool)
+            hits[ids] = True
+            out.append(self.metadata.facet_counts(hits, fields, limit))
+        return out
+
+    def close(self, delay: float = 0.0) -> None:
+        """Nothing to release: an in-process snapshot is simply garbage-collected."""
+
+    def format_hit(self, score: float, i: int) -> dict:
+        # the only place per-document data is needed, so non-memory stores decode just the top-k
+        return {
+            "score": score,
+            "snippet": self.store.snippet(i),
+            "metadata": self.store.metadata(i),
+        }
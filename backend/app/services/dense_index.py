@@ -0,0 +1,322 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer, TfidfTransformer
+
+from app.services.tfidf_index import TOKEN_PATTERN
+
+
+# embedding width (float32 -> 4 * DENSE_DIM bytes per doc)
+DENSE_DIM = 128
+HASH_FEATURES = 2**15
+# the SVD basis is fitted on at most this many docs, then applied to all of them
+SVD_SAMPLE = 10_000
+# below this many docs an exact scan is as cheap as probing clusters
+IVF_MIN_DOCS = 2_000
+# inverted lists probed per query (of ~sqrt(n_docs) lists)
+IVF_NPROBE = 32
+
+
+def _term_ngrams(term: str) -> List[str]:
+    """The term itself plus its character 3/4/5-grams (with word-boundary padding)."""
+    padded = f" {term} "
+    grams = ["w:" + term]
+    for n in (3, 4, 5):
+        grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+_HASHER = HashingVectorizer(
+    analyzer=_term_ngrams,
+    n_features=HASH_FEATURES,
+    alternate_sign=False,
+    norm=None,
+    dtype=np.float32,
+)
+
+
+# ---------------------------
+# Fitting, in steps: DenseIndex.fit runs them over one corpus; a sharded index runs each
+# step on every shard and the global parts (idf, SVD basis, IVF) once at the coordinator
+# ---------------------------
+def hashed_features(texts: Iterable[str]):
+    """texts -> (n_texts x HASH_FEATURES) CSR of raw word + character n-gram counts."""
+    # tokenize once into a local vocabulary, hash each distinct term's n-grams once, and
+    # spread them over the docs with a sparse product (far cheaper than hashing the
+    # character n-grams of every token occurrence)
+    n_texts = 0
+
+    def counted():
+        nonlocal n_texts
+        for text in texts:
+            n_texts += 1
+            yield text
+
+    counts = CountVectorizer(token_pattern=TOKEN_PATTERN, lowercase=True, dtype=np.float32)
+    try:
+        doc_terms = counts.fit_transform(counted())
+    except ValueError:
+        # empty vocabulary: no tokens at all (e.g. a punctuation-only query)
+        return sp.csr_matrix((n_texts, HASH_FEATURES), dtype=np.float32)
+    features = (doc_terms @ _HASHER.transform(counts.get_feature_names_out())).tocsr()
+    # column order within a row must not depend on which other docs were vectorized
+    # alongside it, or the row sums below would round differently per shard
+    features.sort_indices()
+    return features
+
+
+def document_frequency(features) -> np.ndarray:
+    return np.bincount(features.indices, minlength=HASH_FEATURES).astype(np.int64)
+
+
+def fit_idf(df: np.ndarray, n_docs: int) -> np.ndarray:
+    """The smoothed idf TfidfTransformer would fit on a corpus with these document frequencies."""
+    df = df.astype(np.float32) + 1.0
+    idf = np.full_like(df, n_docs + 1, dtype=np.float32)
+    idf /= df
+    np.log(idf, out=idf)
+    idf += 1.0
+    return idf
+
+
+def _transformer(idf: np.ndarray) -> TfidfTransformer:
+    # fit() only to initialize the transformer; the idf it learns is replaced
+    tfidf = TfidfTransformer(sublinear_tf=True).fit(sp.csr_matrix((1, HASH_FEATURES), dtype=np.float32))
+    tfidf.idf_ = idf
+    return tfidf
+
+
+def tfidf_weight(features, idf: np.ndarray):
+    """Sublinear tf * idf, rows L2-normalized."""
+    return _transformer(idf).transform(features)
+
+
+def svd_sample(n_docs: int) -> np.ndarray:
+    """Ascending corpus positions of the docs the SVD basis is fitted on."""
+    if n_docs <= SVD_SAMPLE:
+        return np.arange(n_docs)
+    return np.sort(np.random.default_rng(0).choice(n_docs, SVD_SAMPLE, replace=False))
+
+
+def fit_basis(sample, n_docs: int) -> np.ndarray:
+    """(dim x HASH_FEATURES) float32 SVD basis from the tf-idf rows of svd_sample(n_docs)."""
+    dim = min(DENSE_DIM, n_docs - 1, HASH_FEATURES - 1)
+    if dim <= 0:
+        return np.zeros((1, HASH_FEATURES), dtype=np.float32)
+    return TruncatedSVD(dim, random_state=0).fit(sample).components_.astype(np.float32)
+
+
+def project(features, components: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(features @ components.T, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def ivf_lists(n_docs: int) -> int:
+    return int(np.sqrt(n_docs)) if n_docs >= IVF_MIN_DOCS else 1
+
+
+def fit_ivf(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(centroids, label per doc) of ivf_lists(len(vectors)) k-means inverted lists."""
+    n_lists = ivf_lists(len(vectors))
+    if n_lists == 1:
+        return np.zeros((1, vectors.shape[1]), dtype=np.float32), np.zeros(len(vectors), dtype=np.int32)
+    km = MiniBatchKMeans(n_lists, random_state=0, batch_size=4096, n_init=1).fit(vectors)
+    centroids = km.cluster_centers_.astype(np.float32)
+    centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids, km.labels_.astype(np.int32)
+
+
+class DenseIndex:
+    """
+    Offline dense retrieval over the agent corpus (no network, no GPU).
+
+    Documents are embedded as hashed word + character n-gram features, TF-IDF weighted
+    and projected to DENSE_DIM with a truncated SVD (LSA), then L2-normalized and kept as
+    one float32 matrix. Character n-grams let morphological variants ("forecast" /
+    "forecasting", "hospitalization" / "re-hospitalization") share features; the SVD maps
+    co-occurring vocabulary onto nearby directions.
+
+    Queries go through an IVF index: docs are clustered with k-means into ~sqrt(n_docs)
+    inverted lists, and a query only scores the docs in its IVF_NPROBE closest lists.
+
+    Built with DenseIndex.fit(texts, partitions); the constructor takes the fitted parts,
+    which for a shard come from the whole corpus (see ShardedIndex).
+    """
+
+    def __init__(
+        self,
+        partitions: Dict[Optional[str], np.ndarray],
+        idf: np.ndarray,
+        components: np.ndarray,
+        vectors: np.ndarray,
+        centroids: np.ndarray,
+        labels: np.ndarray,
+    ):
+        """
+        partitions: source_type -> ascending corpus positions of its docs. vectors and
+        labels (each doc's inverted list) are per doc; idf, components and centroids
+        may be shared with other shards.
+        """
+        self._tfidf = _transformer(idf)
+        self._components = components
+        self.vectors = vectors
+        self._n_docs = len(vectors)
+
+        self._source_names: List[Optional[str]] = list(partitions)
+        self._source_codes = np.zeros(self._n_docs, dtype=np.int16)
+        for code, rows in enumerate(partitions.values()):
+            self._source_codes[rows] = code
+
+        # CSR-style inverted lists: rows of list c are list_rows[list_ptr[c]:list_ptr[c + 1]]
+        self._centroids = centroids
+        self._list_rows = np.argsort(labels, kind="stable").astype(np.int32)
+        self._list_ptr = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=len(centroids)), out=self._list_ptr[1:])
+
+    @classmethod
+    def fit(cls, texts: Iterable[str], partitions: Dict[Optional[str], np.ndarray]) -> "DenseIndex":
+        features = hashed_features(texts)
+        n_docs = features.shape[0]
+        idf = fit_idf(document_frequency(features), n_docs)
+        features = tfidf_weight(features, idf)
+        components = fit_basis(features[svd_sample(n_docs)], n_docs)
+        vectors = project(features, components)
+        centroids, labels = fit_ivf(vectors)
+        return cls(partitions, idf, components, vectors, centroids, labels)
+
+    @property
+    def n_docs(self) -> int:
+        return self._n_docs
+
+    @property
+    def n_lists(self) -> int:
+        return len(self._centroids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes + self._components.nbytes + self._centroids.nbytes + self._list_rows.nbytes
+
+    def embed(self, queries: Sequence[str]) -> np.ndarray:
+        """queries -> (n_queries x dim) L2-normalized float32 vectors"""
+        return project(self._tfidf.transform(hashed_features(list(queries))), self._components)
+
+    # ---------------------------
+    # IVF
+    # ---------------------------
+    def _probe(self, qvec: np.ndarray, code: Optional[int], mask: Optional[np.ndarray], nprobe: int) -> np.ndarray:
+        """Rows in the nprobe inverted lists closest to qvec that pass the source_type/mask filters."""
+        if len(self._centroids) == 1:
+            rows = self._list_rows
+        else:
+            probed = np.argsort(-(self._centroids @ qvec), kind="stable")[:nprobe]
+            rows = np.concatenate([self._list_rows[self._list_ptr[c]:self._list_ptr[c + 1]] for c in probed])
+        if code is not None:
+            rows = rows[self._source_codes[rows] == code]
+        return rows if mask is None else rows[mask[rows]]
+
+    def _candidates(self, qvec: np.ndarray, k: int, code: Optional[int], mask: Optional[np.ndarray]) -> np.ndarray:
+        nprobe = IVF_NPROBE
+        while True:
+            rows = self._probe(qvec, code, mask, nprobe)
+            # a narrow source_type/metadata filter can leave the probed lists short; widen the probe
+            if len(rows) >= k or nprobe >= self.n_lists:
+                return rows
+            nprobe *= 2
+
+    def scores(self, qvec: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Exact cosine similarity of one query vector against the given corpus positions."""
+        # a row-by-row reduction rather than a matrix-vector product: BLAS may sum in a
+        # different order depending on how many rows it gets, and a doc's score must not
+        # depend on which other docs are scored with it (e.g. on another shard)
+        return np.einsum("ij,j->i", self.vectors[rows], qvec)
+
+    # ---------------------------
+    # Search
+    # ---------------------------
+    def search(self, query: str, top_k: int, source_type: Optional[str] = None) -> List[Tuple[float, int]]:
+        return self.search_batch([query], [top_k], [source_type])[0]
+
+    def search_batch(
+        self,
+        queries: Sequence[str],
+        top_ks: Sequence[int],
+        source_types: Optional[Sequence[Optional[str]]] = None,
+        masks: Optional[Sequence[Optional[np.ndarray]]] = None,
+    ) -> List[List[Tuple[float, int]]]:
+        """
+        Returns, per query, up to top_ks[j] (score, doc_position) pairs with score > 0,
+        ordered by score desc, then corpus position. masks[j] optionally restricts query j
+        to the corpus positions where it is True.
+        """
+        if not queries:
+            return []
+        return self.search_vectors(self.embed(queries), top_ks, source_types, masks)
+
+    def search_vectors(
+        self,
+        qvecs: np.ndarray,
+        top_ks: Sequence[int],
+        source_types: Optional[Sequence[Optional[str]]] = None,
+        masks: Optional[Sequence[Optional[np.ndarray]]] = None,
+    ) -> List[List[Tuple[float, int]]]:
+        if source_types is None:
+            source_types = [None] * len(qvecs)
+        if masks is None:
+            masks = [None] * len(qvecs)
+
+        out = []
+        for qvec, k, st, mask in zip(qvecs, top_ks, source_types, masks):
+            code = self._source_code(st)
+            if code == -1:
+                out.append([])
+                continue
+            rows = np.sort(self._candidates(qvec, k, code, mask))
+            out.append(self._top_k(rows, self.scores(qvec, rows), k))
+        return out
+
+    def probe_vectors(
+        self,
+        qvecs: np.ndarray,
+        top_ks: Sequence[int],
+        source_types: Sequence[Optional[str]],
+        masks: Sequence[Optional[np.ndarray]],
+        nprobes: Sequence[int],
+    ) -> List[Tuple[List[Tuple[float, int]], int]]:
+        """
+        search_vectors with a fixed probe width per query instead of widening it here:
+        returns (hits, number of candidates probed). A sharded index widens on the total
+        over all shards, which is what an unsharded index would have seen.
+        """
+        out = []
+        for qvec, k, st, mask, nprobe in zip(qvecs, top_ks, source_types, masks, nprobes):
+            code = self._source_code(st)
+            if code == -1:
+                out.append(([], 0))
+                continue
+            rows = np.sort(self._probe(qvec, code, mask, nprobe))
+            out.append((self._top_k(rows, self.scores(qvec, rows), k), len(rows)))
+        return out
+
+    def _source_code(self, source_type: Optional[str]) -> Optional[int]:
+        # None: no source_type filter; -1: a source_type with no docs here
+        if not source_type:
+            return None
+        if source_type not in self._source_names:
+            return -1
+        return self._source_names.index(source_type)
+
+    @staticmethod
+    def _top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        keep = scores > 0
+        rows, scores = rows[keep], scores[keep]
+        if len(rows) > k:
+            # keep everything tied with the k-th best so the final cut is deterministic
+            kth = -np.partition(-scores, k - 1)[k - 1]
+            keep = scores >= kth
+            rows, scores = rows[keep], scores[keep]
+        order = np.lexsort((rows, -scores))[:k]
+        return [(float(scores[o]), int(rows[o])) for o in order]
@@ -0,0 +1,153 @@
+from pathlib import Path
+from array import array
+import json
+import mmap
+import zlib
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from app.services.corpus_format import iter_rows
+
+SNIPPET_CHARS = 300
+
+
+def make_snippet(text: str) -> str:
+    return text[:SNIPPET_CHARS].replace("\n", " ")
+
+
+class MemoryDocStore:
+    """Every corpus row parsed and kept resident (original behaviour)."""
+
+    def __init__(self, docs: List[dict]):
+        self._docs = docs
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def get(self, i: int) -> dict:
+        return self._docs[i]
+
+    def snippet(self, i: int) -> str:
+        return make_snippet(self._docs[i].get("text", ""))
+
+    def metadata(self, i: int) -> dict:
+        return self._docs[i].get("metadata", {})
+
+    def texts(self) -> Iterator[str]:
+        for d in self._docs:
+            yield d.get("text", "")
+
+
+class CompactDocStore:
+    """
+    Columnar, in-memory: each row is reduced to [snippet, metadata] and rows are packed
+    BLOCK_DOCS at a time into zlib-compressed blocks in one bytes blob, addressed by an
+    int64 offset array (a handful of Python objects total instead of several per document).
+    A hit decompresses one small block. Full text is not kept; texts() re-streams it from
+    the corpus file.
+    """
+
+    BLOCK_DOCS = 64
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._n = 0
+        self._pending: List[bytes] = []
+        self._blob = bytearray()
+        self._block_offsets = array("q", [0])
+
+    @staticmethod
+    def encode(text: str, metadata: dict) -> bytes:
+        """The packed [snippet, metadata] record a row is reduced to."""
+        return json.dumps([make_snippet(text), metadata], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def append(self, text: str, metadata: dict) -> None:
+        self.append_encoded(self.encode(text, metadata))
+
+    def append_encoded(self, record: bytes) -> None:
+        self._pending.append(record)
+        self._n += 1
+        if len(self._pending) == self.BLOCK_DOCS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._pending:
+            # JSON escapes newlines inside strings, so b"\n" is a safe record separator
+            self._blob += zlib.compress(b"\n".join(self._pending))
+            self._block_offsets.append(len(self._blob))
+            self._pending = []
+
+    def finish(self) -> None:
+        self._flush()
+        # bytearray over-allocates while growing; freeze to exact-size bytes
+        self._blob = bytes(self._blob)
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(blob, block offsets) of a finished store, for the binary index artifact."""
+        return np.frombuffer(self._blob, dtype=np.uint8), np.frombuffer(self._block_offsets, dtype=np.int64)
+
+    @classmethod
+    def from_arrays(cls, path: Path, n_docs: int, blob: np.ndarray, block_offsets: np.ndarray) -> "CompactDocStore":
+        """A finished store over to_arrays() output, e.g. views into a mapped index artifact."""
+        store = cls(path)
+        store._n = n_docs
+        store._blob = blob
+        store._block_offsets = block_offsets
+        return store
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _record(self, i: int) -> list:
+        b, r = divmod(i, self.BLOCK_DOCS)
+        block = zlib.decompress(self._blob[self._block_offsets[b]:self._block_offsets[b + 1]])
+        return json.loads(block.split(b"\n")[r])
+
+    def get(self, i: int) -> dict:
+        snippet, metadata = self._record(i)
+        return {"snippet": snippet, "metadata": metadata}
+
+    def snippet(self, i: int) -> str:
+        return self._record(i)[0]
+
+    def metadata(self, i: int) -> dict:
+        return self._record(i)[1]
+
+    def texts(self) -> Iterator[str]:
+        for row in iter_rows(self._path):
+            yield row.get("text", "")
+
+
+class MmapDocStore:
+    """
+    Keeps only a byte-offset table into the JSONL file; rows are decoded from an mmap of
+    the file on demand (in practice only for the final top-k hits).
+
+    Relies on the corpus being replaced by rename (see build_agent_corpus): the mapping
+    keeps the old inode alive, so an older index snapshot stays readable after a swap.
+    """
+
+    def __init__(self, path: Path, offsets: array):
+        # offsets[i] = start of row i, offsets[-1] = end of the last row
+        self._offsets = offsets
+        self._mm = None
+        if len(offsets) > 1:
+            with open(path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def get(self, i: int) -> dict:
+        return json.loads(self._mm[self._offsets[i]:self._offsets[i + 1]])
+
+    def snippet(self, i: int) -> str:
+        return make_snippet(self.get(i).get("text", ""))
+
+    def metadata(self, i: int) -> dict:
+        return self.get(i).get("metadata", {})
+
+    def texts(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self.get(i).get("text", "")
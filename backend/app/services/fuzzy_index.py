@@ -0,0 +1,154 @@
+from typing import Container, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+# vocabulary terms a misspelled token may expand to (all at the smallest distance found)
+FUZZY_MAX_EXPANSIONS = 3
+# cap on candidates verified per token and edit budget (most shared trigrams first); bounds
+# the worst case on vocabularies of many near-identical terms at the cost of exactness there
+FUZZY_MAX_CANDIDATES = 1000
+
+
+def max_edits(token: str) -> int:
+    """Edit budget by token length: short tokens are too ambiguous to correct."""
+    if len(token) <= 3:
+        return 0
+    return 1 if len(token) <= 5 else 2
+
+
+def unknown_tokens(tokens: Iterable[str], vocab: Container[str]) -> List[str]:
+    """The tokens worth correcting: outside the vocabulary and long enough to have an edit budget."""
+    return sorted(t for t in tokens if t not in vocab and max_edits(t))
+
+
+# corpus tokens are [a-z0-9_]; anything else shares the last histogram column
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789_"
+_CHAR_COLUMN = np.full(256, len(_ALPHABET), dtype=np.int64)
+_CHAR_COLUMN[np.frombuffer(_ALPHABET.encode(), dtype=np.uint8)] = np.arange(len(_ALPHABET))
+
+
+def _char_histograms(terms: Sequence[str], lengths: np.ndarray) -> np.ndarray:
+    """(len(terms) x columns) character counts, saturating at 255."""
+    n_cols = len(_ALPHABET) + 1
+    # one byte per character ("?" for non-ASCII, which lands in the catch-all column)
+    chars = np.frombuffer("".join(terms).encode("ascii", "replace"), dtype=np.uint8)
+    owner = np.repeat(np.arange(len(terms), dtype=np.int64), lengths)
+    counts = np.bincount(owner * n_cols + _CHAR_COLUMN[chars], minlength=len(terms) * n_cols)
+    return np.minimum(counts, 255).astype(np.uint8).reshape(len(terms), n_cols)
+
+
+def _trigrams(term: str) -> List[str]:
+    padded = f"${term}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> Optional[int]:
+    """
+    Optimal string alignment distance (insert, delete, substitute, swap adjacent), or None
+    as soon as it is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return None
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return None
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else None
+
+
+class TrigramIndex:
+    """
+    Character-trigram index over the corpus vocabulary for typo-tolerant queries.
+
+    Each term is split into trigrams of "$term$"; trigram ids map to CSR arrays of the
+    term ids containing them. One edit changes at most 4 of a token's trigrams (3 for an
+    insert/delete/substitute, 4 for an adjacent swap), so a term within k edits shares at
+    least (trigram count - 4k) of them. Candidates are the terms reaching that many shared
+    trigrams (counted over the token's posting lists) whose length and character counts
+    are also within k edits; only those are verified with a bounded edit distance.
+    """
+
+    def __init__(self, terms: Sequence[str], df: np.ndarray):
+        """terms: sorted vocabulary; df: document frequency per term (ranks ties)."""
+        self.terms = list(terms)
+        self.df = df
+        self.term_len = np.fromiter((len(t) for t in self.terms), dtype=np.int32, count=len(self.terms))
+        # per-term character counts: an edit changes at most one in each direction
+        self._hist = _char_histograms(self.terms, self.term_len)
+
+        grams: Dict[str, int] = {}
+        gram_ids: List[int] = []
+        term_ids: List[int] = []
+        for tid, term in enumerate(self.terms):
+            for g in set(_trigrams(term)):
+                gid = grams.get(g)
+                if gid is None:
+                    gid = grams[g] = len(grams)
+                gram_ids.append(gid)
+                term_ids.append(tid)
+
+        gram_arr = np.array(gram_ids, dtype=np.int32)
+        order = np.argsort(gram_arr, kind="stable")
+        self._grams = grams
+        self._term_ids = np.array(term_ids, dtype=np.int32)[order]
+        self._ptr = np.zeros(len(grams) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(gram_arr, minlength=len(grams)), out=self._ptr[1:])
+
+    def expand(self, token: str, max_expansions: int = FUZZY_MAX_EXPANSIONS) -> List[str]:
+        """
+        The closest vocabulary terms to token within max_edits(token), ranked by distance,
+        then document frequency, then term. Empty if nothing is close enough.
+
+        Budgets are tried in increasing order: one edit allows a much stricter trigram
+        bound than two, and a one-edit match makes any two-edit term irrelevant.
+        """
+        token_grams = set(_trigrams(token))
+        lists = [
+            self._term_ids[self._ptr[gid]:self._ptr[gid + 1]]
+            for gid in (self._grams.get(g) for g in token_grams)
+            if gid is not None
+        ]
+        if not lists:
+            return []
+        cand, shared = np.unique(np.concatenate(lists), return_counts=True)
+        length_gap = np.abs(self.term_len[cand] - len(token))
+        keep = length_gap <= max_edits(token)
+        cand, shared, length_gap = cand[keep], shared[keep], length_gap[keep]
+        # bag distance: max(chars the term has in excess, chars it lacks) <= edit distance
+        diff = self._hist[cand].astype(np.int16) - _char_histograms([token], np.array([len(token)]))[0]
+        bag_gap = np.maximum(np.maximum(diff, 0).sum(axis=1), np.maximum(-diff, 0).sum(axis=1))
+
+        for k in range(1, max_edits(token) + 1):
+            keep = (shared >= max(1, len(token_grams) - 4 * k)) & (length_gap <= k) & (bag_gap <= k)
+            tids, counts = cand[keep], shared[keep]
+            if len(tids) > FUZZY_MAX_CANDIDATES:
+                tids = tids[np.argsort(-counts, kind="stable")[:FUZZY_MAX_CANDIDATES]]
+
+            scored = []
+            for tid in tids.tolist():
+                d = bounded_edit_distance(token, self.terms[tid], k)
+                if d is not None:
+                    scored.append((d, -int(self.df[tid]), self.terms[tid]))
+            if scored:
+                scored.sort()
+                best = scored[0][0]
+                return [term for d, _, term in scored[:max_expansions] if d == best]
+        return []
+
+    def expand_all(self, tokens: Iterable[str]) -> Dict[str, List[str]]:
+        """token -> expansions, leaving out tokens with no close enough term."""
+        out = {}
+        for token in tokens:
+            terms = self.expand(token)
+            if terms:
+                out[token] = terms
+        return out
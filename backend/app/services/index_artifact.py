@@ -0,0 +1,102 @@
+from pathlib import Path
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+# on-disk layout: MAGIC, <u4 format version, <u8 header length, JSON header, then the
+# sections, each a flat little-endian array starting on an ALIGN-byte boundary. The header
+# holds the caller's metadata and, per section, its [offset, dtype, count].
+MAGIC = b"CORPIDX\n"
+# bump on any change to the layout or to what CorpusIndex stores in it; readers ignore
+# artifacts of another version (the server then rebuilds from the JSONL)
+FORMAT_VERSION = 1
+ALIGN = 64
+_PREFIX = struct.Struct("<8sIQ")
+
+
+def index_path_for(corpus_path: Path) -> Path:
+    """
+    artifacts/agent_corpus.jsonl -> artifacts/agent_corpus.jsonl.idx. The corpus format
+    stays in the name, so each format's corpus keeps its own artifact.
+    """
+    return corpus_path.with_name(corpus_path.name + ".idx")
+
+
+def _le(a: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(a, dtype=a.dtype.newbyteorder("<"))
+
+
+def write_artifact(path: Path, meta: Dict[str, Any], sections: Dict[str, np.ndarray]) -> Path:
+    """
+    Writes named flat arrays plus a JSON-serializable meta dict to path (atomically, via
+    a temp file and rename, so a mapped older artifact stays valid for its readers).
+    """
+    arrays = {name: _le(a) for name, a in sections.items()}
+    # offsets depend on the header length and vice versa: lay out against a header with
+    # room for the final offsets, then pad the real one to that size
+    layout: Dict[str, list] = {name: [0, a.dtype.str, int(a.size)] for name, a in arrays.items()}
+    draft = json.dumps({"meta": meta, "sections": layout}).encode("utf-8")
+    header_len = len(draft) + 24 * len(arrays) + ALIGN
+    pos = _PREFIX.size + header_len
+    for name, a in arrays.items():
+        pos += -pos % ALIGN
+        layout[name][0] = pos
+        pos += a.nbytes
+    header = json.dumps({"meta": meta, "sections": layout}).encode("utf-8")
+    if len(header) > header_len:
+        raise ValueError("index artifact header outgrew its reserved space")
+    header = header.ljust(header_len, b" ")
+
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, header_len))
+            f.write(header)
+            for name, a in arrays.items():
+                f.write(b"\0" * (layout[name][0] - f.tell()))
+                f.write(a.data)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    os.replace(tmp, path)
+    return path
+
+
+def read_meta(path: Path) -> Optional[Dict[str, Any]]:
+    """The meta dict of an artifact, or None if path is missing or not a current-format artifact."""
+    try:
+        with open(path, "rb") as f:
+            prefix = f.read(_PREFIX.size)
+            if len(prefix) < _PREFIX.size:
+                return None
+            magic, version, header_len = _PREFIX.unpack(prefix)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                return None
+            return json.loads(f.read(header_len))["meta"]
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def open_artifact(path: Path) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Maps the artifact read-only and returns (meta, sections) with every section a
+    zero-copy NumPy view into the mapping: the pages are shared with every other process
+    mapping the same file and only faulted in when touched. The mapping lives as long as
+    any of the arrays does.
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, header_len = _PREFIX.unpack_from(mm, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"{path}: not a version {FORMAT_VERSION} index artifact")
+    header = json.loads(mm[_PREFIX.size:_PREFIX.size + header_len])
+    sections = {
+        name: np.frombuffer(mm, dtype=np.dtype(dtype), count=count, offset=offset)
+        for name, (offset, dtype, count) in header["sections"].items()
+    }
+    return header["meta"], sections
@@ -1,15 +1,19 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, asdict
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 import time
 import json
 import re
+import threading
 
-import requests
 from requests import Response
 import xml.etree.ElementTree as ET
 
+from app.core.config import settings
+from app.infra.http_client import PooledHTTPClient
+
 
 # -----------------------------
 # Unified schema for your agent
@@ -33,13 +37,43 @@ def _clean_text(s: Optional[str]) -> Optional[str]:
     return s or None
 
 
-def _http_get(url: str, params: Dict[str, Any] | None = None, timeout: int = 25) -> Response:
-    headers = {
-        "User-Agent": "ProfessorAgent/0.1 (mailto:you@example.com)"
-    }
-    r = requests.get(url, params=params, headers=headers, timeout=timeout)
-    r.raise_for_status()
-    return r
+USER_AGENT = "ProfessorAgent/0.1 (mailto:you@example.com)"
+
+# one pooled, retrying client per source (connections are per host anyway)
+_clients: Dict[str, PooledHTTPClient] = {}
+_clients_lock = threading.Lock()
+
+
+def _client(source: str) -> PooledHTTPClient:
+    with _clients_lock:
+        client = _clients.get(source)
+        if client is None:
+            base_url = {
+                "openalex": settings.LITERATURE_OPENALEX_URL,
+                "crossref": settings.LITERATURE_CROSSREF_URL,
+                "arxiv": settings.LITERATURE_ARXIV_URL,
+            }[source]
+            client = _clients[source] = PooledHTTPClient(
+                source,
+                base_url,
+                pool_size=settings.LITERATURE_HTTP_POOL_SIZE,
+                retries=settings.LITERATURE_HTTP_RETRIES,
+                backoff_secs=settings.LITERATURE_HTTP_BACKOFF_SECS,
+                max_retry_after_secs=settings.LITERATURE_HTTP_MAX_RETRY_AFTER_SECS,
+                headers={"User-Agent": USER_AGENT},
+            )
+        return client
+
+
+def _http_get(source: str, path: str, params: Dict[str, Any] | None = None, timeout: int = 25) -> Response:
+    return _client(source).get(path, params=params, timeout=timeout)
+
+
+def http_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-source request, retry and connection-reuse counters since startup."""
+    with _clients_lock:
+        clients = dict(_clients)
+    return {source: client.stats() for source, client in clients.items()}
 
 
 # -----------------------------
@@ -50,12 +84,11 @@ def search_openalex(query: str, max_results: int = 10, timeout: int = 25) -> Lis
     OpenAlex works endpoint: https://api.openalex.org/works?search=...
     Tip: include a real email in User-Agent if you deploy this.
     """
-    url = "https://api.openalex.org/works"
     params = {
         "search": query,
         "per-page": max(1, min(max_results, 25)),
     }
-    data = _http_get(url, params=params, timeout=timeout).json()
+    data = _http_get("openalex", "/works", params=params, timeout=timeout).json()
     results = data.get("results", []) or []
 
     papers: List[Paper] = []
@@ -105,13 +138,12 @@ def search_crossref(query: str, max_results: int = 10, timeout: int = 25) -> Lis
     """
     Crossref works endpoint: https://api.crossref.org/works?query=...
     """
-    url = "https://api.crossref.org/works"
     params = {
         "query": query,
         "rows": max(1, min(max_results, 25)),
         "mailto": "you@example.com",  # recommended by Crossref
     }
-    data = _http_get(url, params=params, timeout=timeout).json()
+    data = _http_get("crossref", "/works", params=params, timeout=timeout).json()
     items = (data.get("message") or {}).get("items", []) or []
 
     papers: List[Paper] = []
@@ -166,13 +198,12 @@ def search_arxiv(query: str, max_results: int = 10, timeout: int = 25) -> List[P
     arXiv Atom API: http://export.arxiv.org/api/query?search_query=all:...
     Returns Atom XML; we parse it into Paper objects.
     """
-    url = "http://export.arxiv.org/api/query"
     params = {
         "search_query": f"all:{query}",
         "start": 0,
         "max_results": max(1, min(max_results, 25)),
     }
-    xml_text = _http_get(url, params=params, timeout=timeout).text
+    xml_text = _http_get("arxiv", "/api/query", params=params, timeout=timeout).text
     root = ET.fromstring(xml_text)
 
     ns = {"atom": "http://www.w3.org/2005/Atom"}
@@ -216,25 +247,25 @@ def search_literature(
     timeout: int = 25,
 ) -> List[Paper]:
     """
-    Try OpenAlex first, then Crossref, then arXiv.
+    Query OpenAlex, Crossref and arXiv concurrently (one thread each, so latency is the
+    slowest source rather than the sum); results are merged in that order.
+    A source that fails is skipped.
     Deduplicate by DOI if present, else by normalized title.
     """
+    sources: List[Callable[..., List[Paper]]] = [search_openalex, search_crossref, search_arxiv]
     all_papers: List[Paper] = []
 
-    try:
-        all_papers.extend(search_openalex(query, max_results=max_results_per_source, timeout=timeout))
-    except Exception:
-        pass
-
-    try:
-        all_papers.extend(search_crossref(query, max_results=max_results_per_source, timeout=timeout))
-    except Exception:
-        pass
-
-    try:
-        all_papers.extend(search_arxiv(query, max_results=max_results_per_source, timeout=timeout))
-    except Exception:
-        pass
+    with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="literature") as pool:
+        futures = [
+            pool.submit(search, query, max_results=max_results_per_source, timeout=timeout)
+            for search in sources
+        ]
+        # collected in submission order, not completion order, so the merge is deterministic
+        for future in futures:
+            try:
+                all_papers.extend(future.result())
+            except Exception:
+                pass
 
     # Deduplicate
     seen = set()
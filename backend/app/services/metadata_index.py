@@ -0,0 +1,295 @@
+from array import array
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+# metadata fields that can be filtered and faceted on; "keywords" is multi-valued
+FILTER_FIELDS = ("source_type", "year", "org", "keywords")
+NUMERIC_FIELDS = ("year",)
+FIELD_ALIASES = {"keyword": "keywords", "type": "source_type"}
+# most frequent values returned per facet field
+FACET_LIMIT = 20
+
+_filter_re = re.compile(r"^\s*([A-Za-z_]+)\s*(>=|<=|=|:|>|<)\s*(.+?)\s*$")
+
+# popcount of every byte value, for counting bits in packed bitmaps
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class Predicate(NamedTuple):
+    field: str
+    op: str  # "=", ">=", "<=", ">", "<"
+    value: Union[str, int]
+
+
+def parse_filter(expr: str) -> Predicate:
+    """
+    "year>=2020", "org=MIT", "keyword:genomics" -> Predicate. Raises ValueError on bad input.
+    """
+    m = _filter_re.match(expr)
+    if not m:
+        raise ValueError(f"Bad filter {expr!r} (expected e.g. 'year>=2020' or 'org=MIT')")
+    field, op, value = m.group(1).lower(), m.group(2), m.group(3)
+    field = FIELD_ALIASES.get(field, field)
+    op = "=" if op == ":" else op
+
+    if field not in FILTER_FIELDS:
+        raise ValueError(f"Unknown filter field: {field!r} (expected one of {', '.join(FILTER_FIELDS)})")
+    if field in NUMERIC_FIELDS:
+        try:
+            return Predicate(field, op, int(value))
+        except ValueError:
+            raise ValueError(f"Filter {expr!r}: {field} must be an integer") from None
+    if op != "=":
+        raise ValueError(f"Filter {expr!r}: range operators only apply to {', '.join(NUMERIC_FIELDS)}")
+    return Predicate(field, op, value.casefold())
+
+
+def parse_filters(exprs: Optional[Iterable[str]]) -> Tuple[Predicate, ...]:
+    """Parsed and sorted, so equivalent filter lists give equal (cache-key friendly) tuples."""
+    return tuple(sorted(parse_filter(e) for e in (exprs or [])))
+
+
+def _field_values(metadata: dict, field: str) -> List[Union[str, int]]:
+    raw = metadata.get(field)
+    values = raw if isinstance(raw, list) else [raw]
+    out: List[Union[str, int]] = []
+    for v in values:
+        if v is None or v == "":
+            continue
+        if field in NUMERIC_FIELDS:
+            try:
+                out.append(int(v))
+            except (TypeError, ValueError):
+                continue
+        else:
+            out.append(str(v).strip())
+    return out
+
+
+class MetadataIndex:
+    """
+    Per-value document bitmaps over the filterable metadata fields, built during the corpus
+    load pass.
+
+    Each (field, value) maps to the set of corpus positions holding it. Like roaring bitmaps,
+    a value's set is stored as a packed bitset (n_docs / 8 bytes) when the value is common
+    and as a sorted int32 position array (4 bytes per doc) when that is smaller, so a
+    long tail of rare orgs and keywords stays cheap. Filters are AND across fields and OR
+    within a field (several org=... values), and ranges OR together the matching years.
+    """
+
+    def __init__(self):
+        self.n_docs = 0
+        # field -> casefolded value -> display label (first spelling seen)
+        self._labels: Dict[str, Dict[Union[str, int], str]] = {f: {} for f in FILTER_FIELDS}
+        self._building: Dict[str, Dict[Union[str, int], array]] = {f: {} for f in FILTER_FIELDS}
+        # field -> value -> packed uint8 bitset or sorted int32 positions
+        self._sets: Dict[str, Dict[Union[str, int], np.ndarray]] = {f: {} for f in FILTER_FIELDS}
+        self._numeric_keys: Dict[str, np.ndarray] = {}
+
+    # ---------------------------
+    # Build
+    # ---------------------------
+    @staticmethod
+    def doc_values(metadata: dict) -> Iterator[Tuple[str, Union[str, int], str]]:
+        """(field, key, label) of every filterable value of one doc's metadata."""
+        for field in FILTER_FIELDS:
+            for v in set(_field_values(metadata, field)):
+                yield field, v if field in NUMERIC_FIELDS else v.casefold(), str(v)
+
+    def add(self, metadata: dict) -> None:
+        i = self.n_docs
+        self.n_docs += 1
+        for field, key, label in self.doc_values(metadata):
+            self._labels[field].setdefault(key, label)
+            positions = self._building[field].get(key)
+            if positions is None:
+                positions = self._building[field][key] = array("i")
+            positions.append(i)
+
+    def add_rows(self, field: str, key: Union[str, int], label: str, rows: np.ndarray) -> None:
+        """Bulk add: one value's ascending int32 doc positions (n_docs is the caller's to set)."""
+        self._labels[field].setdefault(key, label)
+        self._building[field][key] = rows
+
+    def finish(self) -> None:
+        # a bitset costs n_docs / 8 bytes, a position array 4 bytes per doc
+        dense_min = self.n_docs // 32
+        for field, values in self._building.items():
+            for key, positions in values.items():
+                rows = np.frombuffer(positions, dtype=np.int32).copy()
+                self._sets[field][key] = self._pack(rows) if len(rows) > dense_min else rows
+        self._building = {}
+        for field in NUMERIC_FIELDS:
+            self._numeric_keys[field] = np.array(sorted(self._sets[field]), dtype=np.int64)
+
+    def _pack(self, rows: np.ndarray) -> np.ndarray:
+        mask = np.zeros(self.n_docs, dtype=bool)
+        mask[rows] = True
+        return np.packbits(mask, bitorder="little")
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s.nbytes for values in self._sets.values() for s in values.values())
+
+    # ---------------------------
+    # Index artifact
+    # ---------------------------
+    def to_arrays(self) -> Tuple[dict, np.ndarray, np.ndarray]:
+        """
+        (directory, bitsets, positions) for the binary index artifact: every value's set
+        concatenated into one uint8 and one int32 array, the directory (JSON-serializable)
+        holding each value's label and [start, end) in the one its set went to.
+        """
+        directory: Dict[str, list] = {}
+        bits: List[np.ndarray] = []
+        rows: List[np.ndarray] = []
+        n_bits = n_rows = 0
+        for field, values in self._sets.items():
+            entries = directory[field] = []
+            for key, s in values.items():
+                if s.dtype == np.uint8:
+                    entries.append([key, self._labels[field][key], "bits", n_bits, n_bits + len(s)])
+                    bits.append(s)
+                    n_bits += len(s)
+                else:
+                    entries.append([key, self._labels[field][key], "rows", n_rows, n_rows + len(s)])
+                    rows.append(s)
+                    n_rows += len(s)
+        return (
+            {"n_docs": self.n_docs, "fields": directory},
+            np.concatenate(bits) if bits else np.zeros(0, dtype=np.uint8),
+            np.concatenate(rows) if rows else np.zeros(0, dtype=np.int32),
+        )
+
+    @classmethod
+    def from_arrays(cls, directory: dict, bits: np.ndarray, rows: np.ndarray) -> "MetadataIndex":
+        """Inverse of to_arrays(); the sets are views into the given arrays, not copies."""
+        index = cls()
+        index.n_docs = directory["n_docs"]
+        index._building = {}
+        for field, entries in directory["fields"].items():
+            for key, label, kind, start, end in entries:
+                index._labels[field][key] = label
+                index._sets[field][key] = (bits if kind == "bits" else rows)[start:end]
+        for field in NUMERIC_FIELDS:
+            index._numeric_keys[field] = np.array(sorted(index._sets[field]), dtype=np.int64)
+        return index
+
+    # ---------------------------
+    # Filters
+    # ---------------------------
+    def _values_for(self, pred: Predicate) -> List[Union[str, int]]:
+        if pred.op == "=":
+            return [pred.value]
+        keys = self._numeric_keys[pred.field]
+        if pred.op == ">=":
+            keys = keys[keys >= pred.value]
+        elif pred.op == ">":
+            keys = keys[keys > pred.value]
+        elif pred.op == "<=":
+            keys = keys[keys <= pred.value]
+        else:
+            keys = keys[keys < pred.value]
+        return [int(k) for k in keys]
+
+    def match(self, predicates: Sequence[Predicate]) -> Optional[np.ndarray]:
+        """
+        Boolean mask over corpus positions for the docs passing every predicate, or None
+        when there are no predicates.
+        """
+        if not predicates:
+            return None
+
+        by_field: Dict[str, List[Predicate]] = {}
+        for p in predicates:
+            by_field.setdefault(p.field, []).append(p)
+
+        result = np.ones(self.n_docs, dtype=bool)
+        for field, preds in by_field.items():
+            ranges = [p for p in preds if p.op != "="]
+            equals = [p for p in preds if p.op == "="]
+            # ranges on one field intersect (year>=2018 & year<2022); equalities are alternatives
+            for p in ranges:
+                result &= self._union(field, self._values_for(p))
+            if equals:
+                result &= self._union(field, [p.value for p in equals])
+        return result
+
+    def _union(self, field: str, values: Iterable[Union[str, int]]) -> np.ndarray:
+        packed = np.zeros((self.n_docs + 7) // 8, dtype=np.uint8)
+        rows: List[np.ndarray] = []
+        for v in values:
+            s = self._sets[field].get(v)
+            if s is None:
+                continue
+            if s.dtype == np.uint8:
+                packed |= s
+            else:
+                rows.append(s)
+        mask = np.unpackbits(packed, count=self.n_docs, bitorder="little").view(bool)
+        for r in rows:
+            mask[r] = True
+        return mask
+
+    # ---------------------------
+    # Facets
+    # ---------------------------
+    def facet_counts(
+        self,
+        hits: np.ndarray,
+        fields: Sequence[str],
+        limit: Optional[int] = FACET_LIMIT,
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        hits: boolean mask of the matching docs. Returns, per field, the `limit` most
+        frequent values among them (count desc, then value); limit=None returns all.
+        """
+        hits_packed = np.packbits(hits, bitorder="little")
+        out: Dict[str, Dict[str, int]] = {}
+        for field in fields:
+            field = FIELD_ALIASES.get(field, field)
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Unknown facet field: {field!r} (expected one of {', '.join(FILTER_FIELDS)})")
+            counts = []
+            for key, s in self._sets[field].items():
+                if s.dtype == np.uint8:
+                    # bitmap intersection + popcount
+                    n = int(_POPCOUNT[s & hits_packed].sum(dtype=np.int64))
+                else:
+                    n = int(np.count_nonzero(hits[s]))
+                if n:
+                    counts.append((-n, key, self._labels[field][key]))
+            counts.sort()
+            out[field] = {label: -n for n, _, label in counts[:limit]}
+        return out
+
+
+def _facet_key(field: str, label: str) -> Union[str, int]:
+    return int(label) if field in NUMERIC_FIELDS else label.casefold()
+
+
+def merge_facet_counts(
+    parts: Sequence[Dict[str, Dict[str, int]]],
+    limit: Optional[int] = FACET_LIMIT,
+) -> Dict[str, Dict[str, int]]:
+    """
+    Sums complete (limit=None) facet counts from several shards and applies the limit,
+    ordering values exactly as MetadataIndex.facet_counts does.
+    """
+    merged: Dict[str, Dict[Union[str, int], List]] = {}
+    for part in parts:
+        for field, counts in part.items():
+            values = merged.setdefault(field, {})
+            for label, n in counts.items():
+                entry = values.setdefault(_facet_key(field, label), [0, label])
+                entry[0] += n
+
+    out: Dict[str, Dict[str, int]] = {}
+    for field, values in merged.items():
+        ranked = sorted((-n, key, label) for key, (n, label) in values.items())
+        out[field] = {label: -n for n, _, label in ranked[:limit]}
+    return out
@@ -1,7 +1,19 @@
 from pathlib import Path
-import json
-import re
-from typing import List, Optional
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from app.core.config import settings
+from app.infra.lru_cache import LRUCache
+from app.services.corpus_format import with_format
+from app.services.corpus_index import CorpusIndex, CorpusSignature, RetrievalUnavailable, _term_counts, _tokens
+from app.services.index_artifact import index_path_for
+from app.services.metadata_index import parse_filters
+from app.services.sharded_index import SHARD_MANIFEST, ShardedIndex, is_shard_manifest
+from app.services.suggest_index import SUGGEST_LIMIT
+
+logger = logging.getLogger(__name__)
 
 
 def _repo_root() -> Path:
@@ -11,54 +23,395 @@ def _repo_root() -> Path:
 
 REPO_ROOT = _repo_root()
 CORPUS_PATH = REPO_ROOT / "artifacts" / "agent_corpus.jsonl"
+# written by build_agent_corpus(..., shards=N); used instead of CORPUS_PATH when RETRIEVAL_SHARDED
+SHARDED_CORPUS_PATH = REPO_ROOT / "artifacts" / "agent_corpus.shards" / SHARD_MANIFEST
 
-
-_word_re = re.compile(r"[A-Za-z0-9_]+")
+# "overlap" = distinct query terms present in the doc (original behaviour)
+# "tfidf"   = cosine similarity on a scikit-learn TF-IDF matrix (fitted on first use)
+# "dense"   = local n-gram/SVD embeddings searched through an IVF index (built on first use)
+# "hybrid"  = dense and bm25 scores fused
+RANKERS = ("overlap", "bm25", "tfidf", "dense", "hybrid")
 
 
-def _tokens(text: str) -> set[str]:
-    return set(t.lower() for t in _word_re.findall(text))
+def _stat_or_none(path: Path) -> Optional[CorpusSignature]:
+    try:
+        return CorpusSignature.of(path)
+    except FileNotFoundError:
+        return None
 
 
 class RetrievalService:
-    def __init__(self):
-        self.docs = self._load_corpus()
+    """
+    Keyword retrieval over artifacts/agent_corpus.jsonl (or its compressed / columnar
+    variant, see RETRIEVAL_CORPUS_FORMAT).
+
+    The loaded corpus lives in an immutable CorpusIndex (or, when corpus_path is a shard
+    manifest, a ShardedIndex with one worker process per shard). When the file changes (detected by
+    a background stat poll, or forced via reload()), a new CorpusIndex is built off to the
+    side and swapped in with a single reference assignment, so queries never see a
+    half-built index and never wait for a rebuild. The first load goes through the same
+    path, so the service can exist (and the app can start) before any corpus is loaded.
+    """
+
+    def __init__(
+        self,
+        corpus_path: Optional[Path] = None,
+        watch_interval: Optional[float] = None,
+        storage: Optional[str] = None,
+        lazy: bool = False,
+    ):
+        if settings.RETRIEVAL_SHARDED:
+            default_path = SHARDED_CORPUS_PATH
+        else:
+            default_path = with_format(CORPUS_PATH, settings.RETRIEVAL_CORPUS_FORMAT)
+        self.corpus_path = Path(corpus_path or default_path)
+        self.storage = storage or settings.RETRIEVAL_STORAGE
+        self._index: Optional[Union[CorpusIndex, ShardedIndex]] = None
+        self._seen_signature: Optional[CorpusSignature] = None
+        # stat of each corpus file's index artifact when last checked (see _check_artifacts)
+        self._seen_artifacts: Optional[tuple] = None
+
+        self._reload_lock = threading.Lock()
+        self._reload_thread: Optional[threading.Thread] = None
+        self._last_error: Optional[str] = None
+
+        # result cache; entries are keyed on the corpus version and cleared when it changes
+        self.cache = LRUCache(settings.RETRIEVAL_CACHE_SIZE, settings.RETRIEVAL_CACHE_TTL_SECS)
+
+        self._watch_interval = settings.RETRIEVAL_WATCH_SECS if watch_interval is None else watch_interval
+        self._stop = threading.Event()
+        self._started = False
+
+        if not lazy:
+            # direct construction keeps the old contract: load now, raise if the corpus is missing
+            self._index = self._load()
+            self._seen_signature = self._index.signature
+            self.start()
+
+    def start(self, wait: bool = False) -> None:
+        """
+        Kicks off the first load (in the background unless wait=True) and the file watcher.
+        Safe to call more than once. A missing corpus is not an error: the watcher loads it
+        once it appears.
+        """
+        with self._reload_lock:
+            if self._started:
+                return
+            self._started = True
+
+        if self._index is None and self.corpus_path.exists():
+            self.reload(wait=wait)
+
+        if self._watch_interval > 0:
+            t = threading.Thread(target=self._watch, args=(self._watch_interval,), daemon=True)
+            t.start()
+
+    # ---------------------------
+    # Corpus versioning / reload
+    # ---------------------------
+    def _load(self) -> Union[CorpusIndex, ShardedIndex]:
+        use_artifact = settings.RETRIEVAL_INDEX_ARTIFACT
+        if is_shard_manifest(self.corpus_path):
+            return ShardedIndex.load(self.corpus_path, storage=self.storage, use_artifact=use_artifact)
+        return CorpusIndex.load(self.corpus_path, storage=self.storage, use_artifact=use_artifact)
+
+    @property
+    def index(self) -> Optional[Union[CorpusIndex, ShardedIndex]]:
+        return self._index
+
+    @property
+    def version(self) -> Optional[str]:
+        index = self._index
+        return index.version if index else None
+
+    @property
+    def reloading(self) -> bool:
+        t = self._reload_thread
+        return t is not None and t.is_alive()
+
+    @property
+    def state(self) -> str:
+        """ready | warming | missing | failed | cold"""
+        if self._index is not None:
+            return "ready"
+        if self.reloading:
+            return "warming"
+        if self._last_error:
+            return "failed"
+        if not self.corpus_path.exists():
+            return "missing"
+        return "warming" if self._started else "cold"
+
+    def status(self) -> dict:
+        index = self._index
+        return {
+            "state": self.state,
+            "corpus_path": str(self.corpus_path),
+            "version": index.version if index else None,
+            "n_docs": index.n_docs if index else 0,
+            "storage": self.storage,
+            "shards": index.n_shards if index else None,
+            "index_artifact": index.from_artifact if index else None,
+            "loaded_at": index.loaded_at if index else None,
+            "reloading": self.reloading,
+            "last_error": self._last_error,
+            "cache": self.cache.stats(),
+        }
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.check_for_update()
+            except Exception:
+                logger.exception("Corpus watch failed")
+
+    def close(self) -> None:
+        self._stop.set()
+        index = self._index
+        if index is not None:
+            index.close(delay=0)
+
+    def check_for_update(self) -> bool:
+        """
+        Starts a background reload if the corpus file's size/mtime changed since the last
+        load. Returns True if a reload was started.
+        """
+        try:
+            sig = CorpusSignature.of(self.corpus_path)
+        except FileNotFoundError:
+            return False
+        if sig == self._seen_signature:
+            return self._check_artifacts()
+        return self.reload()
+
+    def _check_artifacts(self) -> bool:
+        """
+        Starts a background reload if the current index was parsed from the corpus but a
+        current index artifact for it has appeared since, e.g. one the pipeline writes
+        right after renaming the new corpus into place, so the rows get mapped (and shared
+        between workers) instead of staying in this process's private memory.
+        """
+        index = self._index
+        if index is None or index.from_artifact or self.storage == "memory" or not settings.RETRIEVAL_INDEX_ARTIFACT:
+            return False
+        state = tuple(_stat_or_none(index_path_for(p)) for p in index.corpus_files)
+        if state == self._seen_artifacts:
+            return False
+        # artifact_is_current may hash the corpus; only ask again once an artifact changes
+        if None in state or not all(CorpusIndex.artifact_is_current(p) for p in index.corpus_files):
+            self._seen_artifacts = state
+            return False
+        started = self.reload()
+        if started:
+            self._seen_artifacts = state
+        return started
 
-    def _load_corpus(self) -> List[dict]:
-        if not CORPUS_PATH.exists():
-            raise FileNotFoundError(f"Corpus not found: {CORPUS_PATH}")
+    def reload(self, force: bool = False, wait: bool = False) -> bool:
+        """
+        Rebuilds the index in a background thread and swaps it in when ready.
+        Without force, a file whose content hash is unchanged keeps the current index
+        (unless the new one is mapped from an index artifact and the current one is not).
+        Returns False if a reload was already running.
+        """
+        with self._reload_lock:
+            running = self._reload_thread is not None and self._reload_thread.is_alive()
+            if not running:
+                self._reload_thread = threading.Thread(target=self._rebuild, args=(force,), daemon=True)
+                self._reload_thread.start()
+            t = self._reload_thread
 
-        docs = []
-        with open(CORPUS_PATH, "r", encoding="utf-8") as f:
-            for line in f:
-                if line.strip():
-                    docs.append(json.loads(line))
-        return docs
+        if wait:
+            t.join()
+        return not running
+
+    def _rebuild(self, force: bool) -> None:
+        current = self._index
+        old_version = current.version if current else None
+        try:
+            # remembered even if the load fails, so a bad file isn't retried on every poll
+            self._seen_signature = CorpusSignature.of(self.corpus_path)
+            new = self._load()
+        except Exception as e:
+            logger.exception("Corpus load failed; keeping version %s", old_version)
+            self._last_error = str(e)
+            return
+
+        self._seen_signature = new.signature
+        self._seen_artifacts = None
+        self._last_error = None
+        # same content: keep the current index, unless this one maps an artifact it lacked
+        remapped = current is not None and new.from_artifact and not current.from_artifact
+        if current is not None and not force and new.version == current.version and not remapped:
+            new.close()
+            return
+
+        # keep tfidf/dense warm across versions so the first such query after a swap doesn't stall
+        if current is not None and current.has_tfidf:
+            new.tfidf_index()
+        if current is not None and current.has_dense:
+            new.dense_index()
+        if current is not None and current.has_fuzzy:
+            new.fuzzy_index()
+
+        self._index = new  # atomic swap
+        if current is None or new.version != current.version:
+            self.cache.clear()
+        if current is not None:
+            current.close()  # sharded: worker processes retire after a grace period
+        logger.info(
+            "Corpus loaded: version %s -> %s (%d docs%s)",
+            old_version, new.version, new.n_docs, ", mapped from index artifact" if new.from_artifact else "",
+        )
+
+    # ---------------------------
+    # Search
+    # ---------------------------
+    def query_batch(
+        self,
+        items: Sequence[Dict[str, Any]],
+        ranker: str = "overlap",
+        facets: Sequence[str] = (),
+    ) -> List[Dict[str, Any]]:
+        """
+        Runs many searches in one pass over the index.
+        Each item: {"query": str, "top_k": int, "source_type": Optional[str],
+                    "filters": Optional[List[str]], "fuzzy": bool} where filters are
+        predicates such as "year>=2020" or "org=MIT", applied before ranking, and fuzzy
+        (default on) expands misspelled query tokens to close vocabulary terms.
+        Returns {"results": [...], "facets": {field: {value: count}}, "expansions":
+        {token: [terms]}, "timings_ms": {"expand": ..., "search": ...}} per item, in the same
+        order; facets are only computed for the requested fields. "search" is the time of
+        the batch scoring pass the item was part of (0 when it came from the cache).
+        """
+        if ranker not in RANKERS:
+            raise ValueError(f"Unknown ranker: {ranker!r} (expected one of {', '.join(RANKERS)})")
+        if not items:
+            return []
+        # parse before touching the index so bad filters are a ValueError even while warming
+        items = [
+            {"top_k": 5, "source_type": None, "fuzzy": True, **it, "filters": parse_filters(it.get("filters"))}
+            for it in items
+        ]
+
+        index = self._index  # one snapshot for the whole batch
+        if index is None:
+            self.start()  # first caller on a never-warmed service kicks off the load
+            raise RetrievalUnavailable(self.state)
+
+        # typo expansion runs before the cache lookup, so its cost shows on cached queries too
+        expand_ms = []
+        for it in items:
+            start = time.perf_counter()
+            it["expansions"] = index.expand_query(it["query"]) if it["fuzzy"] else {}
+            expand_ms.append((time.perf_counter() - start) * 1000.0)
+
+        results: List[Optional[List[dict]]] = []
+        keys = []
+        misses = []
+        for j, it in enumerate(items):
+            key = self._cache_key(index.version, it, ranker)
+            cached = self.cache.get(key)
+            keys.append(key)
+            results.append(cached)
+            if cached is None:
+                misses.append(j)
+
+        search_ms = 0.0
+        if misses:
+            start = time.perf_counter()
+            try:
+                hits_batch = index.search_batch([items[j] for j in misses], ranker)
+            except RetrievalUnavailable:
+                # the corpus changed under this snapshot before its lazy model was fitted:
+                # load the new version now rather than on the watcher's next tick
+                self.check_for_update()
+                raise
+            search_ms = (time.perf_counter() - start) * 1000.0
+            logger.debug(
+                "Scored %d queries in %.1f ms (typo expansion %.1f ms)", len(misses), search_ms, sum(expand_ms)
+            )
+            for j, formatted in zip(misses, hits_batch):
+                self.cache.put(keys[j], formatted)
+                results[j] = formatted
+
+        facet_counts: List[Dict[str, Dict[str, int]]] = [{} for _ in items]
+        if facets:
+            facet_counts = index.facet_counts_batch(items, list(facets))
+
+        missed = set(misses)
+        # shallow copies so callers can't mutate cached entries
+        return [
+            {
+                "results": [dict(h) for h in r],
+                "facets": f,
+                "expansions": it["expansions"],
+                "timings_ms": {"expand": round(e, 3), "search": round(search_ms if j in missed else 0.0, 3)},
+            }
+            for j, (it, r, f, e) in enumerate(zip(items, results, facet_counts, expand_ms))
+        ]
+
+    def search_batch(self, items: Sequence[Dict[str, Any]], ranker: str = "overlap") -> List[List[dict]]:
+        """query_batch without facets: one result list per item."""
+        return [r["results"] for r in self.query_batch(items, ranker)]
+
+    @staticmethod
+    def _cache_key(version: str, item: dict, ranker: str) -> tuple:
+        # overlap/bm25 only see the distinct query tokens; tfidf/dense/hybrid also weigh repeats
+        if ranker in ("tfidf", "dense", "hybrid"):
+            terms: Any = tuple(sorted(_term_counts(item["query"]).items()))
+        else:
+            terms = frozenset(_tokens(item["query"]))
+        return (version, ranker, terms, item["top_k"], item.get("source_type") or None, item["filters"], item["fuzzy"])
+
+    def suggest(self, prefix: str, limit: int = SUGGEST_LIMIT) -> Dict[str, List[dict]]:
+        """Vocabulary and title completions for a partially typed query."""
+        index = self._index
+        if index is None:
+            self.start()
+            raise RetrievalUnavailable(self.state)
+        return index.suggest.suggest(prefix, limit)
 
     def search(
         self,
         query: str,
         top_k: int = 5,
         source_type: Optional[str] = None,
+        ranker: str = "overlap",
+        filters: Optional[List[str]] = None,
+        fuzzy: bool = True,
     ) -> List[dict]:
-        q = _tokens(query)
-        scored = []
-
-        for d in self.docs:
-            if source_type and d.get("metadata", {}).get("source_type") != source_type:
-                continue
-
-            text = d.get("text", "")
-            t = _tokens(text)
-            score = len(q & t)  # overlap count
-
-            if score > 0:
-                snippet = text[:300].replace("\n", " ")
-                scored.append((score, {
-                    "score": score,
-                    "snippet": snippet,
-                    "metadata": d.get("metadata", {}),
-                }))
-
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [item for _, item in scored[:top_k]]
\ No newline at end of file
+        return self.search_batch(
+            [{"query": query, "top_k": top_k, "source_type": source_type, "filters": filters, "fuzzy": fuzzy}],
+            ranker=ranker,
+        )[0]
+
+
+# ---------------------------
+# Shared instance (one corpus copy per worker)
+# ---------------------------
+_shared: Optional[RetrievalService] = None
+_shared_lock = threading.Lock()
+
+
+def get_retriever() -> RetrievalService:
+    """
+    Process-wide RetrievalService, created on first use without touching the corpus.
+    Loading is started by warm_up_retriever() at app startup (or by the first caller).
+    """
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = RetrievalService(lazy=True)
+    return _shared
+
+
+def warm_up_retriever(wait: bool = False) -> RetrievalService:
+    retriever = get_retriever()
+    retriever.start(wait=wait)
+    return retriever
+
+
+def shutdown_retriever() -> None:
+    if _shared is not None:
+        _shared.close()
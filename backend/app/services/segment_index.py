@@ -0,0 +1,220 @@
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import zlib
+
+import numpy as np
+
+from app.services.corpus_format import iter_rows
+from app.services.corpus_index import (
+    CorpusIndex,
+    CorpusSignature,
+    _file_version,
+    _join_lines,
+    _split_lines,
+    _term_counts,
+    build_postings,
+)
+from app.services.doc_store import CompactDocStore
+from app.services.index_artifact import index_path_for, open_artifact, read_meta, write_artifact
+from app.services.metadata_index import MetadataIndex
+from app.services.suggest_index import SuggestIndex, title_of
+
+# bump when what a segment index holds, or how a row is analyzed into it, changes
+SEGMENT_INDEX_VERSION = 1
+
+
+def segment_index_is_current(segment: Path) -> bool:
+    """True if index_path_for(segment) is a segment index built from the current segment file."""
+    meta = read_meta(index_path_for(segment))
+    return (
+        meta is not None
+        and meta.get("kind") == "segment"
+        and meta.get("segment_version") == SEGMENT_INDEX_VERSION
+        and meta["segment_signature"] == list(CorpusSignature.of(segment))
+    )
+
+
+def write_segment_index(segment: Path) -> Path:
+    """
+    Parses one corpus segment (a JSONL file of corpus rows, e.g. an incremental build's
+    per-input-file segment) and writes, next to it, everything CorpusIndex.load derives
+    from its rows, per doc: term counts, source_type, filterable metadata values, title
+    and packed doc store record. merge_segment_indexes assembles a corpus index from these
+    without parsing or tokenizing anything again.
+    """
+    signature = CorpusSignature.of(segment)
+    vocab: Dict[str, int] = {}
+    entry_terms, entry_tfs, doc_ptr = array("i"), array("i"), array("q", [0])
+    doc_len, source_codes = array("i"), array("h")
+    source_names: Dict[Optional[str], int] = {}
+    values: Dict[Tuple[str, Union[str, int], str], int] = {}
+    value_ids, value_ptr = array("i"), array("q", [0])
+    has_title, titles = bytearray(), []
+    records: List[bytes] = []
+
+    for d in iter_rows(segment):
+        text = d.get("text", "")
+        metadata = d.get("metadata") or {}
+        counts = _term_counts(text)
+        doc_len.append(sum(counts.values()))
+        for term, tf in counts.items():
+            entry_terms.append(vocab.setdefault(term, len(vocab)))
+            entry_tfs.append(tf)
+        doc_ptr.append(len(entry_terms))
+        source_codes.append(source_names.setdefault(metadata.get("source_type") or None, len(source_names)))
+        for value in MetadataIndex.doc_values(metadata):
+            value_ids.append(values.setdefault(value, len(values)))
+        value_ptr.append(len(value_ids))
+        title = title_of(text)
+        has_title.append(title is not None)
+        if title:
+            titles.append(title)
+        records.append(CompactDocStore.encode(text, d.get("metadata", {})))
+
+    sections = {
+        "terms": _join_lines(list(vocab)),
+        "doc_ptr": np.frombuffer(doc_ptr, dtype=np.int64),
+        "entry_terms": np.frombuffer(entry_terms, dtype=np.int32),
+        "entry_tfs": np.frombuffer(entry_tfs, dtype=np.int32),
+        "doc_len": np.frombuffer(doc_len, dtype=np.int32),
+        "source_codes": np.frombuffer(source_codes, dtype=np.int16),
+        "values.ptr": np.frombuffer(value_ptr, dtype=np.int64),
+        "values.ids": np.frombuffer(value_ids, dtype=np.int32),
+        "has_title": np.frombuffer(bytes(has_title), dtype=np.uint8),
+        "titles": _join_lines(titles),
+        # JSON escapes newlines inside strings, so b"\n" separates the records
+        "records": np.frombuffer(zlib.compress(b"\n".join(records)), dtype=np.uint8),
+    }
+    meta = {
+        "kind": "segment",
+        "segment_version": SEGMENT_INDEX_VERSION,
+        "segment_signature": list(signature),
+        "n_docs": len(doc_len),
+        "n_terms": len(vocab),
+        "n_titles": len(titles),
+        "source_names": list(source_names),
+        "values": [list(v) for v in values],
+    }
+    return write_artifact(index_path_for(segment), meta, sections)
+
+
+def _csr_rows(ptr: np.ndarray) -> np.ndarray:
+    # the row of every entry of a CSR layout
+    return np.repeat(np.arange(len(ptr) - 1), np.diff(ptr))
+
+
+def merge_segment_indexes(path: Path, segments: Sequence[Path], shard: int = 0, n_shards: int = 1) -> CorpusIndex:
+    """
+    The "compact" CorpusIndex of the corpus file at path, assembled from the segment
+    indexes (see write_segment_index) of the segments it was written from, in order:
+    path holds all of their rows, or, with n_shards > 1, round-robin shard `shard` of
+    them (corpus position g -> shard g % n_shards, line g // n_shards). Equal to
+    CorpusIndex.load(path, use_artifact=False); only the content hash reads path.
+    """
+    index = CorpusIndex(path, CorpusSignature.of(path))
+
+    # per segment: its index, the docs it contributes here and their positions in path
+    parts = []
+    offset = 0
+    for segment in segments:
+        meta, a = open_artifact(index_path_for(segment))
+        n = meta["n_docs"]
+        local = np.arange((shard - offset) % n_shards, n, n_shards)
+        target = np.full(n, -1, dtype=np.int64)
+        target[local] = (offset + local) // n_shards
+        parts.append((meta, a, local, target))
+        offset += n
+
+    # vocabulary: terms of the contributed docs only (a shard lacks some of the corpus')
+    used = []
+    for meta, a, local, target in parts:
+        keep = target[_csr_rows(a["doc_ptr"])] >= 0
+        terms = _split_lines(a["terms"], meta["n_terms"])
+        used.append((keep, [terms[t] for t in np.unique(a["entry_terms"][keep]).tolist()]))
+    terms = sorted(set().union(*(u for _, u in used)))
+    vocab = {t: i for i, t in enumerate(terms)}
+
+    # source_types are numbered in order of first appearance, as in a load pass
+    source_names: Dict[Optional[str], int] = {}
+    entry_docs, entry_terms, entry_tfs, doc_len, codes = [], [], [], [], []
+    for (meta, a, local, target), (keep, part_terms) in zip(parts, used):
+        local_codes = a["source_codes"][local]
+        seen, first = np.unique(local_codes, return_index=True)
+        for code in seen[np.argsort(first, kind="stable")].tolist():
+            source_names.setdefault(meta["source_names"][code], len(source_names))
+        code_map = np.zeros(len(meta["source_names"]), dtype=np.int16)
+        for code, name in enumerate(meta["source_names"]):
+            code_map[code] = source_names.get(name, 0)
+        term_map = np.zeros(meta["n_terms"], dtype=np.int32)
+        term_map[np.unique(a["entry_terms"][keep])] = [vocab[t] for t in part_terms]
+
+        entry_docs.append(target[_csr_rows(a["doc_ptr"])[keep]].astype(np.int32))
+        entry_terms.append(term_map[a["entry_terms"][keep]])
+        entry_tfs.append(a["entry_tfs"][keep])
+        doc_len.append(a["doc_len"][local])
+        codes.append(code_map[local_codes])
+
+    def joined(chunks: List[np.ndarray], dtype) -> np.ndarray:
+        return np.concatenate(chunks).astype(dtype) if chunks else np.zeros(0, dtype=dtype)
+
+    build_postings(
+        index,
+        terms,
+        joined(entry_docs, np.int32),
+        joined(entry_terms, np.int32),
+        joined(entry_tfs, np.int32),
+        joined(doc_len, np.int32),
+        joined(codes, np.int16),
+        list(source_names),
+    )
+    n_docs = len(index.doc_len)
+
+    # metadata values: keys and their labels (first spelling) in order of first appearance
+    keys: Dict[Tuple[str, Union[str, int]], int] = {}
+    labels: List[str] = []
+    value_keys, value_docs = [], []
+    for meta, a, local, target in parts:
+        rows = _csr_rows(a["values.ptr"])
+        keep = target[rows] >= 0
+        ids = a["values.ids"][keep]
+        key_map = np.zeros(len(meta["values"]), dtype=np.int64)
+        seen, first = np.unique(ids, return_index=True)
+        for vid in seen[np.argsort(first, kind="stable")].tolist():
+            field, key, label = meta["values"][vid]
+            if (field, key) not in keys:
+                keys[(field, key)] = len(keys)
+                labels.append(label)
+        for vid, (field, key, _) in enumerate(meta["values"]):
+            key_map[vid] = keys.get((field, key), 0)
+        value_keys.append(key_map[ids])
+        value_docs.append(target[rows[keep]])
+
+    index.metadata.n_docs = n_docs
+    value_keys_all = joined(value_keys, np.int64)
+    value_docs_all = joined(value_docs, np.int32)
+    order = np.argsort(value_keys_all, kind="stable")
+    bounds = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(value_keys_all, minlength=len(keys)), out=bounds[1:])
+    docs_by_key = value_docs_all[order]
+    for (field, key), k in keys.items():
+        index.metadata.add_rows(field, key, labels[k], docs_by_key[bounds[k]:bounds[k + 1]])
+    index.metadata.finish()
+
+    titles: List[str] = []
+    store = CompactDocStore(path)
+    for meta, a, local, target in parts:
+        has_title = a["has_title"].astype(bool)
+        part_titles = _split_lines(a["titles"], meta["n_titles"])
+        title_at = np.cumsum(has_title) - 1
+        titles.extend(part_titles[j] for j in title_at[local[has_title[local]]].tolist())
+        records = zlib.decompress(a["records"].tobytes()).split(b"\n") if meta["n_docs"] else []
+        for i in local.tolist():
+            store.append_encoded(records[i])
+    store.finish()
+
+    index.suggest = SuggestIndex.build(index.terms, index.df, titles)
+    index.store = store
+    index.version = _file_version(path)
+    index._avg_doc_len = float(index.doc_len.mean()) if n_docs else 0.0
+    return index
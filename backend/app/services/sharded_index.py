@@ -0,0 +1,420 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.corpus_index import HYBRID_POOL, CorpusIndex, CorpusSignature, CorpusStats, _tokens
+from app.services.fuzzy_index import TrigramIndex, unknown_tokens
+from app.services.metadata_index import merge_facet_counts
+from app.services.suggest_index import SuggestIndex
+
+# written by build_agent_corpus(..., shards=N) next to the shard files
+SHARD_MANIFEST = "manifest.json"
+# how long a swapped-out version's worker processes stay up for queries that were
+# already holding it
+RETIRE_SECS = 5.0
+
+
+def is_shard_manifest(path: Path) -> bool:
+    return path.name == SHARD_MANIFEST
+
+
+# ---------------------------
+# Worker side: each process holds exactly one shard
+# ---------------------------
+_shard: Optional[CorpusIndex] = None
+
+
+def _load_shard(path: str, storage: str, use_artifact: bool) -> dict:
+    global _shard
+    _shard = CorpusIndex.load(Path(path), storage=storage, use_artifact=use_artifact)
+    return {
+        "version": _shard.version,
+        "from_artifact": _shard.from_artifact,
+        "n_docs": _shard.n_docs,
+        "total_len": int(_shard.doc_len.sum()),
+        "terms": _shard.terms,
+        "df": _shard.df,
+        "suggest": _shard.suggest,
+    }
+
+
+def _build_shard_model(tfidf_params: Optional[Tuple[List[str], np.ndarray]]) -> None:
+    _shard.tfidf_params = tfidf_params
+    _shard.tfidf_index()
+
+
+def _search_shard(items: List[dict], ranker: str, stats: CorpusStats) -> List[List[Tuple[Any, int, dict]]]:
+    # hits are formatted here, where the shard's doc store lives
+    return [
+        [(score, i, _shard.format_hit(score, i)) for score, i in hits]
+        for hits in _shard.top_hits_batch(items, ranker, stats)
+    ]
+
+
+# the dense model is fitted in steps, each answered from the whole corpus by the
+# coordinator (see ShardedIndex._fit_global_dense); this holds the shard's part in between
+_dense_fit: Dict[str, Any] = {}
+
+
+def _dense_features() -> Tuple[np.ndarray, int]:
+    from app.services.dense_index import document_frequency, hashed_features
+
+    features = hashed_features(_shard._texts())
+    _dense_fit["features"] = features
+    return document_frequency(features), features.shape[0]
+
+
+def _dense_sample(idf: np.ndarray, lines: np.ndarray):
+    from app.services.dense_index import tfidf_weight
+
+    weighted = tfidf_weight(_dense_fit.pop("features"), idf)
+    _dense_fit["weighted"] = weighted
+    return weighted[lines]
+
+
+def _dense_project(components: np.ndarray, send: bool) -> Optional[np.ndarray]:
+    from app.services.dense_index import project
+
+    vectors = project(_dense_fit.pop("weighted"), components)
+    _dense_fit["vectors"] = vectors
+    return vectors if send else None
+
+
+def _dense_finish(idf: np.ndarray, components: np.ndarray, centroids: np.ndarray, labels: np.ndarray) -> None:
+    from app.services.dense_index import DenseIndex
+
+    vectors = _dense_fit.pop("vectors")
+    _shard._dense = DenseIndex(_shard.partition_rows(), idf, components, vectors, centroids, labels)
+
+
+def _dense_probe_shard(
+    items: List[dict], top_ks: List[int], nprobes: List[int], formatted: bool
+) -> List[Tuple[List[Tuple[float, int, Optional[dict]]], int]]:
+    return [
+        ([(score, i, _shard.format_hit(score, i) if formatted else None) for score, i in hits], n_candidates)
+        for hits, n_candidates in _shard.dense_probe_batch(items, top_ks, nprobes)
+    ]
+
+
+def _keyword_pool_shard(
+    items: List[dict], pools: List[int], stats: CorpusStats
+) -> List[Tuple[List[Tuple[float, int]], Optional[float]]]:
+    return _shard.keyword_pool_batch(items, pools, stats)
+
+
+def _hybrid_fuse_shard(
+    items: List[dict], candidates: List[np.ndarray], kw_max: List[Optional[float]], stats: CorpusStats
+) -> List[List[Tuple[float, int, dict]]]:
+    return [
+        [(score, i, _shard.format_hit(score, i)) for score, i in hits]
+        for hits in _shard.hybrid_fuse_batch(items, candidates, kw_max, stats)
+    ]
+
+
+def _facet_shard(items: List[dict], fields: List[str]) -> List[Dict[str, Dict[str, int]]]:
+    return _shard.facet_counts_batch(items, fields, limit=None)
+
+
+# ---------------------------
+# Coordinator side
+# ---------------------------
+class ShardedIndex:
+    """
+    A corpus split into round-robin shards, each loaded into its own worker process, so
+    scoring runs on as many cores as there are shards instead of behind one GIL.
+
+    Presents the same snapshot interface as CorpusIndex to RetrievalService. A batch is
+    sent to every shard at once; each returns its local top-k (already formatted), and the
+    lists are merged on (-score, original corpus position). overlap and bm25 results are
+    identical to an unsharded index: BM25 is scored with global document frequencies, doc
+    count and average length gathered at load time, and shard s line j maps back to corpus
+    position j * n_shards + s. tfidf is fitted per shard on the global vocabulary and idf,
+    so it matches as well. The dense model (hashing idf, SVD basis, IVF clustering) is
+    fitted once over the whole corpus and shared by the shards; the IVF probe is widened on
+    candidate counts summed over the shards, and hybrid is fused against the global
+    candidate set and bm25 maximum, so dense/hybrid match too.
+    """
+
+    def __init__(self, manifest_path: Path, signature: CorpusSignature):
+        self.path = manifest_path
+        self.signature = signature
+        self.version = ""
+        self.loaded_at = time.time()
+        self.n_docs = 0
+        self._avg_doc_len = 0.0
+        self._df: Dict[str, int] = {}
+        self.suggest: Optional[SuggestIndex] = None
+        self.shard_paths: List[Path] = []
+        self._executors: List[ProcessPoolExecutor] = []
+        self._models: set = set()
+        self._ivf_lists = 1
+        self._model_lock = threading.Lock()
+        self._fuzzy: Optional[TrigramIndex] = None
+        self.from_artifact = False
+
+    @classmethod
+    def load(cls, manifest_path: Path, storage: str = "compact", use_artifact: bool = True) -> "ShardedIndex":
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"Shard manifest not found: {manifest_path}")
+        index = cls(manifest_path, CorpusSignature.of(manifest_path))
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if manifest.get("layout") != "round_robin":
+            raise ValueError(f"Unsupported shard layout: {manifest.get('layout')!r}")
+
+        # spawn, not fork: the server process has threads (watcher, reloads) that a fork
+        # would copy mid-flight
+        ctx = multiprocessing.get_context("spawn")
+        paths = [manifest_path.parent / name for name in manifest["shards"]]
+        index.shard_paths = paths
+        index._executors = [ProcessPoolExecutor(max_workers=1, mp_context=ctx) for _ in paths]
+        try:
+            futures = [
+                ex.submit(_load_shard, str(p), storage, use_artifact) for ex, p in zip(index._executors, paths)
+            ]
+            summaries = [f.result() for f in futures]
+        except Exception:
+            index.close(delay=0)
+            raise
+
+        index.n_docs = sum(s["n_docs"] for s in summaries)
+        index.from_artifact = all(s["from_artifact"] for s in summaries)
+        total_len = sum(s["total_len"] for s in summaries)
+        index._avg_doc_len = total_len / index.n_docs if index.n_docs else 0.0
+        df: Dict[str, int] = {}
+        for s in summaries:
+            for term, n in zip(s["terms"], s["df"].tolist()):
+                df[term] = df.get(term, 0) + n
+        index._df = df
+        # autocomplete is answered here, from the shards' prefix indexes merged once
+        index.suggest = SuggestIndex.merge([s["suggest"] for s in summaries])
+        index.version = hashlib.sha256(",".join(s["version"] for s in summaries).encode()).hexdigest()[:16]
+        return index
+
+    @property
+    def n_shards(self) -> int:
+        return len(self._executors)
+
+    @property
+    def corpus_files(self) -> List[Path]:
+        return list(self.shard_paths)
+
+    @property
+    def has_tfidf(self) -> bool:
+        return "tfidf" in self._models
+
+    @property
+    def has_dense(self) -> bool:
+        return "dense" in self._models
+
+    @property
+    def has_fuzzy(self) -> bool:
+        return self._fuzzy is not None
+
+    def _global_tfidf_params(self) -> Tuple[List[str], np.ndarray]:
+        # same smoothed idf as sklearn's TfidfTransformer, over the whole corpus
+        terms = sorted(self._df)
+        df = np.array([self._df[t] for t in terms], dtype=np.float32) + 1.0
+        idf = np.full_like(df, self.n_docs + 1, dtype=np.float32)
+        idf /= df
+        np.log(idf, out=idf)
+        idf += 1.0
+        return terms, idf
+
+    def _ensure_model(self, kind: str) -> None:
+        if kind in self._models:
+            return
+        with self._model_lock:
+            if kind in self._models:
+                return
+            if kind == "tfidf":
+                params = self._global_tfidf_params()
+                for f in [ex.submit(_build_shard_model, params) for ex in self._executors]:
+                    f.result()
+            else:
+                self._fit_global_dense()
+            self._models.add(kind)
+
+    def _fit_global_dense(self) -> None:
+        """
+        Same steps as DenseIndex.fit, with every corpus-wide quantity taken here: document
+        frequencies summed over the shards, the SVD fitted on the same sample rows (in corpus
+        order) an unsharded index would use, and k-means run on all doc vectors.
+        """
+        from scipy import sparse as sp
+
+        from app.services.dense_index import fit_basis, fit_idf, fit_ivf, ivf_lists, svd_sample
+
+        n = self.n_shards
+        counted = [f.result() for f in [ex.submit(_dense_features) for ex in self._executors]]
+        n_docs = sum(c for _, c in counted)
+        idf = fit_idf(sum(df for df, _ in counted), n_docs)
+
+        sample = svd_sample(n_docs)
+        futures = [ex.submit(_dense_sample, idf, sample[sample % n == s] // n) for s, ex in enumerate(self._executors)]
+        rows = sp.vstack([f.result() for f in futures], format="csr")
+        positions = np.concatenate([sample[sample % n == s] for s in range(n)])
+        components = fit_basis(rows[np.argsort(positions, kind="stable")], n_docs)
+
+        send = ivf_lists(n_docs) > 1
+        vectors = [f.result() for f in [ex.submit(_dense_project, components, send) for ex in self._executors]]
+        if send:
+            corpus_vectors = np.empty((n_docs, components.shape[0]), dtype=vectors[0].dtype)
+            for s, v in enumerate(vectors):
+                corpus_vectors[s::n] = v
+            centroids, labels = fit_ivf(corpus_vectors)
+            del corpus_vectors
+        else:
+            centroids, labels = np.zeros((1, components.shape[0]), dtype=np.float32), np.zeros(n_docs, dtype=np.int32)
+
+        futures = [
+            ex.submit(_dense_finish, idf, components, centroids, labels[s::n]) for s, ex in enumerate(self._executors)
+        ]
+        for f in futures:
+            f.result()
+        self._ivf_lists = len(centroids)
+
+    def tfidf_index(self) -> None:
+        self._ensure_model("tfidf")
+
+    def dense_index(self) -> None:
+        self._ensure_model("dense")
+
+    def fuzzy_index(self) -> TrigramIndex:
+        # expansions are picked here, over the global vocabulary, so every shard applies the same ones
+        if self._fuzzy is None:
+            with self._model_lock:
+                if self._fuzzy is None:
+                    terms = sorted(self._df)
+                    self._fuzzy = TrigramIndex(terms, np.array([self._df[t] for t in terms], dtype=np.int64))
+        return self._fuzzy
+
+    def expand_query(self, query: str) -> Dict[str, List[str]]:
+        """Same as CorpusIndex.expand_query, against the merged vocabulary of all shards."""
+        unknown = unknown_tokens(_tokens(query), self._df)
+        return self.fuzzy_index().expand_all(unknown) if unknown else {}
+
+    def search_batch(self, items: List[dict], ranker: str) -> List[List[dict]]:
+        if ranker == "tfidf":
+            self.tfidf_index()
+        elif ranker in ("dense", "hybrid"):
+            self.dense_index()
+
+        terms = set()
+        for it in items:
+            terms |= _tokens(it["query"])
+            for expansion in (it.get("expansions") or {}).values():
+                terms.update(expansion)
+        stats = CorpusStats(self.n_docs, self._avg_doc_len, {t: self._df.get(t, 0) for t in terms})
+
+        if ranker == "dense":
+            merged = self._dense_search(items, [it["top_k"] for it in items], formatted=True)
+        elif ranker == "hybrid":
+            merged = self._hybrid_search(items, stats)
+        else:
+            # fan out to every shard, then merge per item on (-score, corpus position)
+            futures = [ex.submit(_search_shard, items, ranker, stats) for ex in self._executors]
+            merged = self._merge([f.result() for f in futures], [it["top_k"] for it in items])
+        return [[hit for _, _, hit in hits] for hits in merged]
+
+    def _merge(self, per_shard: List[list], top_ks: List[int]) -> List[List[Tuple[float, int, Any]]]:
+        """Per item, the top_k of the shards' (score, local line, payload) hits, keyed by corpus position."""
+        n = self.n_shards
+        out = []
+        for j, k in enumerate(top_ks):
+            merged = [
+                (score, i * n + s, hit)
+                for s, shard_hits in enumerate(per_shard)
+                for score, i, hit in shard_hits[j]
+            ]
+            merged.sort(key=lambda x: (-x[0], x[1]))
+            out.append(merged[:k])
+        return out
+
+    def _dense_search(
+        self, items: List[dict], top_ks: List[int], formatted: bool
+    ) -> List[List[Tuple[float, int, Optional[dict]]]]:
+        """
+        IVF search across the shards. Like DenseIndex.search_vectors, an item's probe starts
+        at IVF_NPROBE lists and doubles while fewer than top_k docs pass its filters, counted
+        over all shards.
+        """
+        from app.services.dense_index import IVF_NPROBE
+
+        out: List[list] = [[] for _ in items]
+        nprobes = [IVF_NPROBE] * len(items)
+        pending = list(range(len(items)))
+        while pending:
+            batch = [items[j] for j in pending]
+            ks, probes = [top_ks[j] for j in pending], [nprobes[j] for j in pending]
+            futures = [ex.submit(_dense_probe_shard, batch, ks, probes, formatted) for ex in self._executors]
+            per_shard = [f.result() for f in futures]
+
+            done, widen = [], []
+            for x, j in enumerate(pending):
+                n_candidates = sum(shard[x][1] for shard in per_shard)
+                if n_candidates >= top_ks[j] or nprobes[j] >= self._ivf_lists:
+                    done.append(x)
+                else:
+                    nprobes[j] *= 2
+                    widen.append(j)
+            done_hits = [[shard[x][0] for x in done] for shard in per_shard]
+            merged = self._merge(done_hits, [top_ks[pending[x]] for x in done])
+            for x, hits in zip(done, merged):
+                out[pending[x]] = hits
+            pending = widen
+        return out
+
+    def _hybrid_search(self, items: List[dict], stats: CorpusStats) -> List[List[Tuple[float, int, dict]]]:
+        """
+        CorpusIndex._hybrid_batch in two rounds: the global candidate set (dense and bm25
+        top pools) and bm25 maximum first, then each shard fuses its part of the candidates.
+        """
+        n = self.n_shards
+        pools = [max(it["top_k"], HYBRID_POOL) for it in items]
+        keyword_futures = [ex.submit(_keyword_pool_shard, items, pools, stats) for ex in self._executors]
+        dense = self._dense_search(items, pools, formatted=False)
+        keyword = [f.result() for f in keyword_futures]
+        kw_best = self._merge([[[(sc, i, None) for sc, i in hits] for hits, _ in shard] for shard in keyword], pools)
+
+        candidates, kw_max = [], []
+        for j in range(len(items)):
+            ids = np.unique(np.array([pos for _, pos, _ in dense[j] + kw_best[j]], dtype=np.int64))
+            candidates.append(ids)
+            best = [shard[j][1] for shard in keyword if shard[j][1] is not None]
+            kw_max.append(max(best) if best else None)
+
+        futures = [
+            ex.submit(_hybrid_fuse_shard, items, [ids[ids % n == s] // n for ids in candidates], kw_max, stats)
+            for s, ex in enumerate(self._executors)
+        ]
+        return self._merge([f.result() for f in futures], [it["top_k"] for it in items])
+
+    def facet_counts_batch(self, items: List[dict], fields: List[str]) -> List[Dict[str, Dict[str, int]]]:
+        futures = [ex.submit(_facet_shard, items, fields) for ex in self._executors]
+        per_shard = [f.result() for f in futures]
+        return [merge_facet_counts([counts[j] for counts in per_shard]) for j in range(len(items))]
+
+    def close(self, delay: Optional[float] = None) -> None:
+        """
+        Shuts the worker processes down after `delay` seconds (default RETIRE_SECS), so
+        queries that grabbed this snapshot just before it was swapped out can still finish.
+        """
+        if delay is None:
+            delay = RETIRE_SECS
+        def shutdown():
+            for ex in self._executors:
+                ex.shutdown(wait=False, cancel_futures=False)
+
+        if delay <= 0:
+            shutdown()
+        else:
+            t = threading.Timer(delay, shutdown)
+            t.daemon = True
+            t.start()
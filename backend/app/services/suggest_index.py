@@ -0,0 +1,120 @@
+from bisect import bisect_left
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# completions returned per group by default / at most
+SUGGEST_LIMIT = 8
+SUGGEST_MAX_LIMIT = 50
+
+_space_re = re.compile(r"\s+")
+# the word being typed, in corpus_index's token alphabet
+_last_token_re = re.compile(r"[a-z0-9_]+$")
+
+
+def normalize_prefix(text: str) -> str:
+    return _space_re.sub(" ", text).strip().casefold()
+
+
+def title_of(text: str) -> Optional[str]:
+    """The title from a corpus row's text ("Title: ...\\nType: ..."), if it has one."""
+    first = text.split("\n", 1)[0]
+    if first.startswith("Title: "):
+        title = first[len("Title: "):].strip()
+        return title or None
+    return None
+
+
+class PrefixArray:
+    """
+    Sorted keys with a display label and a count each. All keys starting with a prefix
+    form one contiguous range, found with two binary searches; the range is then cut to
+    its most frequent entries with a partial sort.
+    """
+
+    def __init__(self, keys: List[str], labels: List[str], counts: np.ndarray):
+        self.keys = keys
+        self.labels = labels
+        self.counts = counts
+
+    @classmethod
+    def from_counts(cls, counts: Dict[str, Tuple[str, int]]) -> "PrefixArray":
+        """counts: key -> (label, count)"""
+        keys = sorted(counts)
+        return cls(
+            keys,
+            [counts[k][0] for k in keys],
+            np.fromiter((counts[k][1] for k in keys), dtype=np.int64, count=len(keys)),
+        )
+
+    def items(self) -> Iterable[Tuple[str, str, int]]:
+        return zip(self.keys, self.labels, self.counts.tolist())
+
+    def complete(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        """Up to `limit` (label, count) pairs whose key starts with prefix, count desc then key."""
+        lo = bisect_left(self.keys, prefix)
+        # every key with the prefix sorts before prefix + the highest code point
+        hi = bisect_left(self.keys, prefix + "\U0010ffff", lo)
+        if hi <= lo:
+            return []
+
+        idx = np.arange(lo, hi)
+        counts = self.counts[lo:hi]
+        if len(idx) > limit:
+            kth = -np.partition(-counts, limit - 1)[limit - 1]
+            keep = counts >= kth
+            idx, counts = idx[keep], counts[keep]
+        # idx is ascending, i.e. in key order, so lexsort breaks count ties by key
+        order = np.lexsort((idx, -counts))[:limit]
+        return [(self.labels[i], int(self.counts[i])) for i in idx[order]]
+
+
+class SuggestIndex:
+    """
+    Autocomplete over one corpus version: the vocabulary (ranked by document frequency)
+    and document titles (ranked by how many docs share the title).
+
+    The last word of the input is completed against the vocabulary, keeping the words
+    before it; the whole input is matched against the start of titles.
+    """
+
+    def __init__(self, terms: PrefixArray, titles: PrefixArray):
+        self.terms = terms
+        self.titles = titles
+
+    @classmethod
+    def build(cls, terms: Sequence[str], df: np.ndarray, titles: Iterable[str]) -> "SuggestIndex":
+        """terms: sorted vocabulary (already lowercase) with its document frequencies."""
+        title_counts: Dict[str, Tuple[str, int]] = {}
+        for t in titles:
+            key = normalize_prefix(t)
+            label, n = title_counts.get(key, (t, 0))
+            title_counts[key] = (label, n + 1)
+        return cls(PrefixArray(list(terms), list(terms), df.astype(np.int64)), PrefixArray.from_counts(title_counts))
+
+    @classmethod
+    def merge(cls, parts: Sequence["SuggestIndex"]) -> "SuggestIndex":
+        """One index over several shards' indexes (counts are summed)."""
+        merged: Tuple[Dict[str, Tuple[str, int]], Dict[str, Tuple[str, int]]] = ({}, {})
+        for part in parts:
+            for target, source in zip(merged, (part.terms, part.titles)):
+                for key, label, n in source.items():
+                    first_label, total = target.get(key, (label, 0))
+                    target[key] = (first_label, total + n)
+        return cls(PrefixArray.from_counts(merged[0]), PrefixArray.from_counts(merged[1]))
+
+    def suggest(self, prefix: str, limit: int = SUGGEST_LIMIT) -> Dict[str, List[dict]]:
+        text = normalize_prefix(prefix)
+        if not text:
+            return {"terms": [], "titles": []}
+
+        # "hospital readm" -> complete "readm", keep "hospital "
+        m = _last_token_re.search(text)
+        head = text[:m.start()] if m else text
+        terms = self.terms.complete(m.group(0), limit) if m else []
+        return {
+            "terms": [{"text": head + term, "term": term, "count": n} for term, n in terms],
+            "titles": [{"text": title, "count": n} for title, n in self.titles.complete(text, limit)],
+        }
@@ -0,0 +1,114 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+# same token definition as corpus_index._word_re so all rankers see the same terms
+TOKEN_PATTERN = r"[A-Za-z0-9_]+"
+
+
+class TfidfIndex:
+    """
+    Vectorized TF-IDF retrieval over the agent corpus.
+
+    The document-term matrix is fitted once (idf over the whole corpus) and kept as CSR
+    (docs x terms, L2-normalized rows), split into one block per source_type. A query is one
+    sparse matrix-vector product (cosine similarity) per partition it may hit, followed by a
+    partial sort for top-k, so a source_type-filtered query only multiplies its own rows.
+    A batch of queries is one sparse matrix-matrix product per partition.
+    """
+
+    def __init__(
+        self,
+        texts: Iterable[str],
+        partitions: Dict[Optional[str], np.ndarray],
+        vocabulary: Optional[List[str]] = None,
+        idf: Optional[np.ndarray] = None,
+    ):
+        """
+        partitions: source_type -> ascending corpus positions of its docs.
+        vocabulary/idf: fixed from outside instead of fitted on texts; a shard is given the
+        whole corpus' sorted vocabulary and idf so its scores match an unsharded index.
+        """
+        self._vectorizer = TfidfVectorizer(
+            token_pattern=TOKEN_PATTERN,
+            lowercase=True,
+            dtype=np.float32,
+            vocabulary=vocabulary,
+        )
+        if idf is None:
+            matrix = self._vectorizer.fit_transform(texts).tocsr()
+        else:
+            # fit() only to initialize the vectorizer; the idf it learns is replaced
+            self._vectorizer.fit([""])
+            self._vectorizer.idf_ = idf
+            matrix = self._vectorizer.transform(texts).tocsr()
+        self._n_docs = matrix.shape[0]
+
+        # source_type -> (ascending corpus positions, CSR block with those rows)
+        self._partitions: Dict[Optional[str], Tuple[np.ndarray, Any]] = {
+            st: (rows, matrix[rows]) for st, rows in partitions.items()
+        }
+
+    @property
+    def n_docs(self) -> int:
+        return self._n_docs
+
+    def search(self, query: str, top_k: int, source_type: Optional[str] = None) -> List[Tuple[float, int]]:
+        return self.search_batch([query], [top_k], [source_type])[0]
+
+    def search_batch(
+        self,
+        queries: Sequence[str],
+        top_ks: Sequence[int],
+        source_types: Optional[Sequence[Optional[str]]] = None,
+        masks: Optional[Sequence[Optional[np.ndarray]]] = None,
+    ) -> List[List[Tuple[float, int]]]:
+        """
+        Scores all queries with one (docs x terms) @ (terms x queries) product per partition.
+        masks[j], if given, is a boolean mask over corpus positions; docs outside it are
+        never ranked for query j.
+        Returns, per query, up to top_ks[j] (score, doc_position) pairs with score > 0.
+        """
+        if not queries:
+            return []
+        if source_types is None:
+            source_types = [None] * len(queries)
+        if masks is None:
+            masks = [None] * len(queries)
+
+        q = self._vectorizer.transform(queries)
+        candidates: List[List[Tuple[float, int]]] = [[] for _ in queries]
+
+        for st, (rows, block) in self._partitions.items():
+            selected = [j for j, f in enumerate(source_types) if not f or f == st]
+            if not selected:
+                continue
+            scores = (block @ q[selected].T).toarray()  # partition docs x selected queries
+            for col, j in enumerate(selected):
+                col_scores = scores[:, col]
+                if masks[j] is not None:
+                    col_scores = np.where(masks[j][rows], col_scores, 0)
+                candidates[j].extend(
+                    (score, int(rows[local])) for score, local in self._top_k(col_scores, top_ks[j])
+                )
+
+        # merge per-partition top-k lists: score desc, then corpus position
+        return [
+            sorted(c, key=lambda x: (-x[0], x[1]))[:k]
+            for c, k in zip(candidates, top_ks)
+        ]
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        candidates = np.flatnonzero(scores > 0)
+        if candidates.size > k:
+            # k-th best score via partial sort; keep everything tied with it so the
+            # final cut below is deterministic
+            kth = -np.partition(-scores[candidates], k - 1)[k - 1]
+            candidates = candidates[scores[candidates] >= kth]
+
+        # deterministic order: score desc, then row position
+        order = np.lexsort((candidates, -scores[candidates]))[:k]
+        return [(float(scores[i]), int(i)) for i in candidates[order]]
@@ -0,0 +1,56 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from app.pipelines import ingest, run_pipeline
+
+
+class PipelineTree:
+    """A throwaway data/*_raw/ + artifacts/ layout the pipeline reads and writes instead of the repo's."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.raw = {source: root / "data" / folder.name for source, folder in ingest.RAW_SOURCES.items()}
+        for folder in self.raw.values():
+            folder.mkdir(parents=True)
+        self.artifacts = root / "artifacts"
+        self.artifacts.mkdir()
+        self.corpus_path = self.artifacts / "agent_corpus.jsonl"
+
+    def write_grants(self, name: str, n: int, topic: str = "population health") -> Path:
+        records = [
+            {
+                "award_id": f"{name}-{i}",
+                "title": f"{topic.title()} study {name} {i}",
+                "abstract": f"A study of {topic} outcomes in cohort {i} of {name}, with follow-up visits.",
+                "year": 2010 + i % 10,
+            }
+            for i in range(n)
+        ]
+        path = self.raw["grants"] / f"{name}.json"
+        path.write_text(json.dumps(records), encoding="utf-8")
+        return path
+
+    def write_faculty(self, name: str, n: int) -> Path:
+        records = [
+            {"id": f"{name}-{i}", "name": f"Researcher {name} {i}", "bio": f"Works on topic {i} in {name}."}
+            for i in range(n)
+        ]
+        path = self.raw["faculty_profiles"] / f"{name}.json"
+        path.write_text(json.dumps(records), encoding="utf-8")
+        return path
+
+    def run(self, **kwargs) -> dict:
+        return run_pipeline.run(report_dir=self.root / "runs", **kwargs)
+
+
+@pytest.fixture
+def pipeline_tree(tmp_path, monkeypatch) -> PipelineTree:
+    tree = PipelineTree(tmp_path)
+    for source, folder in tree.raw.items():
+        monkeypatch.setitem(ingest.RAW_SOURCES, source, folder)
+    monkeypatch.setattr(run_pipeline, "CORPUS_PATH", tree.corpus_path)
+    tree.write_faculty("dept-a", 20)
+    tree.write_grants("nih-a", 40)
+    return tree
@@ -0,0 +1,45 @@
+import numpy as np
+
+from app.pipelines import dedup
+from app.pipelines.dedup import BANDS, NUM_PERM, ROWS, apply_dedup, find_near_duplicates
+
+
+def _doc(doc_id: str, summary: str) -> dict:
+    return {"doc_id": doc_id, "title": "", "summary": summary}
+
+
+def test_near_duplicates_merge_and_distinct_docs_stay():
+    base = "community health workers reduce hospital readmission among older adults in rural counties"
+    docs = [
+        _doc("a", base + " after discharge"),
+        _doc("b", "a study of coral reef bleaching and ocean temperature across the pacific basin"),
+        _doc("c", base + " after discharge."),
+        _doc("d", "short text"),
+    ]
+    plan = find_near_duplicates(docs)
+    assert plan.dropped == {2: "c"}
+    assert plan.merged == {0: ["c"]}
+    kept = list(apply_dedup(docs, plan))
+    assert [d["doc_id"] for d in kept] == ["a", "b", "d"]
+    assert kept[0]["merged_doc_ids"] == ["c"]
+
+
+def test_colliding_non_duplicate_between_near_duplicates(monkeypatch):
+    # a and b agree on 13 of the 16 bands (52 of 64 rows, above the 0.8 threshold); in
+    # each of those bands an unrelated doc shares their bucket and sorts between them,
+    # agreeing with them on that band's rows only
+    shared = BANDS - 3
+    rng = np.random.default_rng(7)
+    n_docs = shared + 2
+    sigs = rng.integers(1, 2**32 - 1, size=(n_docs, NUM_PERM), dtype=np.uint64).astype(np.uint32)
+    a, b = 0, n_docs - 1
+    sigs[b, : shared * ROWS] = sigs[a, : shared * ROWS]
+    for band in range(shared):
+        rows = slice(band * ROWS, (band + 1) * ROWS)
+        sigs[1 + band, rows] = sigs[a, rows]
+
+    monkeypatch.setattr(dedup, "_signatures", lambda words, lengths: sigs[: len(lengths)])
+    docs = [_doc(f"doc-{i}", " ".join(f"word{i}x{j}" for j in range(10))) for i in range(n_docs)]
+    plan = find_near_duplicates(docs)
+    assert plan.dropped == {b: f"doc-{b}"}
+    assert plan.merged == {a: [f"doc-{b}"]}
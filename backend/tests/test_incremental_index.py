@@ -0,0 +1,61 @@
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+from app.pipelines.build_index import corpus_files
+from app.services import corpus_index, segment_index
+from app.services.corpus_index import CorpusIndex
+from app.services.index_artifact import index_path_for
+
+
+def _stage(report: dict, name: str) -> dict:
+    return next(s for s in report["stages"] if s["name"] == name)
+
+
+@pytest.fixture
+def tokenized(monkeypatch) -> Counter:
+    # docs tokenized, whether by a full corpus load or a segment index
+    calls: Counter = Counter()
+    for module in (corpus_index, segment_index):
+        original = module._term_counts
+
+        def counting(text, _original=original):
+            calls["docs"] += 1
+            return _original(text)
+
+        monkeypatch.setattr(module, "_term_counts", counting)
+    return calls
+
+
+@pytest.mark.parametrize("shards", [1, 2])
+def test_incremental_index_work_scales_with_delta(pipeline_tree, tokenized, tmp_path, shards):
+    for i in range(6):
+        pipeline_tree.write_grants(f"nih-{i}", 30)
+    total = 20 + 40 + 6 * 30
+
+    first = pipeline_tree.run(incremental=True, shards=shards)
+    assert _stage(first, "index")["records_in"] == total
+    assert tokenized["docs"] == total
+
+    # nothing changed: nothing parsed, nothing written
+    tokenized.clear()
+    noop = pipeline_tree.run(incremental=True, shards=shards)
+    assert _stage(noop, "index")["records_in"] == 0
+    assert _stage(noop, "index")["records_out"] == 0
+    assert tokenized["docs"] == 0
+
+    # one file changed (30 -> 35 docs): only its docs are tokenized again
+    tokenized.clear()
+    pipeline_tree.write_grants("nih-3", 35, topic="rural clinics")
+    delta = pipeline_tree.run(incremental=True, shards=shards)
+    index = _stage(delta, "index")
+    assert index["records_in"] == 35
+    assert index["records_out"] == total + 5
+    assert tokenized["docs"] == 35
+
+    # and the merged artifacts are exactly what a full parse of the new corpus writes
+    for path in corpus_files(Path(delta["out_path"])):
+        assert CorpusIndex.artifact_is_current(path)
+        full = CorpusIndex.load(path, storage="compact", use_artifact=False).save_artifact(tmp_path / "full.idx")
+        assert index_path_for(path).read_bytes() == full.read_bytes()
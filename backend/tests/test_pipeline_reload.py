@@ -0,0 +1,45 @@
+from pathlib import Path
+
+import pytest
+
+from app.pipelines import run_pipeline
+from app.services.retrieval_service import RetrievalService
+
+
+def _settle(service: RetrievalService) -> None:
+    # one watcher tick, waiting for the reload it starts (if any)
+    service.check_for_update()
+    t = service._reload_thread
+    if t is not None:
+        t.join()
+
+
+@pytest.mark.parametrize("shards", [1, 2])
+def test_server_maps_artifact_written_after_corpus(pipeline_tree, monkeypatch, shards):
+    out = pipeline_tree.run(shards=shards)
+    service = RetrievalService(Path(out["out_path"]), watch_interval=0, storage="compact")
+    try:
+        assert service.status()["index_artifact"] is True
+        old_version = service.version
+
+        # the server polls between the corpus rename and the artifact write: it can only
+        # parse the new corpus, since the artifact next to it is still the old one's
+        build_index_artifacts = run_pipeline.build_index_artifacts
+
+        def racing_build(out_path, *args, **kwargs):
+            _settle(service)
+            assert service.version != old_version
+            assert service.status()["index_artifact"] is False
+            return build_index_artifacts(out_path, *args, **kwargs)
+
+        monkeypatch.setattr(run_pipeline, "build_index_artifacts", racing_build)
+        pipeline_tree.write_grants("nih-b", 15, topic="rural clinics")
+        pipeline_tree.run(shards=shards)
+
+        _settle(service)
+        status = service.status()
+        assert status["index_artifact"] is True
+        assert status["version"] != old_version
+        assert service.search("rural clinics", ranker="bm25")[0]["metadata"]["doc_id"].startswith("nih-b")
+    finally:
+        service.close()
@@ -12,4 +12,11 @@ export async function getAgentJobStatus(jobId) {
   const res = await fetch(`/api/agentic_workflow_status/${jobId}`);
   if (!res.ok) throw new Error("Failed to fetch job status");
   return res.json();
-}
\ No newline at end of file
+}
+
+export async function suggestCompletions(prefix, { limit = 8, signal } = {}) {
+  const params = new URLSearchParams({ prefix, limit: String(limit) });
+  const res = await fetch(`/api/suggest?${params}`, { signal });
+  if (!res.ok) throw new Error("Failed to fetch suggestions");
+  return res.json();
+}
@@ -1,4 +1,7 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
+import { suggestCompletions } from "../api/agentApi";
+
+const SUGGEST_DEBOUNCE_MS = 120;
 
 export default function JobForm({ onSubmit }) {
   const [goal, setGoal] = useState("Hospital readmission prediction using ML");
@@ -8,12 +11,42 @@ export default function JobForm({ onSubmit }) {
   const [profileText, setProfileText] = useState(
     "MS Data Analytics student focusing on ML systems"
   );
+  const [suggestions, setSuggestions] = useState([]);
+
+  // Complete the goal from corpus terms/titles so it actually matches local context
+  useEffect(() => {
+    if (goal.trim().length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const data = await suggestCompletions(goal, { signal: controller.signal });
+        // a one-word title can equal a term; a datalist shows each completion once
+        setSuggestions([...new Set([...data.terms, ...data.titles].map((s) => s.text))]);
+      } catch {
+        // suggestions are best-effort (e.g. corpus still warming)
+        setSuggestions([]);
+      }
+    }, SUGGEST_DEBOUNCE_MS);
+
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [goal]);
 
   return (
     <div>
       <h2>Start Agent Workflow</h2>
 
-      <input value={goal} onChange={(e) => setGoal(e.target.value)} />
+      <input list="goal-suggestions" value={goal} onChange={(e) => setGoal(e.target.value)} />
+      <datalist id="goal-suggestions">
+        {suggestions.map((s) => (
+          <option key={s} value={s} />
+        ))}
+      </datalist>
       <input value={projectIdea} onChange={(e) => setProjectIdea(e.target.value)} />
       <input value={profileText} onChange={(e) => setProfileText(e.target.value)} />
 
@@ -30,4 +63,4 @@ export default function JobForm({ onSubmit }) {
       </button>
     </div>
   );
-}
\ No newline at end of file
+}